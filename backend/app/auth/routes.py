@@ -17,7 +17,8 @@ from app.auth.schemas import (
 from app.auth.security import create_access_token, oauth2_scheme  # Import oauth2_scheme
 from app.auth.service import auth_service
 from app.config import settings
-from fastapi import APIRouter, Depends, HTTPException, status
+from app.ratelimit import rate_limit_by_client
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import (  # Import OAuth2PasswordRequestForm
     OAuth2PasswordRequestForm,
 )
@@ -25,8 +26,30 @@ from fastapi.security import (  # Import OAuth2PasswordRequestForm
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
 
+async def login_account(request: Request) -> str:
+    """The email a login request is for, lowercased; empty if it has none."""
+    try:
+        if request.headers.get("content-type", "").startswith("application/json"):
+            email = (await request.json()).get("email")
+        else:
+            email = (await request.form()).get("username")
+    except Exception:
+        return ""
+    return email.strip().lower() if isinstance(email, str) else ""
+
+
+# Password checks run bcrypt; both login routes share one bucket per account
+# and client address
+login_rate_limit = Depends(
+    rate_limit_by_client("auth.login", cost=5, account=login_account)
+)
+
+
 @router.post(
-    "/token", response_model=TokenResponse, include_in_schema=False
+    "/token",
+    response_model=TokenResponse,
+    include_in_schema=False,
+    dependencies=[login_rate_limit],
 )  # include_in_schema=False to hide from docs if desired, or True to show
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
     """
@@ -43,7 +66,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
 
         access_token = create_access_token(
-            data={"sub": str(result["user"]["_id"])},
+            data=await auth_service.access_token_data(str(result["user"]["_id"])),
             expires_delta=timedelta(minutes=settings.access_token_expire_minutes),
         )
 
@@ -79,7 +102,7 @@ async def signup_with_email(request: EmailSignupRequest):
 
         # Create access token
         access_token = create_access_token(
-            data={"sub": str(result["user"]["_id"])},
+            data=await auth_service.access_token_data(str(result["user"]["_id"])),
             expires_delta=timedelta(minutes=settings.access_token_expire_minutes),
         )
 
@@ -100,7 +123,9 @@ async def signup_with_email(request: EmailSignupRequest):
         )
 
 
-@router.post("/login/email", response_model=AuthResponse)
+@router.post(
+    "/login/email", response_model=AuthResponse, dependencies=[login_rate_limit]
+)
 async def login_with_email(request: EmailLoginRequest):
     """
     Authenticates a user using email and password credentials.
@@ -114,7 +139,7 @@ async def login_with_email(request: EmailLoginRequest):
 
         # Create access token
         access_token = create_access_token(
-            data={"sub": str(result["user"]["_id"])},
+            data=await auth_service.access_token_data(str(result["user"]["_id"])),
             expires_delta=timedelta(minutes=settings.access_token_expire_minutes),
         )
 
@@ -147,7 +172,7 @@ async def login_with_google(request: GoogleLoginRequest):
 
         # Create access token
         access_token = create_access_token(
-            data={"sub": str(result["user"]["_id"])},
+            data=await auth_service.access_token_data(str(result["user"]["_id"])),
             expires_delta=timedelta(minutes=settings.access_token_expire_minutes),
         )
 
@@ -198,7 +223,7 @@ async def refresh_token(request: RefreshTokenRequest):
             )
         # Create new access token
         access_token = create_access_token(
-            data={"sub": str(token_record["user_id"])},
+            data=await auth_service.access_token_data(str(token_record["user_id"])),
             expires_delta=timedelta(minutes=settings.access_token_expire_minutes),
         )
 
@@ -1,7 +1,9 @@
 import secrets
+from contextvars import ContextVar
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
+from app.auth.group_claims import CLAIM, current_group_claim
 from app.config import settings
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
@@ -17,6 +19,12 @@ except Exception:
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")  # Updated tokenUrl
 
+# (token, payload) verified by POST /batch, reused by the sub-requests it
+# dispatches with the same token instead of decoding it once per sub-request
+verified_token: ContextVar[Optional[Tuple[str, Dict[str, Any]]]] = ContextVar(
+    "verified_token", default=None
+)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
@@ -115,7 +123,7 @@ def generate_reset_token() -> str:
     return secrets.token_urlsafe(32)
 
 
-def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
     """
     Retrieves the current user based on the provided JWT token using centralized verification.
 
@@ -128,10 +136,17 @@ def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
     Raises:
         HTTPException: If the token is invalid or user information cannot be extracted.
     """
-    payload = verify_token(token)  # Centralized JWT validation and error handling
+    verified = verified_token.get()
+    if verified and verified[0] == token:
+        payload = verified[1]
+    else:
+        payload = verify_token(token)  # Centralized JWT validation and error handling
     user_id = payload.get("sub")
     if user_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload"
         )
+    # Lets membership checks later in this request authorize from the token
+    claim = payload.get(CLAIM)
+    current_group_claim.set((user_id, claim) if isinstance(claim, dict) else None)
     return {"_id": user_id}
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, Optional
 
 import firebase_admin
+from app.auth.group_claims import CLAIM
 from app.auth.security import (
     create_access_token,
     create_refresh_token,
@@ -13,6 +14,7 @@ from app.auth.security import (
 )
 from app.config import logger, settings
 from app.database import get_database
+from app.groups import membership
 from bson import ObjectId
 from fastapi import HTTPException, status
 from firebase_admin import auth as firebase_auth
@@ -80,6 +82,26 @@ class AuthService:
         """
         return get_database()
 
+    async def access_token_data(self, user_id: str) -> Dict[str, Any]:
+        """
+        Builds the payload of a new access token for a user.
+
+        With ``token_group_claims`` enabled the payload also lists the user's
+        group memberships, letting group scoped endpoints authorize from the
+        token. The claim is optional: if it cannot be built, the token is
+        issued without it.
+        """
+        data = {"sub": user_id}
+        if settings.token_group_claims:
+            try:
+                claim = await membership.membership_claim(self.get_db(), user_id)
+            except PyMongoError as e:
+                logger.warning("Issuing token without group claim: %s", str(e))
+                claim = None
+            if claim is not None:
+                data[CLAIM] = claim
+        return data
+
     async def create_user_with_email(
         self, email: str, password: str, name: str
     ) -> Dict[str, Any]:
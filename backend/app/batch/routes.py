@@ -0,0 +1,29 @@
+import asyncio
+
+from app.auth.security import oauth2_scheme, verified_token, verify_token
+from app.batch.schemas import BatchRequest, BatchResponse
+from app.batch.service import dispatch
+from app.config import settings
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+router = APIRouter(tags=["Batch"])
+
+
+@router.post("/batch", response_model=BatchResponse)
+async def batch_requests(
+    payload: BatchRequest, request: Request, token: str = Depends(oauth2_scheme)
+):
+    """Run several GET requests concurrently in one round trip, authenticated once"""
+    if len(payload.requests) > settings.batch_max_requests:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch can hold at most {settings.batch_max_requests} requests",
+        )
+    reset = verified_token.set((token, verify_token(token)))
+    try:
+        responses = await asyncio.gather(
+            *(dispatch(request.app, request, sub) for sub in payload.requests)
+        )
+    finally:
+        verified_token.reset(reset)
+    return {"responses": responses}
@@ -0,0 +1,25 @@
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class BatchSubRequest(BaseModel):
+    method: str = Field("GET", pattern="^GET$")  # batches are for reads only
+    path: str = Field(..., pattern="^/")  # may include a query string
+    headers: Dict[str, str] = {}  # If-None-Match and Accept-Language are forwarded
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest] = Field(..., min_length=1)
+
+
+class BatchSubResponse(BaseModel):
+    status: int
+    headers: Dict[str, str] = {}
+    body: Any = None
+    # "base64" for bodies that are neither JSON nor text, such as attachments
+    bodyEncoding: Optional[str] = None
+
+
+class BatchResponse(BaseModel):
+    responses: List[BatchSubResponse]
@@ -13,6 +13,8 @@ class Settings(BaseSettings):
     # Database
     mongodb_url: str = "mongodb://localhost:27017"
     database_name: str = "splitwiser"
+    # Run multi-document writes (e.g. expense edits) in transactions; needs a replica set
+    mongodb_transactions: bool = False
 
     # JWT
     secret_key: str = "your-super-secret-jwt-key-change-this-in-production"
@@ -33,6 +35,75 @@ class Settings(BaseSettings):
     firebase_auth_provider_x509_cert_url: Optional[str] = None
     firebase_client_x509_cert_url: Optional[str] = None
 
+    # Attachments
+    attachment_backend: str = "local"  # "local" or "s3"
+    attachment_local_path: str = "./data/attachments"
+    attachment_max_bytes: int = 10 * 1024 * 1024
+    attachment_s3_bucket: Optional[str] = None
+    # Set to e.g. http://localhost:9000 to use MinIO/LocalStack instead of AWS
+    attachment_s3_endpoint_url: Optional[str] = None
+    attachment_s3_region: Optional[str] = None
+    attachment_s3_access_key_id: Optional[str] = None
+    attachment_s3_secret_access_key: Optional[str] = None
+    # Receipt thumbnails/previews are rendered in a process pool of this size
+    thumbnails_enabled: bool = True
+    thumbnail_workers: int = 2
+
+    # Live updates: "memory" for a single worker, "mongo" to fan out across workers
+    event_backend: str = "memory"
+    sse_heartbeat_seconds: int = 15
+    # Delta sync: deletes are remembered this long; older sync tokens get a full resync
+    sync_tombstone_retention_days: int = 30
+    # Group membership checks are cached per worker for this long
+    membership_cache_ttl_seconds: int = 30
+    # Embed the user's group ids and roles in access tokens (see app/auth/group_claims.py)
+    token_group_claims: bool = False
+    # Above this many groups the claim stores hashed group ids
+    token_group_claim_plain_limit: int = 20
+    # Users in more groups get no claim at all
+    token_group_claim_max_groups: int = 500
+    # Let large groups keep members in the group_members collection (see app/groups/members.py)
+    group_members_collection: bool = False
+    # Member count at which migration 0004 moves a group's members there
+    group_members_collection_min_members: int = 500
+    # POST /batch: sub-requests per batch, and how long each may take
+    batch_max_requests: int = 20
+    batch_request_timeout_seconds: float = 10.0
+    # Recompute settlement plans in a background task instead of in the write
+    # request (see app/expenses/planner.py)
+    settlement_plan_async: bool = False
+    # Plan recomputation requests for a group within this window are coalesced
+    settlement_plan_debounce_seconds: float = 0.5
+    # Token buckets for expensive endpoints (see app/ratelimit.py); "memory" limits
+    # per worker, "mongo" shares buckets across workers
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"
+    rate_limit_capacity: float = 60
+    rate_limit_refill_per_second: float = 1
+    # Proxies whose X-Forwarded-For gives the client address (comma separated
+    # addresses or networks); "*" trusts any peer (see app/ratelimit.py)
+    forwarded_allow_ips: str = "127.0.0.1"
+    # GET /metrics answers only requests with "Authorization: Bearer <token>";
+    # it is disabled while unset
+    metrics_token: Optional[str] = None
+    # Exchange rates (see app/currency.py) are reloaded from the exchange_rates
+    # collection this often; the rates file (app/data/exchange_rates.json unless
+    # set) is used when the collection is empty
+    exchange_rates_refresh_seconds: float = 3600
+    exchange_rates_file: Optional[str] = None
+    # Post due recurring expenses from a background task (see
+    # app/expenses/recurring.py). Off by default: enable it in one process only,
+    # since every enabled worker polls the same due definitions. Definitions
+    # are taken this many at a time
+    recurring_expenses_enabled: bool = False
+    recurring_expenses_poll_seconds: float = 60
+    recurring_expenses_batch_size: int = 500
+    # Occurrences of one definition posted per batch when catching up
+    recurring_expenses_max_catch_up: int = 50
+    # Expense search (app/expenses/search.py) ranks at most this many of the
+    # newest matches, which bounds its latency on large groups
+    search_max_candidates: int = 2000
+
     # App
     debug: bool = False
 
@@ -0,0 +1,132 @@
+"""
+Exchange rates for converting between group and user currencies.
+
+Rates are stored locally, one document per currency in ``exchange_rates``
+(``{"_id": "EUR", "rate": 0.92, "updatedAt": ...}``), each the amount of that
+currency worth one unit of a common base currency. Only ratios between rates
+are used, so any base works as long as every document uses the same one.
+
+Each worker keeps an in-memory snapshot of the table and reloads it once it
+is ``EXCHANGE_RATES_REFRESH_SECONDS`` old, so conversions never read the
+database per document or per request. When the collection is empty or cannot
+be read, rates come from ``EXCHANGE_RATES_FILE`` (a JSON file shaped like
+``app/data/exchange_rates.json``), which keeps conversions working offline;
+``scripts/load_exchange_rates.py`` imports such a file into the collection.
+
+Callers ask for the factors of all the currencies they are about to combine
+at once (``factors``) and apply them to amounts already summed per currency.
+"""
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+
+from app.config import logger, settings
+from app.database import mongodb
+
+DEFAULT_RATES_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "exchange_rates.json"
+)
+
+
+class UnknownCurrencyError(ValueError):
+    """A currency has no rate in the exchange-rate table."""
+
+    def __init__(self, currencies: Iterable[str]):
+        self.currencies = sorted(currencies)
+        super().__init__(f"No exchange rate for {', '.join(self.currencies)}")
+
+
+@dataclass
+class RateSnapshot:
+    """Rates per unit of a common base, as loaded at ``loadedAt``."""
+
+    rates: Dict[str, float]
+    source: str
+    loadedAt: float = field(default_factory=time.monotonic)
+
+    def factor(self, from_currency: str, to_currency: str) -> float:
+        """Multiplier converting an amount in ``from_currency`` to ``to_currency``."""
+        if from_currency == to_currency:
+            return 1.0
+        missing = {from_currency, to_currency} - self.rates.keys()
+        if missing:
+            raise UnknownCurrencyError(missing)
+        return self.rates[to_currency] / self.rates[from_currency]
+
+
+def load_rates_file(path: str) -> Dict[str, float]:
+    with open(path) as f:
+        data = json.load(f)
+    return {code.upper(): float(rate) for code, rate in data["rates"].items()}
+
+
+class ExchangeRates:
+    """The worker's snapshot of the exchange-rate table."""
+
+    def __init__(self, collection_name: str = "exchange_rates"):
+        self.collection_name = collection_name
+        self._snapshot: Optional[RateSnapshot] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def collection(self):
+        return mongodb.database[self.collection_name]
+
+    async def snapshot(self) -> RateSnapshot:
+        """The current snapshot, reloaded first if it is older than the interval."""
+        if self._is_fresh():
+            return self._snapshot
+        async with self._lock:
+            # Another request may have reloaded it while this one waited
+            if not self._is_fresh():
+                self._snapshot = await self._load()
+        return self._snapshot
+
+    async def factors(self, currencies: Iterable[str], target: str) -> Dict[str, float]:
+        """
+        Multiplier converting each of ``currencies`` to ``target``.
+
+        Raises ``UnknownCurrencyError`` naming every currency without a rate.
+        The table is not consulted when every currency already is ``target``.
+        """
+        currencies = set(currencies)
+        if currencies <= {target}:
+            return {target: 1.0}
+        snapshot = await self.snapshot()
+        missing = (currencies | {target}) - snapshot.rates.keys()
+        if missing:
+            raise UnknownCurrencyError(missing)
+        return {code: snapshot.factor(code, target) for code in currencies}
+
+    def invalidate(self) -> None:
+        """Reload the table on next use, e.g. after importing new rates."""
+        self._snapshot = None
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._snapshot is not None
+            and time.monotonic() - self._snapshot.loadedAt
+            < settings.exchange_rates_refresh_seconds
+        )
+
+    async def _load(self) -> RateSnapshot:
+        try:
+            docs = await self.collection.find({}, {"rate": 1}).to_list(None)
+            if docs:
+                return RateSnapshot(
+                    {doc["_id"]: float(doc["rate"]) for doc in docs}, "database"
+                )
+        except Exception as e:
+            logger.warning(f"Failed to load exchange rates: {e}")
+            if self._snapshot is not None and self._snapshot.source == "database":
+                # Keep the last rates read from the table, and retry next interval
+                return RateSnapshot(self._snapshot.rates, "database")
+        path = settings.exchange_rates_file or DEFAULT_RATES_FILE
+        return RateSnapshot(load_rates_file(path), path)
+
+
+exchange_rates = ExchangeRates()
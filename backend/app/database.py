@@ -33,6 +33,47 @@ async def close_mongo_connection():
         logger.info("Disconnected from MongoDB")
 
 
+async def ensure_indexes():
+    """
+    Creates the indexes the application's queries rely on.
+
+    Index creation is idempotent, so this runs on every startup. Failures are
+    logged rather than raised so the API can still start against a database
+    the app user cannot create indexes on.
+    """
+    db = mongodb.database
+    try:
+        await db.expenses.create_index([("groupId", 1), ("createdAt", -1)])
+        await db.expense_history.create_index([("expenseId", 1), ("editedAt", -1)])
+        # Delta sync (GET /groups/{group_id}/changes)
+        await db.expenses.create_index([("groupId", 1), ("updatedAt", 1)])
+        await db.settlements.create_index([("groupId", 1), ("updatedAt", 1)])
+        await db.tombstones.create_index([("groupId", 1), ("deletedAt", 1)])
+        await db.tombstones.create_index(
+            "deletedAt",
+            expireAfterSeconds=settings.sync_tombstone_retention_days * 86400,
+        )
+        # Group lists (GET /groups)
+        await db.groups.create_index("members.userId")
+        # Members of large groups (app/groups/members.py)
+        await db.group_members.create_index(
+            [("groupId", 1), ("userId", 1)], unique=True
+        )
+        await db.group_members.create_index([("groupId", 1), ("joinedAt", 1)])
+        await db.group_members.create_index("userId")
+        # Shared rate limit buckets (app/ratelimit.py)
+        await db.rate_limits.create_index("expiresAt", expireAfterSeconds=0)
+        # Due recurring expenses (app/expenses/recurring.py) and group lists of them
+        await db.recurring_expenses.create_index([("active", 1), ("nextRunAt", 1)])
+        await db.recurring_expenses.create_index([("groupId", 1), ("createdAt", -1)])
+        # Expense search (app/expenses/search.py)
+        await db.expenses.create_index(
+            [("groupId", 1), ("searchTokens", 1), ("createdAt", -1)]
+        )
+    except Exception as e:
+        logger.warning(f"Failed to ensure MongoDB indexes: {e}")
+
+
 def get_database():
     """
     Returns the current MongoDB database instance.
@@ -0,0 +1,208 @@
+"""
+In-process pub/sub hub for live group updates.
+
+Mutation paths publish compact change events (``expense.created``,
+``settlement.updated``, ...) on a per-group channel; the SSE endpoint
+subscribes to the channel and forwards them to clients. Delivery to
+subscribers in the same worker is direct. A pluggable backend fans events out
+to the other workers of a multi-process deployment.
+"""
+
+import asyncio
+import json
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Set
+
+from app.config import logger, settings
+from app.database import mongodb
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class EventBackend(ABC):
+    """Transport carrying events between workers."""
+
+    @abstractmethod
+    async def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        """Hand an event to the other workers."""
+
+    async def start(self, deliver: Callable[[str, Dict[str, Any]], None]) -> None:
+        """Start receiving events published by other workers."""
+
+    async def stop(self) -> None:
+        """Stop receiving events."""
+
+
+class InMemoryEventBackend(EventBackend):
+    """Single worker deployments: nothing to fan out."""
+
+    async def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        return None
+
+
+class MongoEventBackend(EventBackend):
+    """
+    Fans events out through a capped MongoDB collection.
+
+    Every worker tails the collection with a tailable cursor and delivers
+    events published by other workers to its local subscribers. Uses the
+    database the application already depends on, so no extra service is
+    needed to run several workers.
+    """
+
+    def __init__(
+        self, collection_name: str = "group_events", size_bytes: int = 16 * 1024 * 1024
+    ):
+        self.collection_name = collection_name
+        self.size_bytes = size_bytes
+        self.worker_id = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def collection(self):
+        return mongodb.database[self.collection_name]
+
+    async def _ensure_collection(self) -> None:
+        names = await mongodb.database.list_collection_names()
+        if self.collection_name not in names:
+            await mongodb.database.create_collection(
+                self.collection_name, capped=True, size=self.size_bytes
+            )
+
+    async def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        await self.collection.insert_one(
+            {
+                "channel": channel,
+                "event": event,
+                "origin": self.worker_id,
+                "createdAt": datetime.now(timezone.utc),
+            }
+        )
+
+    async def start(self, deliver: Callable[[str, Dict[str, Any]], None]) -> None:
+        await self._ensure_collection()
+        self._task = asyncio.create_task(self._tail(deliver))
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _tail(self, deliver: Callable[[str, Dict[str, Any]], None]) -> None:
+        from pymongo import CursorType
+
+        # Only events published after this worker started are of interest
+        last = await self.collection.find_one(sort=[("$natural", -1)])
+        query = {"_id": {"$gt": last["_id"]}} if last else {}
+        while True:
+            try:
+                cursor = self.collection.find(
+                    query, cursor_type=CursorType.TAILABLE_AWAIT
+                )
+                async for doc in cursor:
+                    query = {"_id": {"$gt": doc["_id"]}}
+                    if doc.get("origin") != self.worker_id:
+                        deliver(doc["channel"], doc["event"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Event tailing interrupted, retrying: {e}")
+            await asyncio.sleep(1)
+
+
+class EventHub:
+    """Routes published events to the local subscribers of a channel."""
+
+    def __init__(self, backend: Optional[EventBackend] = None):
+        self.backend = backend or InMemoryEventBackend()
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    async def start(self) -> None:
+        await self.backend.start(self._deliver_local)
+
+    async def stop(self) -> None:
+        await self.backend.stop()
+
+    def subscriber_count(self, channel: str) -> int:
+        return len(self._subscribers.get(channel, ()))
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        """Yield a queue receiving every event published on ``channel``."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(channel, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    async def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        self._deliver_local(channel, event)
+        await self.backend.publish(channel, event)
+
+    def _deliver_local(self, channel: str, event: Dict[str, Any]) -> None:
+        for queue in list(self._subscribers.get(channel, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A slow consumer missed events: tell it to refetch instead
+                _drain(queue)
+                queue.put_nowait({"type": "resync"})
+
+
+def _drain(queue: asyncio.Queue) -> None:
+    while not queue.empty():
+        queue.get_nowait()
+
+
+def _create_backend() -> EventBackend:
+    if settings.event_backend == "mongo":
+        return MongoEventBackend()
+    return InMemoryEventBackend()
+
+
+event_hub = EventHub(_create_backend())
+
+
+def group_channel(group_id: str) -> str:
+    return f"group:{group_id}"
+
+
+async def publish_group_event(group_id: str, event_type: str, **data: Any) -> None:
+    """
+    Publish a change event for a group.
+
+    Failures are logged and swallowed: a missed live update must never fail
+    the write that caused it.
+    """
+    event = {
+        "type": event_type,
+        "groupId": group_id,
+        "at": datetime.now(timezone.utc).isoformat(),
+        **data,
+    }
+    try:
+        await event_hub.publish(group_channel(group_id), event)
+    except Exception as e:
+        logger.warning(f"Failed to publish {event_type} for group {group_id}: {e}")
+
+
+def format_sse(event: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    """Encode an event in the text/event-stream wire format."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event['type']}")
+    lines.append(f"data: {json.dumps(event, separators=(',', ':'), default=str)}")
+    return "\n".join(lines) + "\n\n"
@@ -0,0 +1,371 @@
+"""
+Pluggable storage for expense attachments (receipts).
+
+Uploads are streamed to storage in fixed-size chunks while being hashed, so a
+request never holds a whole file in memory. Blobs are content addressed: the
+storage key is the SHA-256 of the content, which deduplicates identical
+receipts uploaded to several expenses.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional
+
+from app.config import logger, settings
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.responses import FileResponse, Response, StreamingResponse
+
+CHUNK_SIZE = 1024 * 1024
+# Keys are content hashes, so a stored blob never changes
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+# A content hash, optionally followed by a derivative name (e.g. "<sha256>_thumbnail")
+KEY_PATTERN = re.compile(r"^[0-9a-f]{64}(_[a-z]+)?$")
+
+
+def derivative_key(key: str, name: str) -> str:
+    """Storage key of a derivative (thumbnail, preview) stored next to its original."""
+    return f"{key}_{name}"
+
+
+class AttachmentTooLargeError(Exception):
+    """Raised when an upload exceeds the configured size cap."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Attachment exceeds the {max_bytes} byte limit")
+        self.max_bytes = max_bytes
+
+
+@dataclass
+class StoredAttachment:
+    key: str
+    size: int
+    sha256: str
+    deduplicated: bool = False
+
+
+async def _spool_upload(upload, directory: Optional[str], max_bytes: int):
+    """
+    Copy an upload into a temporary file chunk by chunk while hashing it.
+
+    Returns the temporary file path, its size and the hex SHA-256 digest. The
+    caller owns the temporary file.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(prefix="upload-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise AttachmentTooLargeError(max_bytes)
+                digest.update(chunk)
+                await run_in_threadpool(tmp.write, chunk)
+    except BaseException:
+        _remove_quietly(tmp_path)
+        raise
+    return tmp_path, size, digest.hexdigest()
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class AttachmentStore(ABC):
+    """Interface every attachment backend implements."""
+
+    @abstractmethod
+    async def save(self, upload, max_bytes: int) -> StoredAttachment:
+        """Stream an upload (anything with ``async read(n)``) into storage."""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Return whether a blob with this key is stored."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove a blob; missing keys are ignored."""
+
+    @abstractmethod
+    async def put_bytes(self, key: str, data: bytes) -> None:
+        """Store a small, already materialised blob such as a thumbnail."""
+
+    @abstractmethod
+    def local_copy(self, key: str) -> AsyncIterator[str]:
+        """Async context manager yielding a local filesystem path of the blob."""
+
+    @abstractmethod
+    async def stream_response(
+        self,
+        key: str,
+        media_type: Optional[str],
+        headers: Dict[str, str],
+        range_header: Optional[str] = None,
+    ) -> Response:
+        """
+        Build a response serving the blob without loading it into memory.
+
+        Honours a ``Range`` request header where the backend supports it.
+        Raises ``FileNotFoundError`` if the blob is missing.
+        """
+
+
+class LocalAttachmentStore(AttachmentStore):
+    """Stores blobs on the local filesystem under ``root/ab/cd/<sha256>``."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path_for(self, key: str) -> str:
+        if not KEY_PATTERN.match(key):
+            raise ValueError("Invalid attachment key")
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    # Filesystem calls run in the threadpool, like the spooling, so a slow
+    # disk does not stall the event loop
+
+    async def save(self, upload, max_bytes: int) -> StoredAttachment:
+        tmp_path, size, sha256 = await _spool_upload(upload, self.tmp_dir, max_bytes)
+        final_path = self.path_for(sha256)
+        moved = await run_in_threadpool(self._move_into_place, tmp_path, final_path)
+        return StoredAttachment(sha256, size, sha256, deduplicated=not moved)
+
+    def _move_into_place(self, tmp_path: str, final_path: str) -> bool:
+        """Move a spooled file to its key; False if the blob was already stored."""
+        if os.path.exists(final_path):
+            _remove_quietly(tmp_path)
+            return False
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        # Same filesystem as tmp_dir, so the rename is atomic
+        os.replace(tmp_path, final_path)
+        return True
+
+    async def exists(self, key: str) -> bool:
+        return await run_in_threadpool(os.path.exists, self.path_for(key))
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(_remove_quietly, self.path_for(key))
+
+    async def put_bytes(self, key: str, data: bytes) -> None:
+        await run_in_threadpool(self._write, self.path_for(key), data)
+
+    def _write(self, final_path: str, data: bytes) -> None:
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix="derived-", dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            _remove_quietly(tmp_path)
+            raise
+
+    @asynccontextmanager
+    async def local_copy(self, key: str):
+        path = self.path_for(key)
+        if not await run_in_threadpool(os.path.exists, path):
+            raise FileNotFoundError(key)
+        yield path
+
+    async def stream_response(
+        self,
+        key: str,
+        media_type: Optional[str],
+        headers: Dict[str, str],
+        range_header: Optional[str] = None,
+    ) -> Response:
+        path = self.path_for(key)
+        if not await run_in_threadpool(os.path.exists, path):
+            raise FileNotFoundError(key)
+        # FileResponse handles Range/If-Range itself and hands the path to the
+        # server via the ASGI pathsend extension (sendfile) when available
+        return FileResponse(
+            path,
+            media_type=media_type,
+            headers=headers,
+            content_disposition_type="inline",
+        )
+
+
+class S3AttachmentStore(AttachmentStore):
+    """
+    Stores blobs in an S3 compatible bucket.
+
+    ``endpoint_url`` points the client at a local stand-in such as MinIO or
+    LocalStack. Uploads are spooled to a temporary file first (the key depends
+    on the content hash) and then sent with boto3's managed multipart upload,
+    so memory use stays bounded by the chunk size.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        region_name: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None,
+        prefix: str = "attachments/",
+    ):
+        try:
+            import boto3
+        except ImportError as e:
+            raise RuntimeError(
+                "The s3 attachment backend requires boto3 (pip install boto3)"
+            ) from e
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region_name,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+        )
+
+    def object_key(self, key: str) -> str:
+        if not KEY_PATTERN.match(key):
+            raise ValueError("Invalid attachment key")
+        return f"{self.prefix}{key}"
+
+    async def save(self, upload, max_bytes: int) -> StoredAttachment:
+        tmp_path, size, sha256 = await _spool_upload(upload, None, max_bytes)
+        try:
+            if await self.exists(sha256):
+                return StoredAttachment(sha256, size, sha256, deduplicated=True)
+            await run_in_threadpool(
+                self.client.upload_file,
+                tmp_path,
+                self.bucket,
+                self.object_key(sha256),
+            )
+            return StoredAttachment(sha256, size, sha256)
+        finally:
+            _remove_quietly(tmp_path)
+
+    async def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            await run_in_threadpool(
+                self.client.head_object, Bucket=self.bucket, Key=self.object_key(key)
+            )
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return False
+            raise
+
+    async def delete(self, key: str) -> None:
+        await run_in_threadpool(
+            self.client.delete_object, Bucket=self.bucket, Key=self.object_key(key)
+        )
+
+    async def put_bytes(self, key: str, data: bytes) -> None:
+        await run_in_threadpool(
+            self.client.put_object,
+            Bucket=self.bucket,
+            Key=self.object_key(key),
+            Body=data,
+        )
+
+    @asynccontextmanager
+    async def local_copy(self, key: str):
+        from botocore.exceptions import ClientError
+
+        fd, tmp_path = tempfile.mkstemp(prefix="download-")
+        os.close(fd)
+        try:
+            try:
+                await run_in_threadpool(
+                    self.client.download_file,
+                    self.bucket,
+                    self.object_key(key),
+                    tmp_path,
+                )
+            except ClientError as e:
+                raise FileNotFoundError(key) from e
+            yield tmp_path
+        finally:
+            _remove_quietly(tmp_path)
+
+    async def stream_response(
+        self,
+        key: str,
+        media_type: Optional[str],
+        headers: Dict[str, str],
+        range_header: Optional[str] = None,
+    ) -> Response:
+        from botocore.exceptions import ClientError
+
+        params = {"Bucket": self.bucket, "Key": self.object_key(key)}
+        if range_header:
+            # S3 evaluates the range and answers with the matching part
+            params["Range"] = range_header
+        try:
+            obj = await run_in_threadpool(self.client.get_object, **params)
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            if code in ("404", "NoSuchKey"):
+                raise FileNotFoundError(key) from e
+            if code == "InvalidRange":
+                return Response(status_code=416, headers=headers)
+            raise
+
+        response_headers = {
+            **headers,
+            "accept-ranges": "bytes",
+            "content-length": str(obj["ContentLength"]),
+        }
+        status_code = 200
+        if obj.get("ContentRange"):
+            response_headers["content-range"] = obj["ContentRange"]
+            status_code = 206
+
+        return StreamingResponse(
+            iterate_in_threadpool(obj["Body"].iter_chunks(CHUNK_SIZE)),
+            status_code=status_code,
+            media_type=media_type,
+            headers=response_headers,
+        )
+
+
+def etag_for(key: str) -> str:
+    """Strong ETag for a content-addressed blob."""
+    return f'"{key}"'
+
+
+_store: Optional[AttachmentStore] = None
+
+
+def get_attachment_store() -> AttachmentStore:
+    """Return the configured attachment store, creating it on first use."""
+    global _store
+    if _store is None:
+        if settings.attachment_backend == "s3":
+            if not settings.attachment_s3_bucket:
+                raise RuntimeError("ATTACHMENT_S3_BUCKET must be set for s3 storage")
+            _store = S3AttachmentStore(
+                bucket=settings.attachment_s3_bucket,
+                endpoint_url=settings.attachment_s3_endpoint_url,
+                region_name=settings.attachment_s3_region,
+                access_key_id=settings.attachment_s3_access_key_id,
+                secret_access_key=settings.attachment_s3_secret_access_key,
+            )
+        else:
+            _store = LocalAttachmentStore(settings.attachment_local_path)
+        logger.info(f"Attachment storage backend: {settings.attachment_backend}")
+    return _store
@@ -0,0 +1,67 @@
+"""
+Sparse fieldsets for expense and settlement reads.
+
+``?fields=description,amount,createdAt`` limits a response to the listed
+fields (``id`` is always included). The selection becomes a MongoDB
+projection, so the database reads and ships less, and a trimmed copy of the
+response model, so only the selected fields are validated and serialized.
+"""
+
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Optional, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, create_model
+
+
+def _api_names(model: Type[BaseModel]) -> Dict[str, str]:
+    """Field name as clients may write it -> model field name."""
+    names = {name: name for name in model.model_fields}
+    names.update(
+        {info.alias: name for name, info in model.model_fields.items() if info.alias}
+    )
+    return names
+
+
+def parse_fields(
+    fields: Optional[str], model: Type[BaseModel]
+) -> Optional[FrozenSet[str]]:
+    """Model field names selected by a ``fields`` parameter, or None for all."""
+    if not fields:
+        return None
+    names = _api_names(model)
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = sorted(requested - names.keys())
+    if unknown:
+        raise HTTPException(
+            status_code=400, detail=f"Unknown fields: {', '.join(unknown)}"
+        )
+    return frozenset({names[name] for name in requested} | {"id"})
+
+
+def field_projection(
+    fields: FrozenSet[str], also: Iterable[str] = ()
+) -> Dict[str, int]:
+    """MongoDB projection for the selected fields plus ones the service needs."""
+    return {name: 1 for name in (set(fields) | set(also)) - {"id"}}
+
+
+@lru_cache(maxsize=256)
+def trimmed_model(model: Type[BaseModel], fields: FrozenSet[str]) -> Type[BaseModel]:
+    """Copy of ``model`` with only the selected fields."""
+    return create_model(
+        f"{model.__name__}Fields",
+        __config__=model.model_config,
+        **{
+            name: (info.annotation, info)
+            for name, info in model.model_fields.items()
+            if name in fields
+        },
+    )
+
+
+def build(model: Type[BaseModel], fields: Optional[FrozenSet[str]], data: dict):
+    """``model(**data)``, trimmed to the selected fields if there are any."""
+    if fields is None:
+        return model(**data)
+    return trimmed_model(model, fields)(**data)
@@ -0,0 +1,112 @@
+"""
+Background recomputation of settlement plans.
+
+With ``SETTLEMENT_PLAN_ASYNC`` enabled, expense and settlement writes no longer
+compute the group's optimized settlement plan before responding. They request
+a recomputation here instead, and the plan is stored in ``settlement_plans``
+(see ``ExpenseService.compute_settlement_plan``). Writes return the group's
+``changeVersion`` as ``planVersion``; the stored plan whose ``version`` is at
+least that includes the write, and a ``plan.updated`` event carrying the
+version is published when it is stored.
+
+Requests are coalesced per group: the first one starts a
+``SETTLEMENT_PLAN_DEBOUNCE_SECONDS`` window, and every request for the group
+arriving within it is served by the single computation that follows. At most
+one computation per group runs at a time; requests arriving while it runs
+schedule exactly one more after it. A burst of writes, such as an import,
+therefore costs one or two computations instead of one per write.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from app.config import logger, settings
+from app.metrics import counter
+
+plan_requests = counter(
+    "splitwiser_settlement_plan_requests_total",
+    "Settlement plan recomputations requested by writes",
+)
+plan_computations = counter(
+    "splitwiser_settlement_plan_computations_total",
+    "Settlement plans computed by the background planner",
+)
+
+
+class SettlementPlanner:
+    """Per-group debounced, single-flight scheduler of plan recomputations."""
+
+    def __init__(self, debounce_seconds: Optional[float] = None):
+        self.debounce_seconds = debounce_seconds
+        self._compute: Optional[Callable[[str], Awaitable[object]]] = None
+        # One task per group with a computation scheduled or running
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._running: Set[str] = set()
+        # Groups that got a request while their computation was running
+        self._dirty: Set[str] = set()
+        # Groups requested before the planner was started
+        self._deferred: Set[str] = set()
+
+    @property
+    def window(self) -> float:
+        if self.debounce_seconds is not None:
+            return self.debounce_seconds
+        return settings.settlement_plan_debounce_seconds
+
+    async def start(self, compute: Callable[[str], Awaitable[object]]) -> None:
+        self._compute = compute
+        for group_id in self._deferred:
+            self._tasks[group_id] = asyncio.create_task(self._run(group_id))
+        self._deferred.clear()
+
+    async def stop(self) -> None:
+        self._compute = None
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._dirty.clear()
+
+    def request(self, group_id: str) -> None:
+        """Ask for the group's plan to be recomputed soon."""
+        plan_requests.inc()
+        if self._compute is None:
+            self._deferred.add(group_id)
+        elif group_id not in self._tasks:
+            self._tasks[group_id] = asyncio.create_task(self._run(group_id))
+        elif group_id in self._running:
+            self._dirty.add(group_id)
+        # Otherwise the scheduled computation has not started and will see it
+
+    def pending(self) -> int:
+        """Groups with a computation scheduled or running."""
+        return len(self._tasks) + len(self._deferred)
+
+    async def join(self) -> None:
+        """Wait until every scheduled computation has run."""
+        while self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    async def _run(self, group_id: str) -> None:
+        try:
+            while True:
+                await asyncio.sleep(self.window)
+                self._running.add(group_id)
+                try:
+                    plan_computations.inc()
+                    await self._compute(group_id)
+                except Exception as e:
+                    logger.error(
+                        f"Failed to recompute settlement plan of {group_id}: {e}"
+                    )
+                finally:
+                    self._running.discard(group_id)
+                if group_id not in self._dirty:
+                    break
+                # Writes landed during the computation: one more, after a window
+                self._dirty.discard(group_id)
+        finally:
+            self._tasks.pop(group_id, None)
+
+
+settlement_planner = SettlementPlanner()
@@ -0,0 +1,127 @@
+"""
+Recurring expenses: occurrence dates, occurrence ids and the scheduler.
+
+A recurring expense definition (``recurring_expenses``) describes an expense
+to post every ``interval`` days, weeks, months or years from ``startAt``. Its
+``occurrences`` counts the occurrences posted so far and ``nextRunAt`` is the
+date of the next one, so due definitions are found with one indexed query.
+
+``RecurringScheduler`` periodically asks ``ExpenseService.materialize_due_expenses``
+to post everything due, across all groups, a batch of definitions at a time
+with bulk writes. After downtime it keeps taking batches until nothing is due,
+so missed occurrences are caught up at batch speed rather than one per poll.
+
+Occurrence ``n`` of a definition always gets the same expense id (and its
+settlements the same ids, see ``derived_id``), so posting it twice, e.g. after
+a crash between writes or from two workers at once, inserts it only once.
+"""
+
+import asyncio
+import calendar
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from app.config import logger, settings
+from app.metrics import counter
+from bson import ObjectId
+
+posted_occurrences = counter(
+    "splitwiser_recurring_expenses_posted_total",
+    "Expenses posted from recurring expense definitions",
+)
+
+
+def as_utc(value: datetime) -> datetime:
+    """Naive UTC, like the other dates stored with expenses."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def derived_id(*parts: str) -> ObjectId:
+    """An ObjectId that is the same whenever it is derived from the same parts."""
+    digest = hashlib.sha1(":".join(parts).encode()).digest()
+    return ObjectId(digest[:12])
+
+
+def occurrence_id(definition_id: str, n: int) -> ObjectId:
+    """Id of the expense posted for occurrence ``n`` of a definition."""
+    return derived_id("recurring", definition_id, str(n))
+
+
+def _add_months(start: datetime, months: int) -> datetime:
+    month = start.month - 1 + months
+    year, month = start.year + month // 12, month % 12 + 1
+    # The 31st posts on the last day of shorter months
+    day = min(start.day, calendar.monthrange(year, month)[1])
+    return start.replace(year=year, month=month, day=day)
+
+
+def occurrence_at(definition: dict, n: int) -> datetime:
+    """
+    Date of occurrence ``n`` (from 0). Always computed from ``startAt`` so
+    months clamped to a shorter length do not shift later occurrences.
+    """
+    start, every = definition["startAt"], definition["interval"] * n
+    frequency = definition["frequency"]
+    if frequency == "daily":
+        return start + timedelta(days=every)
+    if frequency == "weekly":
+        return start + timedelta(weeks=every)
+    if frequency == "monthly":
+        return _add_months(start, every)
+    return _add_months(start, 12 * every)
+
+
+def next_run_at(definition: dict, n: int) -> Optional[datetime]:
+    """Date of occurrence ``n``, or None when the definition ends before it."""
+    at = occurrence_at(definition, n)
+    end = definition.get("endAt")
+    return None if end is not None and at > end else at
+
+
+class RecurringScheduler:
+    """Posts due recurring expenses every ``RECURRING_EXPENSES_POLL_SECONDS``."""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, materialize: Callable[[datetime], Awaitable[int]]) -> None:
+        if settings.recurring_expenses_enabled and self._task is None:
+            self._task = asyncio.create_task(self._run(materialize))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, materialize: Callable[[datetime], Awaitable[int]]) -> None:
+        while True:
+            try:
+                await self.catch_up(materialize)
+            except Exception as e:
+                logger.error(f"Failed to post recurring expenses: {e}")
+            await asyncio.sleep(settings.recurring_expenses_poll_seconds)
+
+    @staticmethod
+    async def catch_up(
+        materialize: Callable[[datetime], Awaitable[int]],
+        now: Optional[datetime] = None,
+    ) -> int:
+        """
+        Post batches until no definition is due at ``now``. Every processed
+        definition is advanced or stopped, so this ends; returns the number
+        of definitions processed.
+        """
+        now = now or datetime.utcnow()
+        total = 0
+        while True:
+            processed = await materialize(now)
+            if not processed:
+                return total
+            total += processed
+
+
+recurring_scheduler = RecurringScheduler()
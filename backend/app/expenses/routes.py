@@ -1,34 +1,54 @@
 import io
-import uuid
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
 
 from app.auth.security import get_current_user
 from app.config import logger
+from app.expenses.attachments import (
+    CACHE_CONTROL,
+    etag_for,
+    get_attachment_store,
+)
+from app.expenses.fields import parse_fields
 from app.expenses.schemas import (
     AttachmentUploadResponse,
     BalanceSummaryResponse,
     ExpenseAnalytics,
     ExpenseCreateRequest,
     ExpenseCreateResponse,
+    ExpenseHistoryResponse,
     ExpenseListResponse,
     ExpenseResponse,
+    ExpenseSearchResponse,
     ExpenseUpdateRequest,
     FriendsBalanceResponse,
+    GroupChangesResponse,
+    GroupDashboardResponse,
     OptimizedSettlementsResponse,
+    RecurringExpenseCreateRequest,
+    RecurringExpenseResponse,
+    SettleAllResponse,
     Settlement,
+    SettlementBulkUpdateRequest,
+    SettlementBulkUpdateResponse,
     SettlementCreateRequest,
     SettlementListResponse,
+    SettlementPlanResponse,
     SettlementUpdateRequest,
     UserBalance,
 )
 from app.expenses.service import expense_service
+from app.http_cache import check_group_etag, etag_matches
+from app.ratelimit import rate_limit
+from app.responses import ORJSONModelResponse
 from fastapi import (
     APIRouter,
+    BackgroundTasks,
     Depends,
     File,
     HTTPException,
     Query,
+    Request,
     Response,
     UploadFile,
     status,
@@ -56,53 +76,207 @@ async def create_expense(
             group_id, expense_data, current_user["_id"]
         )
         return result
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        logger.error(f"Error creating expense: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to create expense")
 
 
 @router.get("/expenses", response_model=ExpenseListResponse)
 async def list_group_expenses(
     group_id: str,
+    request: Request,
+    response: Response,
     page: int = Query(1, ge=1),
     limit: int = Query(20, ge=1, le=100),
     from_date: Optional[datetime] = Query(None, alias="from"),
     to_date: Optional[datetime] = Query(None, alias="to"),
     tags: Optional[str] = Query(None),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return; id is always included"
+    ),
     current_user: Dict[str, Any] = Depends(get_current_user),
 ):
     """List all expenses for a group with pagination and filtering"""
+    selected = parse_fields(fields, ExpenseResponse)
+    not_modified = await check_group_etag(
+        request, response, group_id, current_user["_id"]
+    )
+    if not_modified:
+        return not_modified
     try:
         tag_list = tags.split(",") if tags else None
         result = await expense_service.list_group_expenses(
-            group_id, current_user["_id"], page, limit, from_date, to_date, tag_list
+            group_id,
+            current_user["_id"],
+            page,
+            limit,
+            from_date,
+            to_date,
+            tag_list,
+            selected,
         )
-        return result
+        return ORJSONModelResponse(result, headers=response.headers)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to fetch expenses")
 
 
+@router.get("/expenses/search", response_model=ExpenseSearchResponse)
+async def search_group_expenses(
+    group_id: str,
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    min_amount: Optional[float] = Query(None, ge=0, alias="minAmount"),
+    max_amount: Optional[float] = Query(None, ge=0, alias="maxAmount"),
+    paid_by: Optional[str] = Query(None, alias="paidBy"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return; id is always included"
+    ),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Search the group's expenses by description and tag word prefixes"""
+    selected = parse_fields(fields, ExpenseResponse)
+    not_modified = await check_group_etag(
+        request, response, group_id, current_user["_id"]
+    )
+    if not_modified:
+        return not_modified
+    try:
+        result = await expense_service.search_group_expenses(
+            group_id,
+            current_user["_id"],
+            q,
+            min_amount,
+            max_amount,
+            paid_by,
+            limit,
+            cursor,
+            selected,
+        )
+        return ORJSONModelResponse(result, headers=response.headers)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to search expenses of group {group_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to search expenses")
+
+
+@router.get("/dashboard", response_model=GroupDashboardResponse)
+async def get_group_dashboard(
+    group_id: str,
+    request: Request,
+    response: Response,
+    expense_limit: int = Query(20, ge=1, le=100, alias="expenseLimit"),
+    algorithm: str = Query(
+        "advanced", description="Settlement algorithm: 'normal' or 'advanced'"
+    ),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Group details, members, first expense page, own balance and settlement plan in one call"""
+    not_modified = await check_group_etag(
+        request, response, group_id, current_user["_id"]
+    )
+    if not_modified:
+        return not_modified
+    try:
+        return await expense_service.get_group_dashboard(
+            group_id, current_user["_id"], expense_limit, algorithm
+        )
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to build dashboard for group {group_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch group dashboard")
+
+
 @router.get("/expenses/{expense_id}")
 async def get_single_expense(
     group_id: str,
     expense_id: str,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return; id is always included"
+    ),
     current_user: Dict[str, Any] = Depends(get_current_user),
 ):
     """Retrieve details for a single expense"""
+    selected = parse_fields(fields, ExpenseResponse)
+    not_modified = await check_group_etag(
+        request, response, group_id, current_user["_id"]
+    )
+    if not_modified:
+        return not_modified
     try:
         result = await expense_service.get_expense_by_id(
-            group_id, expense_id, current_user["_id"]
+            group_id, expense_id, current_user["_id"], selected
         )
-        return result
+        return ORJSONModelResponse(result, headers=response.headers)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to fetch expense")
 
 
+@router.get("/expenses/{expense_id}/history", response_model=ExpenseHistoryResponse)
+async def get_expense_history(
+    group_id: str,
+    expense_id: str,
+    request: Request,
+    response: Response,
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Retrieve the edit history of an expense, newest first"""
+    not_modified = await check_group_etag(
+        request, response, group_id, current_user["_id"]
+    )
+    if not_modified:
+        return not_modified
+    try:
+        result = await expense_service.get_expense_history(
+            group_id, expense_id, current_user["_id"], page, limit
+        )
+        return ORJSONModelResponse(result, headers=response.headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching expense history: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to fetch expense history")
+
+
+@router.get("/changes", response_model=GroupChangesResponse)
+async def get_group_changes(
+    group_id: str,
+    since: Optional[str] = Query(None, description="nextToken of the previous sync"),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Expenses, settlements and members changed since the last sync"""
+    try:
+        result = await expense_service.get_group_changes(
+            group_id, current_user["_id"], since
+        )
+        return ORJSONModelResponse(result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching group changes: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to fetch changes")
+
+
 @router.patch("/expenses/{expense_id}", response_model=ExpenseResponse)
 async def update_expense(
     group_id: str,
@@ -145,6 +319,73 @@ async def delete_expense(
         raise HTTPException(status_code=500, detail="Failed to delete expense")
 
 
+# Recurring Expenses
+
+
+@router.post(
+    "/recurring-expenses",
+    response_model=RecurringExpenseResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_recurring_expense(
+    group_id: str,
+    data: RecurringExpenseCreateRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Define an expense that is posted automatically on a schedule"""
+    try:
+        return await expense_service.create_recurring_expense(
+            group_id, data, current_user["_id"]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to create recurring expense: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=500, detail="Failed to create recurring expense"
+        )
+
+
+@router.get("/recurring-expenses", response_model=List[RecurringExpenseResponse])
+async def list_recurring_expenses(
+    group_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """List the group's recurring expenses"""
+    try:
+        return await expense_service.list_recurring_expenses(
+            group_id, current_user["_id"]
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to list recurring expenses of group {group_id}: {e}")
+        raise HTTPException(
+            status_code=500, detail="Failed to fetch recurring expenses"
+        )
+
+
+@router.delete("/recurring-expenses/{recurring_id}")
+async def delete_recurring_expense(
+    group_id: str,
+    recurring_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Stop a recurring expense; expenses it already posted are kept"""
+    try:
+        await expense_service.delete_recurring_expense(
+            group_id, recurring_id, current_user["_id"]
+        )
+        return {"success": True}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to delete recurring expense {recurring_id}: {e}")
+        raise HTTPException(
+            status_code=500, detail="Failed to delete recurring expense"
+        )
+
+
 # Attachment Handling
 
 
@@ -156,32 +397,38 @@ async def delete_expense(
 async def upload_attachment_for_expense(
     group_id: str,
     expense_id: str,
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: Dict[str, Any] = Depends(get_current_user),
 ):
     """Upload attachment for an expense"""
     try:
-        # Verify user has access to the expense
-        await expense_service.get_expense_by_id(
-            group_id, expense_id, current_user["_id"]
+        attachment = await expense_service.upload_attachment(
+            group_id, expense_id, file, current_user["_id"]
         )
-
-        # Generate unique key for the attachment
-        file_extension = file.filename.split(".")[-1] if "." in file.filename else ""
-        attachment_key = f"{expense_id}_{uuid.uuid4().hex}.{file_extension}"
-
-        # In a real implementation, you would upload to cloud storage (S3, etc.)
-        # For now, we'll simulate this
-        file_content = await file.read()
-
-        # Store file metadata (in practice, store the actual file and return the URL)
-        url = f"https://storage.example.com/attachments/{attachment_key}"
-
-        return AttachmentUploadResponse(attachment_key=attachment_key, url=url)
+        # Thumbnails are rendered after the response has been sent
+        background_tasks.add_task(
+            expense_service.generate_attachment_derivatives,
+            group_id,
+            expense_id,
+            attachment["key"],
+            attachment["contentType"],
+        )
+        return AttachmentUploadResponse(
+            attachment_key=attachment["key"],
+            url=attachment["url"],
+            size=attachment["size"],
+            contentType=attachment["contentType"],
+        )
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
+        logger.error(f"Attachment upload failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to upload attachment")
+    finally:
+        await file.close()
 
 
 @router.get("/expenses/{expense_id}/attachments/{key}")
@@ -189,23 +436,50 @@ async def get_attachment(
     group_id: str,
     expense_id: str,
     key: str,
+    request: Request,
+    variant: Optional[str] = Query(
+        None,
+        pattern="^(thumbnail|preview)$",
+        description="Serve a downscaled derivative instead of the original",
+    ),
     current_user: Dict[str, Any] = Depends(get_current_user),
 ):
     """Get/download an attachment"""
     try:
-        # Verify user has access to the expense
-        await expense_service.get_expense_by_id(
-            group_id, expense_id, current_user["_id"]
+        attachment = await expense_service.get_attachment(
+            group_id, expense_id, key, current_user["_id"]
         )
 
-        # In a real implementation, you would fetch from cloud storage
-        # For now, we'll return a placeholder response
-        raise HTTPException(
-            status_code=501, detail="Attachment download not implemented"
+        blob_key = attachment["key"]
+        media_type = attachment.get("contentType") or "application/octet-stream"
+        if variant:
+            blob_key = (attachment.get("derivatives") or {}).get(variant)
+            if not blob_key:
+                raise HTTPException(status_code=404, detail="Variant not available")
+            media_type = "image/jpeg"
+
+        etag = etag_for(blob_key)
+        cache_headers = {"etag": etag, "cache-control": CACHE_CONTROL}
+
+        # Content-addressed blobs never change, so a matching ETag is always fresh
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=cache_headers)
+
+        return await get_attachment_store().stream_response(
+            blob_key,
+            media_type=media_type,
+            headers=cache_headers,
+            range_header=request.headers.get("range"),
         )
+    except HTTPException:
+        raise
+    except FileNotFoundError:
+        logger.error(f"Attachment {key} is referenced but missing from storage")
+        raise HTTPException(status_code=404, detail="Attachment not found")
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
+        logger.error(f"Attachment download failed: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Failed to get attachment")
 
 
@@ -235,19 +509,30 @@ async def manually_record_payment(
 @router.get("/settlements", response_model=SettlementListResponse)
 async def get_group_settlements(
     group_id: str,
+    request: Request,
+    response: Response,
     status_filter: Optional[str] = Query(None, alias="status"),
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=100),
     algorithm: str = Query(
         "advanced", description="Settlement algorithm: 'normal' or 'advanced'"
     ),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return; id is always included"
+    ),
     current_user: Dict[str, Any] = Depends(get_current_user),
 ):
     """Retrieve pending and optimized settlements for a group"""
+    selected = parse_fields(fields, Settlement)
+    not_modified = await check_group_etag(
+        request, response, group_id, current_user["_id"]
+    )
+    if not_modified:
+        return not_modified
     try:
         # Get settlements using service
         settlements_result = await expense_service.get_group_settlements(
-            group_id, current_user["_id"], status_filter, page, limit
+            group_id, current_user["_id"], status_filter, page, limit, selected
         )
 
         # Get optimized settlements
@@ -269,39 +554,98 @@ async def get_group_settlements(
             total_pending_result[0]["totalPending"] if total_pending_result else 0
         )
 
-        return SettlementListResponse(
-            settlements=settlements_result["settlements"],
-            optimizedSettlements=optimized_settlements,
-            summary={
+        # A plain dict, so settlements trimmed by ?fields are not revalidated
+        # against the full Settlement model
+        result = {
+            "settlements": settlements_result["settlements"],
+            "optimizedSettlements": optimized_settlements,
+            "summary": {
                 "totalPending": total_pending,
                 "transactionCount": len(settlements_result["settlements"]),
                 "optimizedCount": len(optimized_settlements),
             },
-            pagination={
+            "pagination": {
                 "currentPage": page,
                 "totalPages": (settlements_result["total"] + limit - 1) // limit,
                 "totalItems": settlements_result["total"],
                 "limit": limit,
             },
-        )
+        }
+        return ORJSONModelResponse(result, headers=response.headers)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to fetch settlements")
 
 
+@router.patch("/settlements:bulk", response_model=SettlementBulkUpdateResponse)
+async def bulk_update_settlements(
+    group_id: str,
+    updates: SettlementBulkUpdateRequest,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Set the status of many settlements at once"""
+    try:
+        return await expense_service.bulk_update_settlement_status(
+            group_id,
+            updates.settlementIds,
+            updates.status,
+            updates.paidAt,
+            current_user["_id"],
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Bulk settlement update failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to update settlements")
+
+
+@router.post("/settlements/settle-all", response_model=SettleAllResponse)
+async def settle_all(
+    group_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Record the optimized settlement plan as completed payments"""
+    try:
+        return await expense_service.settle_all(group_id, current_user["_id"])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Settle all failed: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to settle group")
+
+
+@router.get("/settlements/plan", response_model=SettlementPlanResponse)
+async def get_settlement_plan(
+    group_id: str,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Latest stored optimized settlement plan of the group, with its version"""
+    try:
+        return await expense_service.get_settlement_plan(group_id, current_user["_id"])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to fetch settlement plan of group {group_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch settlement plan")
+
+
 @router.get("/settlements/{settlement_id}", response_model=Settlement)
 async def get_single_settlement(
     group_id: str,
     settlement_id: str,
+    fields: Optional[str] = Query(
+        None, description="Comma-separated fields to return; id is always included"
+    ),
     current_user: Dict[str, Any] = Depends(get_current_user),
 ):
     """Retrieve details for a single settlement"""
+    selected = parse_fields(fields, Settlement)
     try:
         settlement = await expense_service.get_settlement_by_id(
-            group_id, settlement_id, current_user["_id"]
+            group_id, settlement_id, current_user["_id"], selected
         )
-        return settlement
+        return ORJSONModelResponse(settlement)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -348,7 +692,11 @@ async def delete_settlement(
         raise HTTPException(status_code=500, detail="Failed to delete settlement")
 
 
-@router.post("/settlements/optimize", response_model=OptimizedSettlementsResponse)
+@router.post(
+    "/settlements/optimize",
+    response_model=OptimizedSettlementsResponse,
+    dependencies=[Depends(rate_limit("settlements.optimize", cost=10))],
+)
 async def calculate_optimized_settlements(
     group_id: str,
     algorithm: str = Query(
@@ -396,7 +744,11 @@ async def calculate_optimized_settlements(
 balance_router = APIRouter(prefix="/users/me", tags=["User Balance"])
 
 
-@balance_router.get("/friends-balance", response_model=FriendsBalanceResponse)
+@balance_router.get(
+    "/friends-balance",
+    response_model=FriendsBalanceResponse,
+    dependencies=[Depends(rate_limit("friends_balance", cost=10))],
+)
 async def get_cross_group_friend_balances(
     current_user: Dict[str, Any] = Depends(get_current_user),
 ):
@@ -440,7 +792,11 @@ async def get_user_balance_in_specific_group(
 
 
 # Analytics
-@router.get("/analytics", response_model=ExpenseAnalytics)
+@router.get(
+    "/analytics",
+    response_model=ExpenseAnalytics,
+    dependencies=[Depends(rate_limit("analytics", cost=10))],
+)
 async def group_expense_analytics(
     group_id: str,
     period: str = Query(
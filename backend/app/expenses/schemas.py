@@ -2,6 +2,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Any, Dict, List, Optional
 
+from app.groups.schemas import GroupMember, GroupResponse
 from pydantic import BaseModel, ConfigDict, Field, validator
 
 
@@ -31,6 +32,8 @@ class ExpenseCreateRequest(BaseModel):
     paidBy: str = Field(..., description="User ID of who paid for the expense")
     tags: Optional[List[str]] = []
     receiptUrls: Optional[List[str]] = []
+    # ISO 4217 code the amount and splits are in; defaults to the group's currency
+    currency: Optional[str] = Field(None, pattern="^[A-Za-z]{3}$")
 
     @validator("splits")
     def validate_splits_sum(cls, v, values):
@@ -78,14 +81,33 @@ class ExpenseComment(BaseModel):
 
 class ExpenseHistoryEntry(BaseModel):
     id: str = Field(alias="_id")
+    expenseId: str
     userId: str
     userName: str
-    beforeData: Dict[str, Any]
+    # field -> {"from": old value, "to": new value}
+    changes: Dict[str, Dict[str, Any]]
     editedAt: datetime
 
     model_config = ConfigDict(populate_by_name=True)
 
 
+class ExpenseHistoryResponse(BaseModel):
+    history: List[ExpenseHistoryEntry]
+    pagination: Dict[str, Any]
+
+
+class ExpenseAttachment(BaseModel):
+    key: str
+    filename: Optional[str] = None
+    contentType: Optional[str] = None
+    size: int
+    url: Optional[str] = None
+    thumbnailUrl: Optional[str] = None
+    previewUrl: Optional[str] = None
+    uploadedBy: str
+    uploadedAt: datetime
+
+
 class ExpenseResponse(BaseModel):
     id: str = Field(alias="_id")
     groupId: str
@@ -97,8 +119,15 @@ class ExpenseResponse(BaseModel):
     splitType: SplitType
     tags: List[str] = []
     receiptUrls: List[str] = []
+    attachments: List[ExpenseAttachment] = []
     comments: Optional[List[ExpenseComment]] = []
-    history: Optional[List[ExpenseHistoryEntry]] = []
+    # Set on expenses posted from a recurring expense definition
+    recurringId: Optional[str] = None
+    # Currency the expense was entered in, if given. exchangeRate is set when it
+    # differs from the group's: settlements are in the group's currency, at
+    # each split's amount * exchangeRate
+    currency: Optional[str] = None
+    exchangeRate: Optional[float] = None
     createdAt: datetime
     updatedAt: datetime
 
@@ -118,6 +147,7 @@ class Settlement(BaseModel):
     description: Optional[str] = None
     paidAt: Optional[datetime] = None
     createdAt: datetime
+    updatedAt: Optional[datetime] = None
 
     model_config = ConfigDict(populate_by_name=True)
 
@@ -140,7 +170,9 @@ class GroupSummary(BaseModel):
 class ExpenseCreateResponse(BaseModel):
     expense: ExpenseResponse
     settlements: List[Settlement]
-    groupSummary: GroupSummary
+    # Without SETTLEMENT_PLAN_ASYNC; otherwise fetch the plan of planVersion
+    groupSummary: Optional[GroupSummary] = None
+    planVersion: Optional[int] = None
 
 
 class ExpenseListResponse(BaseModel):
@@ -149,6 +181,15 @@ class ExpenseListResponse(BaseModel):
     summary: Dict[str, Any]
 
 
+class ExpenseSearchResponse(BaseModel):
+    expenses: List[ExpenseResponse]
+    # Pass as ``cursor`` for the next page; None on the last one
+    nextCursor: Optional[str] = None
+    # More than SEARCH_MAX_CANDIDATES expenses matched and only the newest were
+    # ranked; older matches are not reachable through the cursor either
+    truncated: bool = False
+
+
 class SettlementCreateRequest(BaseModel):
     payer_id: str
     payee_id: str
@@ -162,6 +203,24 @@ class SettlementUpdateRequest(BaseModel):
     paidAt: Optional[datetime] = None
 
 
+class SettlementBulkUpdateRequest(BaseModel):
+    settlementIds: List[str] = Field(..., min_length=1, max_length=500)
+    status: SettlementStatus
+    paidAt: Optional[datetime] = None
+
+
+class SettlementBulkUpdateResponse(BaseModel):
+    matched: int
+    modified: int
+    status: SettlementStatus
+
+
+class SettleAllResponse(BaseModel):
+    settledCount: int
+    payments: List[Settlement]
+    totalAmount: float
+
+
 class SettlementListResponse(BaseModel):
     settlements: List[Settlement]
     optimizedSettlements: List[OptimizedSettlement]
@@ -183,7 +242,8 @@ class UserBalance(BaseModel):
 class FriendBalanceBreakdown(BaseModel):
     groupId: str
     groupName: str
-    balance: float
+    balance: float  # in the group's currency
+    currency: str = "USD"
     owesYou: bool
 
 
@@ -223,8 +283,91 @@ class ExpenseAnalytics(BaseModel):
 class AttachmentUploadResponse(BaseModel):
     attachment_key: str
     url: str
+    size: Optional[int] = None
+    contentType: Optional[str] = None
+
+
+class RecurrenceFrequency(str, Enum):
+    DAILY = "daily"
+    WEEKLY = "weekly"
+    MONTHLY = "monthly"
+    YEARLY = "yearly"
+
+
+class RecurringExpenseCreateRequest(ExpenseCreateRequest):
+    frequency: RecurrenceFrequency = RecurrenceFrequency.MONTHLY
+    # Post every `interval` days/weeks/months/years
+    interval: int = Field(1, ge=1, le=366)
+    # First occurrence; later ones fall on the same day of the week/month/year
+    startAt: datetime
+    endAt: Optional[datetime] = None
+
+    @validator("endAt")
+    def validate_end_after_start(cls, v, values):
+        if v is not None and "startAt" in values and v < values["startAt"]:
+            raise ValueError("endAt must not be before startAt")
+        return v
+
+
+class RecurringExpenseResponse(BaseModel):
+    id: str = Field(alias="_id")
+    groupId: str
+    createdBy: str
+    paidBy: str
+    description: str
+    amount: float
+    splits: List[ExpenseSplit]
+    splitType: SplitType
+    tags: List[str] = []
+    currency: Optional[str] = None
+    frequency: RecurrenceFrequency
+    interval: int
+    startAt: datetime
+    endAt: Optional[datetime] = None
+    # Occurrences posted so far, and when the next one is due (None once ended)
+    occurrences: int = 0
+    nextRunAt: Optional[datetime] = None
+    active: bool = True
+    # Why the scheduler stopped it, e.g. a payer or split user left the group
+    lastError: Optional[str] = None
+    createdAt: datetime
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class SettlementPlanResponse(BaseModel):
+    version: int
+    computedAt: datetime
+    stale: bool = False
+    pendingChanges: int = 0
+    optimizedSettlements: List[OptimizedSettlement]
+    totalExpenses: float
+    totalSettlements: int
 
 
 class OptimizedSettlementsResponse(BaseModel):
     optimizedSettlements: List[OptimizedSettlement]
     savings: Dict[str, Any]
+
+
+class DeletedEntities(BaseModel):
+    expenses: List[str] = []
+    settlements: List[str] = []
+    members: List[str] = []
+
+
+class GroupChangesResponse(BaseModel):
+    expenses: List[ExpenseResponse]
+    settlements: List[Settlement]
+    # None when the member list did not change since the token
+    members: Optional[List[GroupMember]] = None
+    deleted: DeletedEntities
+    nextToken: str
+    fullResync: bool
+
+
+class GroupDashboardResponse(BaseModel):
+    group: GroupResponse
+    expenses: ExpenseListResponse
+    balance: UserBalance
+    optimizedSettlements: List[OptimizedSettlement]
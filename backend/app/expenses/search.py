@@ -0,0 +1,87 @@
+"""
+Prefix search over expense descriptions and tags.
+
+Every expense stores ``searchTokens``: each word of its description and tags,
+lowercased and without accents, as all its prefixes of ``MIN_PREFIX`` to
+``MAX_PREFIX`` characters plus the whole word marked with ``=``. A query
+matches expenses holding every query word as a token, which the
+``(groupId, searchTokens, createdAt)`` index answers directly, so ``din res``
+finds "Dinner at the restaurant". The newest ``SEARCH_MAX_CANDIDATES``
+matches are ranked by the number of query words that are whole words of the
+expense, then newest first; the response flags when older matches were left
+out.
+
+The write paths keep the tokens up to date; migration 0006 backfills expenses
+written before they existed.
+"""
+
+import base64
+import binascii
+import json
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Tuple
+
+from bson import ObjectId, errors
+from fastapi import HTTPException
+
+MIN_PREFIX = 2
+# Longer words are indexed (and searched) by their first MAX_PREFIX characters
+MAX_PREFIX = 15
+WORD = re.compile(r"\w+")
+EXACT = "="
+
+
+def words(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [word[:MAX_PREFIX] for word in WORD.findall(text)]
+
+
+def search_tokens(description: str, tags: Iterable[str] = ()) -> List[str]:
+    """The ``searchTokens`` of an expense."""
+    tokens = set()
+    for word in words(" ".join([description or "", *(tags or [])])):
+        tokens.add(EXACT + word)
+        tokens.update(
+            word[:n] for n in range(min(MIN_PREFIX, len(word)), len(word) + 1)
+        )
+    return sorted(tokens)
+
+
+def query_words(q: str) -> List[str]:
+    """Distinct words of a query; shorter than MIN_PREFIX ones are ignored."""
+    return sorted({word for word in words(q) if len(word) >= MIN_PREFIX})
+
+
+def encode_cursor(score: int, created_at: datetime, expense_id: Any) -> str:
+    """Opaque position after the last result of a page."""
+    millis = int((created_at - datetime(1970, 1, 1)).total_seconds() * 1000)
+    raw = json.dumps([score, millis, str(expense_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, datetime, ObjectId]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, millis, expense_id = json.loads(base64.urlsafe_b64decode(padded))
+        return (
+            int(score),
+            datetime(1970, 1, 1) + timedelta(milliseconds=millis),
+            ObjectId(expense_id),
+        )
+    except (binascii.Error, ValueError, TypeError, errors.InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid search cursor")
+
+
+def after_cursor(cursor: str) -> Dict[str, Any]:
+    """Filter on ranked results selecting those after ``cursor``."""
+    score, created_at, expense_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {"searchScore": {"$lt": score}},
+            {"searchScore": score, "createdAt": {"$lt": created_at}},
+            {"searchScore": score, "createdAt": created_at, "_id": {"$lt": expense_id}},
+        ]
+    }
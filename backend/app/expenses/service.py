@@ -1,21 +1,132 @@
+import asyncio
 from collections import defaultdict
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
 
-from app.config import logger
+from app.config import logger, settings
+from app.currency import UnknownCurrencyError, exchange_rates
 from app.database import mongodb
+from app.events import publish_group_event
+from app.expenses.attachments import (
+    AttachmentTooLargeError,
+    derivative_key,
+    get_attachment_store,
+)
+from app.expenses.fields import build, field_projection
+from app.expenses.planner import settlement_planner
+from app.expenses.recurring import (
+    as_utc,
+    derived_id,
+    next_run_at,
+    occurrence_id,
+    posted_occurrences,
+)
 from app.expenses.schemas import (
     ExpenseCreateRequest,
+    ExpenseHistoryEntry,
     ExpenseResponse,
     ExpenseUpdateRequest,
     OptimizedSettlement,
+    RecurringExpenseCreateRequest,
     Settlement,
     SettlementCreateRequest,
     SettlementStatus,
     SplitType,
 )
+from app.expenses.search import (
+    EXACT,
+    after_cursor,
+    encode_cursor,
+    query_words,
+    search_tokens,
+)
+from app.expenses.thumbnails import DERIVATIVES, is_thumbnailable, render_in_pool
+from app.groups.members import (
+    GROUP_MEMBER_FIELDS,
+    STORAGE_FIELD,
+    find_member,
+    list_members,
+    member_roles,
+    user_groups_filter,
+    uses_collection,
+)
+from app.groups.membership import membership_cache
+from app.groups.schemas import GroupMember
+from app.groups.service import CHANGE_VERSION_INC, group_service
+from app.singleflight import SingleFlight
+from app.sync import (
+    SYNC_OVERLAP,
+    decode_sync_token,
+    encode_sync_token,
+    record_tombstones,
+    since_filter,
+    tombstone_cutoff,
+)
 from bson import ObjectId, errors
 from fastapi import HTTPException
+from pymongo import DeleteOne, InsertOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+# Fields whose edits are recorded in expense_history
+TRACKED_FIELDS = ("description", "amount", "splits", "tags", "receiptUrls")
+# Listing queries never need the per-expense comment thread, the embedded
+# history of documents not migrated yet or the search index tokens
+LIST_PROJECTION = {"history": 0, "comments": 0, "searchTokens": 0}
+# Incremented by every write that changes a group's settlement plan while plans
+# are computed in the background; stored plans record the value they include
+PLAN_REVISION_FIELD = "planRevision"
+# {definitionId: occurrences} of the recurring expenses a group's stored
+# balances include
+BALANCED_OCCURRENCES_FIELD = "balancedOccurrences"
+
+# Identical concurrent reads of a group share one computation; writes to the
+# group forget its flights (see app/singleflight.py)
+coalesced_reads = SingleFlight()
+
+# An expense's amount in its group's currency, for aggregations over expenses
+# entered in other currencies
+GROUP_CURRENCY_AMOUNT = {"$multiply": ["$amount", {"$ifNull": ["$exchangeRate", 1]}]}
+# The same for the split unwound into ``splits``
+GROUP_CURRENCY_SPLIT_AMOUNT = {
+    "$multiply": ["$splits.amount", {"$ifNull": ["$exchangeRate", 1]}]
+}
+
+
+def settlement_amount(expense: Dict[str, Any], split: Dict[str, Any]) -> float:
+    """A split's amount in the group's currency, as its settlement records it"""
+    rate = expense.get("exchangeRate")
+    return split["amount"] if rate is None else round(split["amount"] * rate, 2)
+
+
+def balance_inc(
+    removed: Iterable[Dict[str, Any]] = (), added: Iterable[Dict[str, Any]] = ()
+) -> Dict[str, float]:
+    """
+    ``$inc`` moving a group's stored ``balances`` (net pending amount per
+    member, positive when owed) from the settlements ``removed`` to those
+    ``added``. Settlements that are not pending count for nothing.
+    """
+    deltas = defaultdict(float)
+    for sign, docs in ((-1, removed), (1, added)):
+        for doc in docs:
+            if doc.get("status") == "pending":
+                deltas[doc["payerId"]] += sign * doc["amount"]
+                deltas[doc["payeeId"]] -= sign * doc["amount"]
+    return {
+        f"balances.{user_id}": round(delta, 2)
+        for user_id, delta in deltas.items()
+        if round(delta, 2)
+    }
+
+
+def diff_fields(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """Field level changes between two versions of an expense"""
+    return {
+        field: {"from": before.get(field), "to": after[field]}
+        for field in TRACKED_FIELDS
+        if field in after and before.get(field) != after[field]
+    }
 
 
 class ExpenseService:
@@ -38,6 +149,22 @@ class ExpenseService:
     def users_collection(self):
         return mongodb.database.users
 
+    @property
+    def expense_history_collection(self):
+        return mongodb.database.expense_history
+
+    @property
+    def settlement_plans_collection(self):
+        return mongodb.database.settlement_plans
+
+    @property
+    def recurring_expenses_collection(self):
+        return mongodb.database.recurring_expenses
+
+    @property
+    def tombstones_collection(self):
+        return mongodb.database.tombstones
+
     async def create_expense(
         self, group_id: str, expense_data: ExpenseCreateRequest, user_id: str
     ) -> Dict[str, Any]:
@@ -54,24 +181,11 @@ class ExpenseService:
             raise HTTPException(status_code=500, detail="Failed to process group ID")
 
         # Verify user is member of the group
-        group = await self.groups_collection.find_one(
-            {"_id": group_obj_id, "members.userId": user_id}
-        )
-        if not group:  # User not a member of the group
-            raise HTTPException(
-                status_code=403, detail="You are not a member of this group"
-            )
+        await self._check_author_and_payer(group_id, user_id, expense_data.paidBy)
 
-        # Verify the payer is also a member of the group
-        payer_is_member = any(
-            member.get("userId") == expense_data.paidBy
-            for member in group.get("members", [])
+        currency_fields = await self._expense_currency(
+            group_obj_id, expense_data.currency
         )
-        if not payer_is_member:
-            raise HTTPException(
-                status_code=400,
-                detail="The selected payer is not a member of this group",
-            )
 
         # Create expense document
         expense_doc = {
@@ -86,7 +200,10 @@ class ExpenseService:
             "tags": expense_data.tags or [],
             "receiptUrls": expense_data.receiptUrls or [],
             "comments": [],
-            "history": [],
+            **currency_fields,
+            "searchTokens": search_tokens(
+                expense_data.description, expense_data.tags or []
+            ),
             "createdAt": datetime.utcnow(),
             "updatedAt": datetime.utcnow(),
         }
@@ -99,21 +216,77 @@ class ExpenseService:
             expense_doc, expense_data.paidBy
         )
 
-        # Get optimized settlements for the group
-        optimized_settlements = await self.calculate_optimized_settlements(group_id)
+        group_summary = None
+        # Don't share a plan computed before this expense existed
+        coalesced_reads.forget(group_id)
+        if not settings.settlement_plan_async:
+            # Get optimized settlements for the group
+            optimized_settlements = await self.calculate_optimized_settlements(group_id)
 
-        # Get group summary
-        group_summary = await self._get_group_summary(group_id, optimized_settlements)
+            # Get group summary
+            group_summary = await self._get_group_summary(
+                group_id, optimized_settlements
+            )
 
         # Convert expense to response format
         expense_response = await self._expense_doc_to_response(expense_doc)
 
+        plan_version = await self._notify(
+            group_id,
+            "expense.created",
+            affects_plan=True,
+            balances=balance_inc(added=[s.model_dump() for s in settlements]),
+            expenseId=str(expense_doc["_id"]),
+        )
+
         return {
             "expense": expense_response,
             "settlements": settlements,
             "groupSummary": group_summary,
+            "planVersion": plan_version,
         }
 
+    async def _check_author_and_payer(
+        self, group_id: str, user_id: str, payer_id: str
+    ) -> None:
+        """403 unless the user, and 400 unless the payer, is a group member."""
+        # One lookup per user, which stays a single indexed read on groups
+        # keeping their members in the group_members collection
+        db = mongodb.database
+        if await membership_cache.role_of(db, group_id, user_id) is None:
+            raise HTTPException(
+                status_code=403, detail="You are not a member of this group"
+            )
+        if payer_id != user_id and (
+            await membership_cache.role_of(db, group_id, payer_id) is None
+        ):
+            raise HTTPException(
+                status_code=400,
+                detail="The selected payer is not a member of this group",
+            )
+
+    async def _expense_currency(
+        self, group_obj_id: ObjectId, currency: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        The ``currency`` of a new expense and, when it is not the group's, the
+        ``exchangeRate`` converting it to the group's currency.
+        """
+        if not currency:
+            return {}
+        currency = currency.upper()
+        group = await self.groups_collection.find_one(
+            {"_id": group_obj_id}, {"currency": 1}
+        )
+        group_currency = (group or {}).get("currency") or "USD"
+        if currency == group_currency:
+            return {"currency": currency}
+        try:
+            factors = await exchange_rates.factors([currency], group_currency)
+        except UnknownCurrencyError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return {"currency": currency, "exchangeRate": factors[currency]}
+
     async def _create_settlements_for_expense(
         self, expense_doc: Dict[str, Any], payer_id: str
     ) -> List[Settlement]:
@@ -130,19 +303,9 @@ class ExpenseService:
         user_names = {str(user["_id"]): user.get("name", "Unknown") for user in users}
 
         for split in expense_doc["splits"]:
-            settlement_doc = {
-                "_id": ObjectId(),
-                "expenseId": expense_id,
-                "groupId": group_id,
-                "payerId": payer_id,
-                "payeeId": split["userId"],
-                "payerName": user_names.get(payer_id, "Unknown"),
-                "payeeName": user_names.get(split["userId"], "Unknown"),
-                "amount": split["amount"],
-                "status": "completed" if split["userId"] == payer_id else "pending",
-                "description": f"Share for {expense_doc['description']}",
-                "createdAt": datetime.utcnow(),
-            }
+            settlement_doc = self._settlement_doc(
+                expense_doc, payer_id, split, user_names, ObjectId()
+            )
 
             await self.settlements_collection.insert_one(settlement_doc)
 
@@ -154,6 +317,363 @@ class ExpenseService:
 
         return settlements
 
+    def _settlement_doc(
+        self,
+        expense_doc: Dict[str, Any],
+        payer_id: str,
+        split: Dict[str, Any],
+        user_names: Dict[str, str],
+        settlement_id: ObjectId,
+    ) -> Dict[str, Any]:
+        return {
+            "_id": settlement_id,
+            "expenseId": str(expense_doc["_id"]),
+            "groupId": expense_doc["groupId"],
+            "payerId": payer_id,
+            "payeeId": split["userId"],
+            "payerName": user_names.get(payer_id, "Unknown"),
+            "payeeName": user_names.get(split["userId"], "Unknown"),
+            "amount": settlement_amount(expense_doc, split),
+            "status": "completed" if split["userId"] == payer_id else "pending",
+            "description": f"Share for {expense_doc['description']}",
+            "createdAt": expense_doc["createdAt"],
+            "updatedAt": expense_doc["updatedAt"],
+        }
+
+    async def create_recurring_expense(
+        self, group_id: str, data: RecurringExpenseCreateRequest, user_id: str
+    ) -> Dict[str, Any]:
+        """Define an expense to be posted on a schedule"""
+        try:
+            group_obj_id = ObjectId(group_id)
+        except errors.InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid group ID")
+
+        await self._check_author_and_payer(group_id, user_id, data.paidBy)
+        # Rejects a currency without a rate now rather than at the first posting;
+        # the rate itself is taken when each occurrence is posted
+        currency_fields = await self._expense_currency(group_obj_id, data.currency)
+
+        now = datetime.utcnow()
+        definition = {
+            "_id": ObjectId(),
+            "groupId": group_id,
+            "createdBy": user_id,
+            "paidBy": data.paidBy,
+            "description": data.description,
+            "amount": data.amount,
+            "splits": [split.model_dump() for split in data.splits],
+            "splitType": data.splitType,
+            "tags": data.tags or [],
+            "receiptUrls": data.receiptUrls or [],
+            "currency": currency_fields.get("currency"),
+            "frequency": data.frequency.value,
+            "interval": data.interval,
+            "startAt": as_utc(data.startAt),
+            "endAt": as_utc(data.endAt) if data.endAt else None,
+            "occurrences": 0,
+            "active": True,
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        definition["nextRunAt"] = next_run_at(definition, 0)
+        await self.recurring_expenses_collection.insert_one(definition)
+        return {**definition, "_id": str(definition["_id"])}
+
+    async def list_recurring_expenses(
+        self, group_id: str, user_id: str
+    ) -> List[Dict[str, Any]]:
+        """Recurring expense definitions of a group, newest first"""
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
+            raise HTTPException(
+                status_code=403, detail="Group not found or user not a member"
+            )
+        docs = (
+            await self.recurring_expenses_collection.find({"groupId": group_id})
+            .sort("createdAt", -1)
+            .to_list(None)
+        )
+        return [{**doc, "_id": str(doc["_id"])} for doc in docs]
+
+    async def delete_recurring_expense(
+        self, group_id: str, recurring_id: str, user_id: str
+    ) -> bool:
+        """Stop a recurring expense; expenses already posted are kept"""
+        try:
+            recurring_obj_id = ObjectId(recurring_id)
+        except errors.InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid recurring expense ID")
+        result = await self.recurring_expenses_collection.delete_one(
+            {"_id": recurring_obj_id, "groupId": group_id, "createdBy": user_id}
+        )
+        if result.deleted_count == 0:
+            raise HTTPException(
+                status_code=403,
+                detail="Not authorized to delete this recurring expense or it does not exist",
+            )
+        return True
+
+    async def _current_members(
+        self, groups: List[Dict[str, Any]], user_ids: Set[str]
+    ) -> Dict[str, Set[str]]:
+        """group id -> those of ``user_ids`` who are members of the group."""
+        members = {
+            str(g["_id"]): {m["userId"] for m in g.get("members", [])}
+            for g in groups
+            if not uses_collection(g)
+        }
+        stored = [str(g["_id"]) for g in groups if uses_collection(g)]
+        if stored:
+            docs = await mongodb.database.group_members.find(
+                {"groupId": {"$in": stored}, "userId": {"$in": list(user_ids)}},
+                {"groupId": 1, "userId": 1},
+            ).to_list(None)
+            members.update({group_id: set() for group_id in stored})
+            for doc in docs:
+                members[doc["groupId"]].add(doc["userId"])
+        return members
+
+    async def materialize_due_expenses(self, now: Optional[datetime] = None) -> int:
+        """
+        Post the due occurrences of up to ``recurring_expenses_batch_size``
+        recurring expense definitions, across all groups. Expenses,
+        settlements, group ledgers and definitions are each written with one
+        bulk write. Occurrences have deterministic ids, so a batch that is
+        retried after a partial failure posts only what is missing.
+
+        Returns the number of definitions processed.
+        """
+        now = now or datetime.utcnow()
+        definitions = (
+            await self.recurring_expenses_collection.find(
+                {"active": True, "nextRunAt": {"$lte": now}}
+            )
+            .sort("nextRunAt", 1)
+            .limit(settings.recurring_expenses_batch_size)
+            .to_list(None)
+        )
+        if not definitions:
+            return 0
+
+        groups = await self.groups_collection.find(
+            {"_id": {"$in": list({ObjectId(d["groupId"]) for d in definitions})}},
+            {
+                "currency": 1,
+                BALANCED_OCCURRENCES_FIELD: 1,
+                "members.userId": 1,
+                STORAGE_FIELD: 1,
+            },
+        ).to_list(None)
+        group_currencies = {str(g["_id"]): g.get("currency") or "USD" for g in groups}
+        balanced = {
+            str(g["_id"]): g.get(BALANCED_OCCURRENCES_FIELD, {}) for g in groups
+        }
+        involved = {d["paidBy"] for d in definitions} | {
+            split["userId"] for d in definitions for split in d["splits"]
+        }
+        members = await self._current_members(groups, involved)
+        user_names = await self._get_user_names(involved)
+        snapshot = None
+        if any(
+            d.get("currency") not in (None, group_currencies.get(d["groupId"]))
+            for d in definitions
+        ):
+            snapshot = await exchange_rates.snapshot()
+
+        expenses, settlements, advances, ranges = [], [], [], []
+        for definition in definitions:
+            stop = None
+            group_currency = group_currencies.get(definition["groupId"])
+            rate = None
+            missing = sorted(
+                (
+                    {definition["paidBy"]}
+                    | {split["userId"] for split in definition["splits"]}
+                )
+                - members.get(definition["groupId"], set())
+            )
+            if group_currency is None:
+                stop = "Group no longer exists"
+            elif missing:
+                # Nobody is charged for an expense after leaving the group
+                stop = f"No longer members of the group: {', '.join(missing)}"
+            elif definition.get("currency") not in (None, group_currency):
+                try:
+                    rate = snapshot.factor(definition["currency"], group_currency)
+                except UnknownCurrencyError as e:
+                    stop = str(e)
+            if stop is not None:
+                logger.warning(
+                    f"Stopping recurring expense {definition['_id']}: {stop}"
+                )
+                advances.append(
+                    UpdateOne(
+                        {"_id": definition["_id"]},
+                        {
+                            "$set": {
+                                "active": False,
+                                "nextRunAt": None,
+                                "lastError": stop,
+                                "updatedAt": now,
+                            }
+                        },
+                    )
+                )
+                continue
+
+            n, at = definition["occurrences"], definition["nextRunAt"]
+            for _ in range(settings.recurring_expenses_max_catch_up):
+                if at is None or at > now:
+                    break
+                expense = self._occurrence_expense(definition, n, at, rate, now)
+                expenses.append(expense)
+                settlements.extend(
+                    self._settlement_doc(
+                        expense,
+                        expense["paidBy"],
+                        split,
+                        user_names,
+                        derived_id(str(expense["_id"]), split["userId"]),
+                    )
+                    for split in expense["splits"]
+                )
+                n += 1
+                at = next_run_at(definition, n)
+            ranges.append((definition, definition["occurrences"], n))
+            update = {"occurrences": n, "nextRunAt": at, "updatedAt": now}
+            if at is None:
+                update["active"] = False
+            # A worker that advanced it first wins; this one's inserts were no-ops
+            advances.append(
+                UpdateOne(
+                    {
+                        "_id": definition["_id"],
+                        "occurrences": definition["occurrences"],
+                    },
+                    {"$set": update},
+                )
+            )
+
+        posted = await self._insert_missing(self.expenses_collection, expenses)
+        await self._insert_missing(self.settlements_collection, settlements)
+        posted_occurrences.inc(len(posted))
+
+        touched = {expense["groupId"] for expense in expenses}
+        group_writes = []
+        for group_id in touched:
+            update = {
+                "$inc": dict(CHANGE_VERSION_INC),
+                "$set": {"lastActivityAt": now},
+            }
+            if settings.settlement_plan_async:
+                update["$inc"][PLAN_REVISION_FIELD] = 1
+            group_writes.append(UpdateOne({"_id": ObjectId(group_id)}, update))
+
+        # A group records how many occurrences of each definition its balances
+        # include and moves that mark together with the balances. A retry
+        # after a crash, or a second worker posting the same occurrences,
+        # then counts each occurrence exactly once.
+        by_expense = defaultdict(list)
+        for doc in settlements:
+            by_expense[doc["expenseId"]].append(doc)
+        for definition, start, end in ranges:
+            group_id, definition_id = definition["groupId"], str(definition["_id"])
+            mark = f"{BALANCED_OCCURRENCES_FIELD}.{definition_id}"
+            counted = balanced[group_id].get(definition_id)
+            if end <= max(start, counted or 0):
+                continue
+            update = {"$set": {mark: end}}
+            inc = balance_inc(
+                added=[
+                    doc
+                    for n in range(max(start, counted or 0), end)
+                    for doc in by_expense[str(occurrence_id(definition_id, n))]
+                ]
+            )
+            if inc:
+                update["$inc"] = inc
+            # Groups without stored balances get them from migration 0007
+            group_writes.append(
+                UpdateOne(
+                    {
+                        "_id": ObjectId(group_id),
+                        "balances": {"$exists": True},
+                        mark: counted,
+                    },
+                    update,
+                )
+            )
+        if group_writes:
+            await self.groups_collection.bulk_write(group_writes, ordered=False)
+        await self.recurring_expenses_collection.bulk_write(advances, ordered=False)
+
+        posted_ids = defaultdict(list)
+        for expense in posted:
+            posted_ids[expense["groupId"]].append(str(expense["_id"]))
+        for group_id in touched:
+            coalesced_reads.forget(group_id)
+            await publish_group_event(
+                group_id, "expense.bulk_created", expenseIds=posted_ids[group_id]
+            )
+            if settings.settlement_plan_async:
+                settlement_planner.request(group_id)
+            else:
+                await publish_group_event(group_id, "plan.updated")
+        return len(definitions)
+
+    def _occurrence_expense(
+        self,
+        definition: Dict[str, Any],
+        n: int,
+        at: datetime,
+        rate: Optional[float],
+        now: datetime,
+    ) -> Dict[str, Any]:
+        """Expense document of occurrence ``n``, dated when it was due"""
+        expense = {
+            "_id": occurrence_id(str(definition["_id"]), n),
+            "groupId": definition["groupId"],
+            "createdBy": definition["createdBy"],
+            "paidBy": definition["paidBy"],
+            "description": definition["description"],
+            "amount": definition["amount"],
+            "splits": definition["splits"],
+            "splitType": definition["splitType"],
+            "tags": definition.get("tags", []),
+            "receiptUrls": definition.get("receiptUrls", []),
+            "comments": [],
+            "recurringId": str(definition["_id"]),
+            "occurrence": n,
+            "searchTokens": search_tokens(
+                definition["description"], definition.get("tags", [])
+            ),
+            "createdAt": at,
+            # Delta sync picks up changes by updatedAt
+            "updatedAt": now,
+        }
+        if definition.get("currency"):
+            expense["currency"] = definition["currency"]
+        if rate is not None:
+            expense["exchangeRate"] = rate
+        return expense
+
+    async def _insert_missing(
+        self, collection, docs: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Insert ``docs``, skipping those whose _id exists; returns the inserted"""
+        if not docs:
+            return []
+        try:
+            await collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            write_errors = e.details.get("writeErrors", [])
+            if any(error["code"] != 11000 for error in write_errors):
+                raise
+            skipped = {error["index"] for error in write_errors}
+            return [doc for i, doc in enumerate(docs) if i not in skipped]
+        return docs
+
     async def list_group_expenses(
         self,
         group_id: str,
@@ -163,16 +683,34 @@ class ExpenseService:
         from_date: Optional[datetime] = None,
         to_date: Optional[datetime] = None,
         tags: Optional[List[str]] = None,
+        fields: Optional[FrozenSet[str]] = None,
     ) -> Dict[str, Any]:
         """List expenses for a group with pagination and filtering"""
 
         # Verify user access
-        group = await self.groups_collection.find_one(
-            {"_id": ObjectId(group_id), "members.userId": user_id}
-        )
-        if not group:
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
             raise ValueError("Group not found or user not a member")
 
+        return await coalesced_reads.do(
+            group_id,
+            "list_group_expenses",
+            (page, limit, from_date, to_date, tuple(tags or ()), fields),
+            lambda: self._list_group_expenses(
+                group_id, page, limit, from_date, to_date, tags, fields
+            ),
+        )
+
+    async def _list_group_expenses(
+        self,
+        group_id: str,
+        page: int,
+        limit: int,
+        from_date: Optional[datetime],
+        to_date: Optional[datetime],
+        tags: Optional[List[str]],
+        fields: Optional[FrozenSet[str]],
+    ) -> Dict[str, Any]:
         # Build query
         query = {"groupId": group_id}
 
@@ -192,8 +730,11 @@ class ExpenseService:
 
         # Get expenses with pagination
         skip = (page - 1) * limit
+        projection = (
+            LIST_PROJECTION if fields is None else self._expense_projection(fields)
+        )
         expenses_cursor = (
-            self.expenses_collection.find(query)
+            self.expenses_collection.find(query, projection)
             .sort("createdAt", -1)
             .skip(skip)
             .limit(limit)
@@ -202,7 +743,7 @@ class ExpenseService:
 
         expenses = []
         for doc in expenses_docs:
-            expense = await self._expense_doc_to_response(doc)
+            expense = await self._expense_doc_to_response(doc, fields)
             expenses.append(expense)
 
         # Calculate summary
@@ -211,9 +752,9 @@ class ExpenseService:
             {
                 "$group": {
                     "_id": None,
-                    "totalAmount": {"$sum": "$amount"},
+                    "totalAmount": {"$sum": GROUP_CURRENCY_AMOUNT},
                     "expenseCount": {"$sum": 1},
-                    "avgExpense": {"$avg": "$amount"},
+                    "avgExpense": {"$avg": GROUP_CURRENCY_AMOUNT},
                 }
             },
         ]
@@ -240,8 +781,113 @@ class ExpenseService:
             "summary": summary,
         }
 
+    async def search_group_expenses(
+        self,
+        group_id: str,
+        user_id: str,
+        q: str,
+        min_amount: Optional[float] = None,
+        max_amount: Optional[float] = None,
+        paid_by: Optional[str] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+        fields: Optional[FrozenSet[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Expenses whose description or tags contain every word of ``q`` as a
+        word prefix, best matches first (see app/expenses/search.py).
+        """
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
+            raise ValueError("Group not found or user not a member")
+
+        terms = query_words(q)
+        if not terms:
+            raise HTTPException(
+                status_code=400, detail="Search needs a word of two or more letters"
+            )
+
+        query: Dict[str, Any] = {"groupId": group_id, "searchTokens": {"$all": terms}}
+        if min_amount is not None or max_amount is not None:
+            amount_filter = {}
+            if min_amount is not None:
+                amount_filter["$gte"] = min_amount
+            if max_amount is not None:
+                amount_filter["$lte"] = max_amount
+            query["amount"] = amount_filter
+        if paid_by:
+            query["paidBy"] = paid_by
+
+        if fields is None:
+            projection = LIST_PROJECTION
+        else:
+            # The cursor is built from the rank and date of the last result
+            projection = {
+                **self._expense_projection(fields),
+                "searchScore": 1,
+                "createdAt": 1,
+            }
+        exact = [EXACT + term for term in terms]
+        cap = settings.search_max_candidates
+        ranked: List[Dict[str, Any]] = [
+            # The newest candidates, as read off the index
+            {"$limit": cap},
+            {
+                "$addFields": {
+                    "searchScore": {
+                        "$size": {
+                            "$filter": {
+                                "input": exact,
+                                "as": "word",
+                                "cond": {"$in": ["$$word", "$searchTokens"]},
+                            }
+                        }
+                    }
+                }
+            },
+            {"$sort": {"searchScore": -1, "createdAt": -1, "_id": -1}},
+        ]
+        if cursor:
+            ranked.append({"$match": after_cursor(cursor)})
+        ranked += [{"$limit": limit + 1}, {"$project": projection}]
+        pipeline = [
+            {"$match": query},
+            # Sorting on createdAt alone walks the (groupId, searchTokens,
+            # createdAt) index newest first instead of sorting in memory
+            {"$sort": {"createdAt": -1}},
+            # One more than the cap tells whether older matches were left out
+            {"$limit": cap + 1},
+            {"$facet": {"candidates": [{"$count": "n"}], "page": ranked}},
+        ]
+        result = (await self.expenses_collection.aggregate(pipeline).to_list(None))[0]
+        docs = result["page"]
+        candidates = result["candidates"][0]["n"] if result["candidates"] else 0
+
+        page = docs[:limit]
+        next_cursor = None
+        if len(docs) > limit:
+            last = page[-1]
+            next_cursor = encode_cursor(
+                last["searchScore"], last["createdAt"], last["_id"]
+            )
+        expenses = []
+        for doc in page:
+            doc.pop("searchScore", None)
+            if fields is not None and "createdAt" not in fields:
+                doc.pop("createdAt", None)
+            expenses.append(await self._expense_doc_to_response(doc, fields))
+        return {
+            "expenses": expenses,
+            "nextCursor": next_cursor,
+            "truncated": candidates > cap,
+        }
+
     async def get_expense_by_id(
-        self, group_id: str, expense_id: str, user_id: str
+        self,
+        group_id: str,
+        expense_id: str,
+        user_id: str,
+        fields: Optional[FrozenSet[str]] = None,
     ) -> Dict[str, Any]:
         """Get a single expense with details"""
 
@@ -261,21 +907,20 @@ class ExpenseService:
             raise HTTPException(status_code=500, detail="Unable to process IDs")
 
         # Verify user access
-        group = await self.groups_collection.find_one(
-            {"_id": group_obj_id, "members.userId": user_id}
-        )
-        if not group:  # Unauthorized access
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:  # Unauthorized access
             raise HTTPException(
                 status_code=403, detail="You are not a member of this group"
             )
 
         expense_doc = await self.expenses_collection.find_one(
-            {"_id": expense_obj_id, "groupId": group_id}
+            {"_id": expense_obj_id, "groupId": group_id},
+            {"history": 0} if fields is None else self._expense_projection(fields),
         )
         if not expense_doc:  # Expense not found
             raise HTTPException(status_code=404, detail="Expense not found")
 
-        expense = await self._expense_doc_to_response(expense_doc)
+        expense = await self._expense_doc_to_response(expense_doc, fields)
 
         # Get related settlements
         settlements_docs = await self.settlements_collection.find(
@@ -289,6 +934,175 @@ class ExpenseService:
 
         return {"expense": expense, "relatedSettlements": settlements}
 
+    async def get_expense_history(
+        self,
+        group_id: str,
+        expense_id: str,
+        user_id: str,
+        page: int = 1,
+        limit: int = 20,
+    ) -> Dict[str, Any]:
+        """Page through the edit history of an expense, newest first"""
+
+        try:
+            group_obj_id = ObjectId(group_id)
+            expense_obj_id = ObjectId(expense_id)
+        except errors.InvalidId:
+            raise HTTPException(
+                status_code=400, detail="Invalid group ID or expense ID"
+            )
+
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
+            raise HTTPException(
+                status_code=403, detail="You are not a member of this group"
+            )
+        expense = await self.expenses_collection.find_one(
+            {"_id": expense_obj_id, "groupId": group_id}, {"_id": 1}
+        )
+        if not expense:
+            raise HTTPException(status_code=404, detail="Expense not found")
+
+        query = {"expenseId": expense_id}
+        total = await self.expense_history_collection.count_documents(query)
+        docs = (
+            await self.expense_history_collection.find(query)
+            .sort("editedAt", -1)
+            .skip((page - 1) * limit)
+            .limit(limit)
+            .to_list(None)
+        )
+
+        return {
+            "history": [
+                ExpenseHistoryEntry(**{**doc, "_id": str(doc["_id"])}) for doc in docs
+            ],
+            "pagination": {
+                "page": page,
+                "limit": limit,
+                "total": total,
+                "totalPages": (total + limit - 1) // limit,
+                "hasNext": page * limit < total,
+                "hasPrev": page > 1,
+            },
+        }
+
+    async def get_group_dashboard(
+        self,
+        group_id: str,
+        user_id: str,
+        expense_limit: int = 20,
+        algorithm: str = "advanced",
+    ) -> Dict[str, Any]:
+        """
+        Everything the group screen shows, read concurrently: group details
+        with enriched members, the first page of expenses, the user's balance
+        and the optimized settlement plan.
+        """
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
+            raise HTTPException(
+                status_code=403, detail="Group not found or user not a member"
+            )
+
+        # The membership check above warms the cache the parts check again
+        group, expenses, balance, plan = await asyncio.gather(
+            group_service.get_group_by_id(group_id, user_id),
+            self.list_group_expenses(group_id, user_id, 1, expense_limit),
+            self.get_user_balance_in_group(group_id, user_id, user_id),
+            self.calculate_optimized_settlements(group_id, algorithm),
+        )
+        if not group:
+            raise HTTPException(status_code=404, detail="Group not found")
+
+        return {
+            "group": group,
+            "expenses": expenses,
+            "balance": balance,
+            "optimizedSettlements": plan,
+        }
+
+    async def get_group_changes(
+        self, group_id: str, user_id: str, since_token: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Expenses, settlements and members changed since a sync token.
+
+        Without a token, or with one older than the tombstone retention, the
+        full current state is returned with ``fullResync`` set and clients
+        replace their local copy instead of merging into it.
+        """
+
+        try:
+            group_obj_id = ObjectId(group_id)
+        except errors.InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid group ID")
+
+        now = datetime.utcnow()
+        since = decode_sync_token(since_token) if since_token else None
+        full_resync = since is None or since < tombstone_cutoff(now)
+        if full_resync:
+            since = None
+
+        group = await self.groups_collection.find_one(
+            {"_id": group_obj_id}, {**GROUP_MEMBER_FIELDS, "membersUpdatedAt": 1}
+        )
+        if not group or not await find_member(mongodb.database, group, user_id):
+            raise HTTPException(
+                status_code=403, detail="You are not a member of this group"
+            )
+
+        reads = [
+            self.expenses_collection.find(
+                {"groupId": group_id, **since_filter(since, "updatedAt")},
+                LIST_PROJECTION,
+            ).to_list(None),
+            self.settlements_collection.find(
+                {"groupId": group_id, **since_filter(since, "updatedAt")}
+            ).to_list(None),
+        ]
+        if since:
+            reads.append(
+                self.tombstones_collection.find(
+                    {"groupId": group_id, **since_filter(since, "deletedAt")},
+                    {"kind": 1, "entityId": 1},
+                ).to_list(None)
+            )
+        expense_docs, settlement_docs, *rest = await asyncio.gather(*reads)
+
+        deleted = {"expenses": [], "settlements": [], "members": []}
+        for tombstone in rest[0] if rest else []:
+            deleted[f"{tombstone['kind']}s"].append(tombstone["entityId"])
+
+        # A change sends the whole member list. Groups written before the
+        # stamp existed always send it.
+        members_updated_at = group.get("membersUpdatedAt")
+        members_changed = (
+            since is None
+            or members_updated_at is None
+            or members_updated_at > since - SYNC_OVERLAP
+        )
+
+        return {
+            "expenses": [
+                await self._expense_doc_to_response(doc) for doc in expense_docs
+            ],
+            "settlements": [
+                Settlement(**{**doc, "_id": str(doc["_id"])}) for doc in settlement_docs
+            ],
+            "members": (
+                [
+                    GroupMember(**member)
+                    for member in await list_members(mongodb.database, group)
+                ]
+                if members_changed
+                else None
+            ),
+            "deleted": deleted,
+            "nextToken": encode_sync_token(now),
+            "fullResync": full_resync,
+        }
+
     async def update_expense(
         self,
         group_id: str,
@@ -296,7 +1110,16 @@ class ExpenseService:
         updates: ExpenseUpdateRequest,
         user_id: str,
     ) -> ExpenseResponse:
-        """Update an expense"""
+        """
+        Update an expense.
+
+        The expense is updated with a single find_one_and_update returning the
+        previous version, from which the history diff and the updated document
+        are derived without re-reading it. Settlements are rewritten with one
+        bulk write touching only splits that changed. Independent reads and
+        writes run concurrently, or sequentially inside a transaction when
+        ``mongodb_transactions`` is enabled.
+        """
 
         try:
             # Validate ObjectId format
@@ -306,41 +1129,22 @@ class ExpenseService:
                 logger.warning(f"Invalid expense ID format: {expense_id}")
                 raise HTTPException(status_code=400, detail="Invalid expense ID format")
 
-            # Verify user access and that they created the expense
-            expense_doc = await self.expenses_collection.find_one(
-                {"_id": expense_obj_id, "groupId": group_id, "createdBy": user_id}
-            )
-            if not expense_doc:  # Expense not found or user not authorized
-                raise HTTPException(
-                    status_code=403,
-                    detail="Not authorized to update this expense or it does not exist",
-                )
-
-            # Validate splits against current or new amount if both are being updated
-            if updates.splits is not None and updates.amount is not None:
-                total_split = sum(split.amount for split in updates.splits)
-                if abs(total_split - updates.amount) > 0.01:
-                    raise HTTPException(
-                        status_code=400,
-                        detail="Split amounts must sum to total expense amount",
-                    )
-
-            # If only splits are being updated, validate against current amount
-            elif updates.splits is not None:
-                current_amount = expense_doc["amount"]
+            # Only the creator may edit
+            query = {"_id": expense_obj_id, "groupId": group_id, "createdBy": user_id}
+            if updates.splits is not None:
                 total_split = sum(split.amount for split in updates.splits)
-                if abs(total_split - current_amount) > 0.01:
-                    raise HTTPException(
-                        status_code=400,
-                        detail="Split amounts must sum to total expense amount",
-                    )
-
-            # Store original data for history
-            original_data = {
-                "amount": expense_doc["amount"],
-                "description": expense_doc["description"],
-                "splits": expense_doc["splits"],
-            }
+                if updates.amount is not None:
+                    if abs(total_split - updates.amount) > 0.01:
+                        raise HTTPException(
+                            status_code=400,
+                            detail="Split amounts must sum to total expense amount",
+                        )
+                else:
+                    # Splits must match the stored amount; checked by the update itself
+                    query["amount"] = {
+                        "$gte": total_split - 0.01,
+                        "$lte": total_split + 0.01,
+                    }
 
             # Build update document
             update_doc = {"updatedAt": datetime.utcnow()}
@@ -356,81 +1160,104 @@ class ExpenseService:
             if updates.receiptUrls is not None:
                 update_doc["receiptUrls"] = updates.receiptUrls
 
-            # Only add history if there are actual changes
-            if len(update_doc) > 1:  # More than just updatedAt
-                # Get user name
-                try:
-                    user = await self.users_collection.find_one(
-                        {"_id": ObjectId(user_id)}
-                    )
-                    user_name = (
-                        user.get("name", "Unknown User") if user else "Unknown User"
+            rewrite_settlements = (
+                updates.splits is not None or updates.amount is not None
+            )
+            # Editor (for history) plus everyone a new settlement may name
+            name_ids = {user_id}
+            for split in update_doc.get("splits", []):
+                name_ids.add(split["userId"])
+
+            async with self._write_session() as session:
+                reads = [
+                    self.expenses_collection.find_one_and_update(
+                        query,
+                        {"$set": update_doc},
+                        projection={"history": 0},
+                        return_document=ReturnDocument.BEFORE,
+                        session=session,
+                    ),
+                    self._get_user_names(name_ids, session),
+                ]
+                if rewrite_settlements:
+                    reads.append(
+                        self.settlements_collection.find(
+                            {"expenseId": expense_id}, session=session
+                        ).to_list(None)
                     )
-                except Exception as e:
-                    logger.warning(f"Failed to fetch user for history: {e}")
-                    user_name = "Unknown User"
-
-                history_entry = {
-                    "_id": ObjectId(),
-                    "userId": user_id,
-                    "userName": user_name,
-                    "beforeData": original_data,
-                    "editedAt": datetime.utcnow(),
-                }
-
-                # Update expense with both $set and $push operations
-                result = await self.expenses_collection.update_one(
-                    {"_id": expense_obj_id},
-                    {"$set": update_doc, "$push": {"history": history_entry}},
-                )
-
-                if result.matched_count == 0:  # Expense not found during update
-                    raise HTTPException(
-                        status_code=404, detail="Expense not found during update"
+                before, user_names, *rest = await self._run(session, reads)
+
+                if before is None:
+                    await self._raise_update_rejected(query, session)
+
+                updated_expense = {**before, **update_doc}
+                changes = diff_fields(before, update_doc)
+
+                writes = []
+                if changes:
+                    # History lives in its own collection so expense documents stay small
+                    writes.append(
+                        self.expense_history_collection.insert_one(
+                            {
+                                "expenseId": expense_id,
+                                "groupId": group_id,
+                                "userId": user_id,
+                                "userName": user_names.get(user_id, "Unknown User"),
+                                "changes": changes,
+                                "editedAt": update_doc["updatedAt"],
+                            },
+                            session=session,
+                        )
                     )
-            else:
-                # No actual changes, just update the timestamp
-                result = await self.expenses_collection.update_one(
-                    {"_id": expense_obj_id}, {"$set": update_doc}
+                tokens = search_tokens(
+                    updated_expense["description"], updated_expense.get("tags")
                 )
-
-                if result.matched_count == 0:
-                    raise HTTPException(
-                        status_code=404, detail="Expense not found during update"
-                    )
-
-            # If splits changed, recalculate settlements
-            if updates.splits is not None or updates.amount is not None:
-                try:
-                    # Delete old settlements for this expense
-                    await self.settlements_collection.delete_many(
-                        {"expenseId": expense_id}
+                if tokens != before.get("searchTokens"):
+                    writes.append(
+                        self.expenses_collection.update_one(
+                            {"_id": expense_obj_id},
+                            {"$set": {"searchTokens": tokens}},
+                            session=session,
+                        )
                     )
-
-                    # Get updated expense
-                    updated_expense = await self.expenses_collection.find_one(
-                        {"_id": expense_obj_id}
+                balances = None
+                if rewrite_settlements:
+                    operations, balances = self._plan_settlement_writes(
+                        updated_expense, rest[0], user_names
                     )
-
-                    if updated_expense:
-                        # Create new settlements
-                        await self._create_settlements_for_expense(
-                            updated_expense, user_id
+                    if operations:
+                        writes.append(
+                            self.settlements_collection.bulk_write(
+                                operations, ordered=False, session=session
+                            )
                         )
-                except Exception:
-                    logger.error(
-                        f"Warning: Failed to recalculate settlements", exc_info=True
-                    )
-                    # Continue anyway, as the expense update succeeded
-
-            # Return updated expense
-            updated_expense = await self.expenses_collection.find_one(
-                {"_id": expense_obj_id}
+                    split_users = {
+                        split["userId"] for split in updated_expense["splits"]
+                    }
+                    removed = [
+                        doc["_id"]
+                        for doc in rest[0]
+                        if doc["payeeId"] not in split_users
+                    ]
+                    if removed:
+                        writes.append(
+                            record_tombstones(
+                                mongodb.database,
+                                group_id,
+                                "settlement",
+                                removed,
+                                session=session,
+                            )
+                        )
+                await self._run(session, writes)
+
+            await self._notify(
+                group_id,
+                "expense.updated",
+                affects_plan=rewrite_settlements,
+                balances=balances,
+                expenseId=expense_id,
             )
-            if not updated_expense:
-                raise HTTPException(
-                    status_code=500, detail="Failed to retrieve updated expense"
-                )
 
             return await self._expense_doc_to_response(updated_expense)
 
@@ -445,10 +1272,112 @@ class ExpenseService:
             logger.exception(
                 f"Unhandled error in update_expense for expense {expense_id}: {e}"
             )
-            import traceback
+            raise Exception(f"Database error during expense update: {str(e)}")
+
+    async def _raise_update_rejected(self, query: Dict[str, Any], session) -> None:
+        """Explain why the conditional expense update matched nothing"""
+        if "amount" in query:
+            unconditional = {k: v for k, v in query.items() if k != "amount"}
+            if await self.expenses_collection.find_one(
+                unconditional, {"_id": 1}, session=session
+            ):
+                raise HTTPException(
+                    status_code=400,
+                    detail="Split amounts must sum to total expense amount",
+                )
+        raise HTTPException(
+            status_code=403,
+            detail="Not authorized to update this expense or it does not exist",
+        )
 
-            traceback.print_exc()
-            raise Exception(f"Database error during expense update: {str(e)}")
+    async def _get_user_names(self, user_ids, session=None) -> Dict[str, str]:
+        object_ids = [ObjectId(uid) for uid in user_ids if ObjectId.is_valid(uid)]
+        if not object_ids:
+            return {}
+        users = await self.users_collection.find(
+            {"_id": {"$in": object_ids}}, {"name": 1}, session=session
+        ).to_list(None)
+        return {str(user["_id"]): user.get("name", "Unknown") for user in users}
+
+    def _plan_settlement_writes(
+        self,
+        expense: Dict[str, Any],
+        existing: List[Dict[str, Any]],
+        user_names: Dict[str, str],
+    ) -> Tuple[List[Any], Dict[str, float]]:
+        """
+        Bulk write operations bringing an expense's settlements in line with
+        its splits, and the ``balance_inc`` they amount to. Unchanged
+        settlements (including their payment status) are left alone; changed
+        ones are reset to pending.
+        """
+        payer_id = expense.get("paidBy") or expense["createdBy"]
+        description = f"Share for {expense['description']}"
+        by_payee = {doc["payeeId"]: doc for doc in existing}
+        operations, removed, added = [], [], []
+
+        for split in expense["splits"]:
+            payee_id = split["userId"]
+            amount = settlement_amount(expense, split)
+            status = "completed" if payee_id == payer_id else "pending"
+            current = by_payee.pop(payee_id, None)
+            if current is None:
+                doc = {
+                    "_id": ObjectId(),
+                    "expenseId": str(expense["_id"]),
+                    "groupId": expense["groupId"],
+                    "payerId": payer_id,
+                    "payeeId": payee_id,
+                    "payerName": user_names.get(payer_id, "Unknown"),
+                    "payeeName": user_names.get(payee_id, "Unknown"),
+                    "amount": amount,
+                    "status": status,
+                    "description": description,
+                    "createdAt": expense["updatedAt"],
+                    "updatedAt": expense["updatedAt"],
+                }
+                operations.append(InsertOne(doc))
+                added.append(doc)
+                continue
+
+            changed = {}
+            if current.get("payerId") != payer_id:
+                changed["payerId"] = payer_id
+                changed["payerName"] = user_names.get(payer_id, "Unknown")
+            if current.get("amount") != amount:
+                changed["amount"] = amount
+            if changed:
+                changed["status"] = status
+                changed["paidAt"] = None
+            if current.get("description") != description:
+                changed["description"] = description
+            if changed:
+                changed["updatedAt"] = expense["updatedAt"]
+                operations.append(UpdateOne({"_id": current["_id"]}, {"$set": changed}))
+                removed.append(current)
+                added.append({**current, **changed})
+
+        # Splits that were removed
+        for doc in by_payee.values():
+            operations.append(DeleteOne({"_id": doc["_id"]}))
+            removed.append(doc)
+        return operations, balance_inc(removed, added)
+
+    @asynccontextmanager
+    async def _write_session(self):
+        """Yield a session inside a transaction if enabled, otherwise None"""
+        if not settings.mongodb_transactions:
+            yield None
+            return
+        async with await mongodb.client.start_session() as session:
+            async with session.start_transaction():
+                yield session
+
+    async def _run(self, session, awaitables: List[Any]) -> List[Any]:
+        """Await independent operations concurrently; a session allows only one at a time"""
+        if session is None:
+            return list(await asyncio.gather(*awaitables))
+        return [await awaitable for awaitable in awaitables]
 
     async def delete_expense(
         self, group_id: str, expense_id: str, user_id: str
@@ -469,12 +1398,31 @@ class ExpenseService:
             )
 
         # Delete settlements for this expense
+        settlements = await self.settlements_collection.find(
+            {"expenseId": expense_id},
+            {"payerId": 1, "payeeId": 1, "amount": 1, "status": 1},
+        ).to_list(None)
+        settlement_ids = [doc["_id"] for doc in settlements]
         await self.settlements_collection.delete_many({"expenseId": expense_id})
+        await record_tombstones(
+            mongodb.database, group_id, "settlement", settlement_ids
+        )
 
         # Delete the expense
         result = await self.expenses_collection.delete_one(
             {"_id": ObjectId(expense_id)}
         )
+        if result.deleted_count > 0:
+            await self.expense_history_collection.delete_many({"expenseId": expense_id})
+            await record_tombstones(mongodb.database, group_id, "expense", [expense_id])
+            # Only the request that deleted the expense moves the balances
+            await self._notify(
+                group_id,
+                "expense.deleted",
+                affects_plan=True,
+                balances=balance_inc(removed=settlements),
+                expenseId=expense_id,
+            )
         return result.deleted_count > 0
 
     async def calculate_optimized_settlements(
@@ -482,6 +1430,16 @@ class ExpenseService:
     ) -> List[OptimizedSettlement]:
         """Calculate optimized settlements using specified algorithm"""
 
+        return await coalesced_reads.do(
+            group_id,
+            "calculate_optimized_settlements",
+            algorithm,
+            lambda: self._calculate_optimized_settlements(group_id, algorithm),
+        )
+
+    async def _calculate_optimized_settlements(
+        self, group_id: str, algorithm: str
+    ) -> List[OptimizedSettlement]:
         if algorithm == "normal":
             return await self._calculate_normal_settlements(group_id)
         else:
@@ -496,7 +1454,11 @@ class ExpenseService:
         settlements = await self.settlements_collection.find(
             {"groupId": group_id, "status": "pending"}
         ).to_list(None)
+        return self._plan_normal(settlements)
 
+    def _plan_normal(
+        self, settlements: List[Dict[str, Any]]
+    ) -> List[OptimizedSettlement]:
         # Calculate net balances between each pair of users
         net_balances = defaultdict(lambda: defaultdict(float))
         user_names = {}
@@ -553,6 +1515,12 @@ class ExpenseService:
         settlements = await self.settlements_collection.find(
             {"groupId": group_id, "status": "pending"}
         ).to_list(None)
+        return self._plan_advanced(settlements)
+
+    def _plan_advanced(
+        self, settlements: List[Dict[str, Any]]
+    ) -> List[OptimizedSettlement]:
+        """Minimal transfers clearing the net balances of the given pending settlements"""
 
         # Calculate net balance for each user (what they owe - what they are owed)
         user_balances = defaultdict(float)
@@ -627,10 +1595,8 @@ class ExpenseService:
         """Create a manual settlement record"""
 
         # Verify user access
-        group = await self.groups_collection.find_one(
-            {"_id": ObjectId(group_id), "members.userId": user_id}
-        )
-        if not group:
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
             logger.warning(
                 f"Unauthorized access attempt to group {group_id} by user {user_id}"
             )
@@ -665,14 +1631,303 @@ class ExpenseService:
             "paidAt": settlement_data.paidAt or datetime.utcnow(),
             "createdAt": datetime.utcnow(),
         }
+        settlement_doc["updatedAt"] = settlement_doc["createdAt"]
 
         await self.settlements_collection.insert_one(settlement_doc)
 
+        await self._notify(
+            group_id,
+            "settlement.created",
+            settlementId=str(settlement_doc["_id"]),
+        )
+
         return Settlement(**{**settlement_doc, "_id": str(settlement_doc["_id"])})
 
-    async def _expense_doc_to_response(self, doc: Dict[str, Any]) -> ExpenseResponse:
-        """Convert expense document to response model"""
-        return ExpenseResponse(**{**doc, "_id": str(doc["_id"])})
+    async def upload_attachment(
+        self, group_id: str, expense_id: str, upload: Any, user_id: str
+    ) -> Dict[str, Any]:
+        """Stream an uploaded file into attachment storage and link it to the expense"""
+
+        try:
+            group_obj_id = ObjectId(group_id)
+            expense_obj_id = ObjectId(expense_id)
+        except errors.InvalidId:
+            raise HTTPException(
+                status_code=400, detail="Invalid group ID or expense ID"
+            )
+
+        # Check access before accepting any bytes
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
+            raise HTTPException(
+                status_code=403, detail="You are not a member of this group"
+            )
+        expense = await self.expenses_collection.find_one(
+            {"_id": expense_obj_id, "groupId": group_id}, {"_id": 1}
+        )
+        if not expense:
+            raise HTTPException(status_code=404, detail="Expense not found")
+
+        try:
+            stored = await get_attachment_store().save(
+                upload, settings.attachment_max_bytes
+            )
+        except AttachmentTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+
+        attachment = {
+            "key": stored.key,
+            "filename": upload.filename,
+            "contentType": upload.content_type,
+            "size": stored.size,
+            "uploadedBy": user_id,
+            "uploadedAt": datetime.utcnow(),
+        }
+        # The same file attached twice to one expense is stored once
+        await self.expenses_collection.update_one(
+            {"_id": expense_obj_id, "attachments.key": {"$ne": stored.key}},
+            {
+                "$push": {"attachments": attachment},
+                "$set": {"updatedAt": datetime.utcnow()},
+            },
+        )
+        logger.info(
+            f"Stored attachment {stored.key} ({stored.size} bytes, "
+            f"deduplicated={stored.deduplicated}) for expense {expense_id}"
+        )
+        await self._notify(group_id, "expense.updated", expenseId=expense_id)
+
+        return {
+            **attachment,
+            "url": self._attachment_url(group_id, expense_id, stored.key),
+        }
+
+    async def generate_attachment_derivatives(
+        self, group_id: str, expense_id: str, key: str, content_type: Optional[str]
+    ) -> Dict[str, str]:
+        """Render thumbnail/preview images for an uploaded receipt and record their keys"""
+
+        if not settings.thumbnails_enabled or not is_thumbnailable(content_type):
+            return {}
+
+        store = get_attachment_store()
+        derivatives = {name: derivative_key(key, name) for name in DERIVATIVES}
+
+        # Deduplicated uploads already have their derivatives
+        existing = [await store.exists(k) for k in derivatives.values()]
+        if not all(existing):
+            try:
+                async with store.local_copy(key) as source_path:
+                    rendered = await render_in_pool(source_path)
+            except FileNotFoundError:
+                logger.warning(f"Attachment {key} vanished before thumbnailing")
+                return {}
+            if not rendered:
+                return {}
+            for name, data in rendered.items():
+                await store.put_bytes(derivatives[name], data)
+
+        await self.expenses_collection.update_one(
+            {"_id": ObjectId(expense_id), "attachments.key": key},
+            {
+                "$set": {
+                    "attachments.$.derivatives": derivatives,
+                    "updatedAt": datetime.utcnow(),
+                }
+            },
+        )
+        await self._notify(group_id, "expense.updated", expenseId=expense_id)
+        return derivatives
+
+    async def get_attachment(
+        self, group_id: str, expense_id: str, key: str, user_id: str
+    ) -> Dict[str, Any]:
+        """Return metadata for one attachment of an expense the user can access"""
+
+        try:
+            group_obj_id = ObjectId(group_id)
+            expense_obj_id = ObjectId(expense_id)
+        except errors.InvalidId:
+            raise HTTPException(
+                status_code=400, detail="Invalid group ID or expense ID"
+            )
+
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
+            raise HTTPException(
+                status_code=403, detail="You are not a member of this group"
+            )
+
+        # Only ship the matching attachment entry, not the whole expense
+        expense = await self.expenses_collection.find_one(
+            {"_id": expense_obj_id, "groupId": group_id, "attachments.key": key},
+            {"attachments": {"$elemMatch": {"key": key}}},
+        )
+        if not expense or not expense.get("attachments"):
+            raise HTTPException(status_code=404, detail="Attachment not found")
+
+        return expense["attachments"][0]
+
+    def _attachment_url(
+        self, group_id: str, expense_id: str, key: str, variant: Optional[str] = None
+    ) -> str:
+        url = f"/groups/{group_id}/expenses/{expense_id}/attachments/{key}"
+        return f"{url}?variant={variant}" if variant else url
+
+    def _attachment_to_response(
+        self, group_id: str, expense_id: str, attachment: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        key = attachment["key"]
+        derivatives = attachment.get("derivatives") or {}
+        return {
+            **attachment,
+            "url": self._attachment_url(group_id, expense_id, key),
+            "thumbnailUrl": (
+                self._attachment_url(group_id, expense_id, key, "thumbnail")
+                if "thumbnail" in derivatives
+                else None
+            ),
+            "previewUrl": (
+                self._attachment_url(group_id, expense_id, key, "preview")
+                if "preview" in derivatives
+                else None
+            ),
+        }
+
+    async def _notify(
+        self,
+        group_id: str,
+        event_type: str,
+        affects_plan: bool = False,
+        balances: Optional[Dict[str, float]] = None,
+        **data,
+    ) -> Optional[int]:
+        """
+        Record a change to a group: apply the ``balances`` increments of the
+        settlements written (see ``balance_inc``), bump its change version
+        (invalidating cached reads), forget its in-flight coalesced reads and
+        publish the event, plus plan.updated when pending balances moved.
+
+        With ``settlement_plan_async`` a plan change queues the group for the
+        background planner instead, which publishes plan.updated once the new
+        plan is stored; the change version the plan has to reach is returned.
+        """
+        coalesced_reads.forget(group_id)
+        update = {
+            "$inc": CHANGE_VERSION_INC,
+            "$set": {"lastActivityAt": datetime.utcnow()},
+        }
+        plan_async = affects_plan and settings.settlement_plan_async
+        plan_version = None
+        if balances:
+            try:
+                # Increments commute, so concurrent writes never overwrite each
+                # other's balances. Groups without stored balances are
+                # aggregated on read until migration 0007 backfills them.
+                await self.groups_collection.update_one(
+                    {"_id": ObjectId(group_id), "balances": {"$exists": True}},
+                    {"$inc": balances},
+                )
+            except Exception as e:
+                logger.error(f"Failed to update balances of group {group_id}: {e}")
+        try:
+            if plan_async:
+                # Counts plan-changing writes, so readers can tell a stale plan
+                update["$inc"] = {**update["$inc"], PLAN_REVISION_FIELD: 1}
+                group = await self.groups_collection.find_one_and_update(
+                    {"_id": ObjectId(group_id)},
+                    update,
+                    projection={"changeVersion": 1},
+                    return_document=ReturnDocument.AFTER,
+                )
+                plan_version = group["changeVersion"] if group else None
+            else:
+                await self.groups_collection.update_one(
+                    {"_id": ObjectId(group_id)}, update
+                )
+        except Exception as e:
+            logger.error(f"Failed to bump change version of group {group_id}: {e}")
+        await publish_group_event(group_id, event_type, **data)
+        if plan_async:
+            settlement_planner.request(group_id)
+        elif affects_plan:
+            await publish_group_event(group_id, "plan.updated")
+        return plan_version
+
+    async def compute_settlement_plan(self, group_id: str) -> Dict[str, Any]:
+        """
+        Compute the group's optimized settlement plan and store it in
+        settlement_plans, tagged with the change version it reflects.
+        """
+        group = await self.groups_collection.find_one(
+            {"_id": ObjectId(group_id)}, {"changeVersion": 1, PLAN_REVISION_FIELD: 1}
+        )
+        # Read before the settlements: every write up to this version is included
+        version = (group or {}).get("changeVersion", 0)
+        optimized_settlements = await self.calculate_optimized_settlements(group_id)
+        summary = await self._get_group_summary(group_id, optimized_settlements)
+        plan = {
+            "version": version,
+            PLAN_REVISION_FIELD: (group or {}).get(PLAN_REVISION_FIELD, 0),
+            "computedAt": datetime.utcnow(),
+            "optimizedSettlements": [s.model_dump() for s in optimized_settlements],
+            "totalExpenses": summary["totalExpenses"],
+            "totalSettlements": summary["totalSettlements"],
+        }
+        try:
+            # Never replace a plan of a later version computed concurrently
+            await self.settlement_plans_collection.update_one(
+                {"_id": group_id, "version": {"$lte": version}},
+                {"$set": plan},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return plan
+        await publish_group_event(group_id, "plan.updated", version=version)
+        return plan
+
+    async def get_settlement_plan(self, group_id: str, user_id: str) -> Dict[str, Any]:
+        """
+        The group's latest stored settlement plan, computed if there is none.
+        ``pendingChanges`` counts the plan-changing writes it does not include
+        yet; the plan is ``stale`` while that is not zero.
+        """
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
+            raise HTTPException(
+                status_code=403, detail="Group not found or user not a member"
+            )
+        plan, group = await asyncio.gather(
+            self.settlement_plans_collection.find_one({"_id": group_id}),
+            self.groups_collection.find_one(
+                {"_id": ObjectId(group_id)}, {PLAN_REVISION_FIELD: 1}
+            ),
+        )
+        if plan is None:
+            plan = await self.compute_settlement_plan(group_id)
+        pending = max(
+            0,
+            (group or {}).get(PLAN_REVISION_FIELD, 0)
+            - plan.get(PLAN_REVISION_FIELD, 0),
+        )
+        return {**plan, "stale": pending > 0, "pendingChanges": pending}
+
+    def _expense_projection(self, fields: FrozenSet[str]) -> Dict[str, int]:
+        # Attachment URLs are built from the group id
+        return field_projection(fields, ("groupId",) if "attachments" in fields else ())
+
+    async def _expense_doc_to_response(
+        self, doc: Dict[str, Any], fields: Optional[FrozenSet[str]] = None
+    ) -> ExpenseResponse:
+        """Convert expense document to response model, trimmed to ``fields``"""
+        expense_id = str(doc["_id"])
+        data = {**doc, "_id": expense_id}
+        if "attachments" in doc:
+            data["attachments"] = [
+                self._attachment_to_response(doc["groupId"], expense_id, attachment)
+                for attachment in doc["attachments"]
+            ]
+        return build(ExpenseResponse, fields, data)
 
     async def _get_group_summary(
         self, group_id: str, optimized_settlements: List[OptimizedSettlement]
@@ -685,7 +1940,7 @@ class ExpenseService:
             {
                 "$group": {
                     "_id": None,
-                    "totalExpenses": {"$sum": "$amount"},
+                    "totalExpenses": {"$sum": GROUP_CURRENCY_AMOUNT},
                     "expenseCount": {"$sum": 1},
                 }
             },
@@ -717,14 +1972,13 @@ class ExpenseService:
         status_filter: Optional[str] = None,
         page: int = 1,
         limit: int = 50,
+        fields: Optional[FrozenSet[str]] = None,
     ) -> Dict[str, Any]:
         """Get settlements for a group with pagination"""
 
         # Verify user access
-        group = await self.groups_collection.find_one(
-            {"_id": ObjectId(group_id), "members.userId": user_id}
-        )
-        if not group:
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
             logger.warning(
                 f"Unauthorized access attempt to group {group_id} by user {user_id}"
             )
@@ -743,7 +1997,9 @@ class ExpenseService:
         # Get settlements with pagination
         skip = (page - 1) * limit
         settlements_docs = (
-            await self.settlements_collection.find(query)
+            await self.settlements_collection.find(
+                query, None if fields is None else field_projection(fields)
+            )
             .sort("createdAt", -1)
             .skip(skip)
             .limit(limit)
@@ -752,7 +2008,7 @@ class ExpenseService:
 
         settlements = []
         for doc in settlements_docs:
-            settlement = Settlement(**{**doc, "_id": str(doc["_id"])})
+            settlement = build(Settlement, fields, {**doc, "_id": str(doc["_id"])})
             settlements.append(settlement)
 
         return {
@@ -763,32 +2019,34 @@ class ExpenseService:
         }
 
     async def get_settlement_by_id(
-        self, group_id: str, settlement_id: str, user_id: str
+        self,
+        group_id: str,
+        settlement_id: str,
+        user_id: str,
+        fields: Optional[FrozenSet[str]] = None,
     ) -> Settlement:
         """Get a single settlement by ID"""
 
         # Verify user access
-        group = await self.groups_collection.find_one(
-            {
-                "_id": ObjectId(
-                    group_id
-                ),  # Assuming valid object ID format (same as above functions)
-                "members.userId": user_id,
-            }
-        )
-        if not group:
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
             raise HTTPException(
                 status_code=403, detail="Group not found or user not a member"
             )
 
-        settlement_doc = await self.settlements_collection.find_one(
-            {"_id": ObjectId(settlement_id), "groupId": group_id}
+        query = {"_id": ObjectId(settlement_id), "groupId": group_id}
+        settlement_doc = await (
+            self.settlements_collection.find_one(query)
+            if fields is None
+            else self.settlements_collection.find_one(query, field_projection(fields))
         )
 
         if not settlement_doc:
             raise HTTPException(status_code=404, detail="Settlement not found")
 
-        return Settlement(**{**settlement_doc, "_id": str(settlement_doc["_id"])})
+        return build(
+            Settlement, fields, {**settlement_doc, "_id": str(settlement_doc["_id"])}
+        )
 
     async def update_settlement_status(
         self,
@@ -805,39 +2063,209 @@ class ExpenseService:
         if paid_at:
             update_doc["paidAt"] = paid_at
 
-        result = await self.settlements_collection.update_one(
-            {"_id": ObjectId(settlement_id), "groupId": group_id}, {"$set": update_doc}
+        # The previous version tells whether this write moved the balances
+        before = await self.settlements_collection.find_one_and_update(
+            {"_id": ObjectId(settlement_id), "groupId": group_id},
+            {"$set": update_doc},
+            return_document=ReturnDocument.BEFORE,
         )
 
-        if result.matched_count == 0:
+        if before is None:
             raise HTTPException(status_code=404, detail="Settlement not found")
 
-        # Get updated settlement
-        settlement_doc = await self.settlements_collection.find_one(
-            {"_id": ObjectId(settlement_id)}
+        settlement_doc = {**before, **update_doc}
+
+        await self._notify(
+            group_id,
+            "settlement.updated",
+            affects_plan=True,
+            balances=balance_inc([before], [settlement_doc]),
+            settlementId=settlement_id,
+            status=status.value,
         )
 
         return Settlement(**{**settlement_doc, "_id": str(settlement_doc["_id"])})
 
+    async def bulk_update_settlement_status(
+        self,
+        group_id: str,
+        settlement_ids: List[str],
+        status: SettlementStatus,
+        paid_at: Optional[datetime] = None,
+        user_id: str = None,
+    ) -> Dict[str, Any]:
+        """Set the status of many settlements of a group with one update_many"""
+
+        try:
+            object_ids = [ObjectId(sid) for sid in set(settlement_ids)]
+            group_obj_id = ObjectId(group_id)
+        except errors.InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid settlement ID")
+
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
+            raise HTTPException(
+                status_code=403, detail="You are not a member of this group"
+            )
+
+        now = datetime.utcnow()
+        update_doc = {"status": status.value, "updatedAt": now}
+        if paid_at:
+            update_doc["paidAt"] = paid_at
+        elif status == SettlementStatus.COMPLETED:
+            update_doc["paidAt"] = now
+
+        query = {"_id": {"$in": object_ids}, "groupId": group_id}
+        # Settlements whose status changes, for the balances they move
+        changing = await self.settlements_collection.find(
+            {**query, "status": {"$ne": status.value}},
+            {"payerId": 1, "payeeId": 1, "amount": 1, "status": 1},
+        ).to_list(None)
+        result = await self.settlements_collection.update_many(
+            query, {"$set": update_doc}
+        )
+
+        if result.modified_count:
+            await self._notify(
+                group_id,
+                "settlement.bulk_updated",
+                affects_plan=True,
+                balances=balance_inc(
+                    changing, [{**doc, **update_doc} for doc in changing]
+                ),
+                count=result.modified_count,
+                status=status.value,
+            )
+
+        return {
+            "matched": result.matched_count,
+            "modified": result.modified_count,
+            "status": status.value,
+        }
+
+    async def settle_all(self, group_id: str, user_id: str) -> Dict[str, Any]:
+        """
+        Close out a group: record the optimized plan as completed payments.
+
+        The pending settlements the plan is computed from are marked completed
+        and one completed payment per plan transfer is inserted, all in a
+        single bulk write.
+        """
+
+        try:
+            group_obj_id = ObjectId(group_id)
+        except errors.InvalidId:
+            raise HTTPException(status_code=400, detail="Invalid group ID")
+
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
+            raise HTTPException(
+                status_code=403, detail="You are not a member of this group"
+            )
+
+        pending = await self.settlements_collection.find(
+            {"groupId": group_id, "status": "pending"},
+            {"payerId": 1, "payeeId": 1, "payerName": 1, "payeeName": 1, "amount": 1},
+        ).to_list(None)
+        if not pending:
+            return {"settledCount": 0, "payments": [], "totalAmount": 0}
+
+        plan = self._plan_advanced(pending)
+        now = datetime.utcnow()
+        payments = [
+            {
+                "_id": ObjectId(),
+                "expenseId": None,
+                "groupId": group_id,
+                # The debtor pays the creditor
+                "payerId": transfer.fromUserId,
+                "payeeId": transfer.toUserId,
+                "payerName": transfer.fromUserName,
+                "payeeName": transfer.toUserName,
+                "amount": transfer.amount,
+                "status": "completed",
+                "description": "Settle all",
+                "paidAt": now,
+                "createdAt": now,
+                "updatedAt": now,
+            }
+            for transfer in plan
+        ]
+
+        # Only settlements from the snapshot the plan was computed from; anything
+        # added meanwhile stays pending for the next plan
+        operations = [
+            UpdateMany(
+                {"_id": {"$in": [doc["_id"] for doc in pending]}, "status": "pending"},
+                {"$set": {"status": "completed", "paidAt": now, "updatedAt": now}},
+            )
+        ] + [InsertOne(payment) for payment in payments]
+
+        async with self._write_session() as session:
+            result = await self.settlements_collection.bulk_write(
+                operations, ordered=True, session=session
+            )
+
+        settled = pending
+        if result.modified_count < len(pending):
+            # Some were paid or removed meanwhile by writes that moved the
+            # balances themselves; this write completed the ones it stamped
+            settled = await self.settlements_collection.find(
+                {
+                    "_id": {"$in": [doc["_id"] for doc in pending]},
+                    "status": "completed",
+                    "updatedAt": now,
+                },
+                {"payerId": 1, "payeeId": 1, "amount": 1},
+            ).to_list(None)
+        await self._notify(
+            group_id,
+            "settlement.settled_all",
+            affects_plan=True,
+            balances=balance_inc(
+                removed=[{**doc, "status": "pending"} for doc in settled]
+            ),
+            count=result.modified_count,
+        )
+
+        return {
+            "settledCount": result.modified_count,
+            "payments": [
+                Settlement(**{**payment, "_id": str(payment["_id"])})
+                for payment in payments
+            ],
+            "totalAmount": round(sum(payment["amount"] for payment in payments), 2),
+        }
+
     async def delete_settlement(
         self, group_id: str, settlement_id: str, user_id: str
     ) -> bool:
         """Delete a settlement"""
 
         # Verify user access
-        group = await self.groups_collection.find_one(
-            {"_id": ObjectId(group_id), "members.userId": user_id}
-        )
-        if not group:
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
             raise HTTPException(
                 status_code=403, detail="Group not found or user not a member"
             )
 
-        result = await self.settlements_collection.delete_one(
-            {"_id": ObjectId(settlement_id), "groupId": group_id}
+        deleted = await self.settlements_collection.find_one_and_delete(
+            {"_id": ObjectId(settlement_id), "groupId": group_id},
+            projection={"payerId": 1, "payeeId": 1, "amount": 1, "status": 1},
         )
+        if deleted is not None:
+            await record_tombstones(
+                mongodb.database, group_id, "settlement", [settlement_id]
+            )
+            await self._notify(
+                group_id,
+                "settlement.deleted",
+                affects_plan=True,
+                balances=balance_inc(removed=[deleted]),
+                settlementId=settlement_id,
+            )
 
-        return result.deleted_count > 0
+        return deleted is not None
 
     async def get_user_balance_in_group(
         self, group_id: str, target_user_id: str, current_user_id: str
@@ -845,10 +2273,10 @@ class ExpenseService:
         """Get a user's balance within a specific group"""
 
         # Verify current user access
-        group = await self.groups_collection.find_one(
-            {"_id": ObjectId(group_id), "members.userId": current_user_id}
+        role = await membership_cache.role_of(
+            mongodb.database, group_id, current_user_id
         )
-        if not group:
+        if role is None:
             raise HTTPException(
                 status_code=403, detail="Group not found or user not a member"
             )
@@ -916,7 +2344,8 @@ class ExpenseService:
                         {"createdBy": target_user_id},
                         {"splits.userId": target_user_id},
                     ],
-                }
+                },
+                LIST_PROJECTION,
             )
             .sort("createdAt", -1)
             .limit(5)
@@ -929,7 +2358,7 @@ class ExpenseService:
             user_share = 0
             for split in expense["splits"]:
                 if split["userId"] == target_user_id:
-                    user_share = split["amount"]
+                    user_share = settlement_amount(expense, split)
                     break
 
             recent_expense_data.append(
@@ -956,26 +2385,41 @@ class ExpenseService:
         """Get cross-group friend balances for a user"""
 
         # Get all groups user belongs to
-        groups = await self.groups_collection.find({"members.userId": user_id}).to_list(
-            None
-        )
+        groups = await self.groups_collection.find(
+            await user_groups_filter(mongodb.database, user_id)
+        ).to_list(None)
 
         friends_balance = []
         user_totals = {"totalOwedToYou": 0, "totalYouOwe": 0}
 
         # Get all unique friends across groups
-        friend_ids = set()
-        for group in groups:
-            for member in group["members"]:
-                if member["userId"] != user_id:
-                    friend_ids.add(member["userId"])
+        group_member_ids = {
+            str(group["_id"]): set(await member_roles(mongodb.database, group))
+            for group in groups
+        }
+        friend_ids = set().union(*group_member_ids.values()) - {user_id}
 
-        # Get user names & images
-        users = await self.users_collection.find(
-            {"_id": {"$in": [ObjectId(uid) for uid in friend_ids]}}
-        ).to_list(None)
+        # Get user names & images, and the user's own currency
+        lookup_ids = [ObjectId(uid) for uid in friend_ids]
+        if ObjectId.is_valid(user_id):
+            lookup_ids.append(ObjectId(user_id))
+        users = await self.users_collection.find({"_id": {"$in": lookup_ids}}).to_list(
+            None
+        )
         user_names = {str(user["_id"]): user.get("name", "Unknown") for user in users}
         user_images = {str(user["_id"]): user.get("imageUrl") for user in users}
+        currency = (
+            next((u.get("currency") for u in users if str(u["_id"]) == user_id), None)
+            or "USD"
+        )
+
+        # Net balances are in the user's currency: one factor per group currency
+        group_currencies = {
+            str(group["_id"]): group.get("currency") or "USD" for group in groups
+        }
+        factors = await self._conversion_factors(
+            set(group_currencies.values()), currency
+        )
 
         for friend_id in friend_ids:
             friend_balance_data = {
@@ -996,10 +2440,7 @@ class ExpenseService:
                 group_id = str(group["_id"])
 
                 # Check if friend is in this group
-                friend_in_group = any(
-                    member["userId"] == friend_id for member in group["members"]
-                )
-                if not friend_in_group:
+                if friend_id not in group_member_ids[group_id]:
                     continue
 
                 # Calculate net balance between user and friend in this group
@@ -1054,7 +2495,9 @@ class ExpenseService:
                 balance_data = result[0] if result else {"userOwes": 0, "friendOwes": 0}
 
                 group_balance = balance_data["friendOwes"] - balance_data["userOwes"]
-                total_friend_balance += group_balance
+                factor = factors.get(group_currencies[group_id])
+                if factor is not None:
+                    total_friend_balance += group_balance * factor
 
                 if (
                     abs(group_balance) > 0.01
@@ -1064,6 +2507,7 @@ class ExpenseService:
                             "groupId": group_id,
                             "groupName": group["name"],
                             "balance": group_balance,
+                            "currency": group_currencies[group_id],
                             "owesYou": group_balance > 0,
                         }
                     )
@@ -1071,6 +2515,7 @@ class ExpenseService:
             if (
                 abs(total_friend_balance) > 0.01
             ):  # Only include friends with non-zero balance
+                total_friend_balance = round(total_friend_balance, 2)
                 friend_balance_data["netBalance"] = total_friend_balance
                 friend_balance_data["owesYou"] = total_friend_balance > 0
 
@@ -1084,12 +2529,14 @@ class ExpenseService:
         return {
             "friendsBalance": friends_balance,
             "summary": {
-                "totalOwedToYou": user_totals["totalOwedToYou"],
-                "totalYouOwe": user_totals["totalYouOwe"],
-                "netBalance": user_totals["totalOwedToYou"]
-                - user_totals["totalYouOwe"],
+                "totalOwedToYou": round(user_totals["totalOwedToYou"], 2),
+                "totalYouOwe": round(user_totals["totalYouOwe"], 2),
+                "netBalance": round(
+                    user_totals["totalOwedToYou"] - user_totals["totalYouOwe"], 2
+                ),
                 "friendCount": len(friends_balance),
                 "activeGroups": len(groups),
+                "currency": currency,
             },
         }
 
@@ -1097,10 +2544,11 @@ class ExpenseService:
         """Get overall balance summary for a user"""
 
         # Get all groups user belongs to
-        groups = await self.groups_collection.find({"members.userId": user_id}).to_list(
-            None
-        )
+        groups = await self.groups_collection.find(
+            await user_groups_filter(mongodb.database, user_id)
+        ).to_list(None)
 
+        currency = await self._user_currency(user_id)
         total_owed_to_you = 0
         total_you_owe = 0
         groups_summary = []
@@ -1146,22 +2594,57 @@ class ExpenseService:
                         "group_id": group_id,
                         "group_name": group["name"],
                         "yourBalanceInGroup": group_balance,
+                        "currency": group.get("currency") or "USD",
                     }
                 )
 
-                if group_balance > 0:
-                    total_owed_to_you += group_balance
-                else:
-                    total_you_owe += abs(group_balance)
+        # Totals are in the user's currency: one factor per group currency
+        factors = await self._conversion_factors(
+            {g["currency"] for g in groups_summary}, currency
+        )
+        for group_summary in groups_summary:
+            factor = factors.get(group_summary["currency"])
+            if factor is None:
+                continue
+            balance = group_summary["yourBalanceInGroup"] * factor
+            if balance > 0:
+                total_owed_to_you += balance
+            else:
+                total_you_owe += abs(balance)
 
         return {
-            "totalOwedToYou": total_owed_to_you,
-            "totalYouOwe": total_you_owe,
-            "netBalance": total_owed_to_you - total_you_owe,
-            "currency": "USD",
+            "totalOwedToYou": round(total_owed_to_you, 2),
+            "totalYouOwe": round(total_you_owe, 2),
+            "netBalance": round(total_owed_to_you - total_you_owe, 2),
+            "currency": currency,
             "groupsSummary": groups_summary,
         }
 
+    async def _user_currency(self, user_id: str) -> str:
+        """The currency a user's cross-group totals are reported in"""
+        if not ObjectId.is_valid(user_id):
+            return "USD"
+        user = await self.users_collection.find_one(
+            {"_id": ObjectId(user_id)}, {"currency": 1}
+        )
+        return (user or {}).get("currency") or "USD"
+
+    async def _conversion_factors(
+        self, currencies: Set[str], target: str
+    ) -> Dict[str, float]:
+        """
+        Factors converting each of ``currencies`` to ``target``. Currencies
+        without an exchange rate get none, leaving their balances out of
+        converted totals.
+        """
+        try:
+            return await exchange_rates.factors(currencies, target)
+        except UnknownCurrencyError as e:
+            logger.warning(f"Totals in {target} leave out unconvertible balances: {e}")
+            if target in e.currencies:
+                return {target: 1.0}
+            return await exchange_rates.factors(currencies - set(e.currencies), target)
+
     async def get_group_analytics(
         self,
         group_id: str,
@@ -1173,14 +2656,26 @@ class ExpenseService:
         """Get expense analytics for a group"""
 
         # Verify user access
-        group = await self.groups_collection.find_one(
-            {"_id": ObjectId(group_id), "members.userId": user_id}
-        )
-        if not group:
+        role = await membership_cache.role_of(mongodb.database, group_id, user_id)
+        if role is None:
             raise HTTPException(
                 status_code=403, detail="Group not found or user not a member"
             )
 
+        return await coalesced_reads.do(
+            group_id,
+            "get_group_analytics",
+            (period, year, month),
+            lambda: self._group_analytics(group_id, period, year, month),
+        )
+
+    async def _group_analytics(
+        self,
+        group_id: str,
+        period: str,
+        year: Optional[int],
+        month: Optional[int],
+    ) -> Dict[str, Any]:
         # Build date range
         if period == "month" and year and month:
             start_date = datetime(year, month, 1)
@@ -1203,34 +2698,96 @@ class ExpenseService:
                 end_date = datetime(now.year, now.month + 1, 1)
             period_str = f"{now.year}-{now.month:02d}"
 
-        # Get expenses in the period
-        expenses = await self.expenses_collection.find(
-            {"groupId": group_id, "createdAt": {"$gte": start_date, "$lt": end_date}}
-        ).to_list(None)
+        # One pass over the period's expenses; amounts entered in other
+        # currencies are converted at their recorded rate inside the pipeline
+        pipeline = [
+            {
+                "$match": {
+                    "groupId": group_id,
+                    "createdAt": {"$gte": start_date, "$lt": end_date},
+                }
+            },
+            {
+                "$facet": {
+                    "totals": [
+                        {
+                            "$group": {
+                                "_id": None,
+                                "amount": {"$sum": GROUP_CURRENCY_AMOUNT},
+                                "count": {"$sum": 1},
+                            }
+                        }
+                    ],
+                    "categories": [
+                        {
+                            "$project": {
+                                "amount": GROUP_CURRENCY_AMOUNT,
+                                "tags": {"$ifNull": ["$tags", ["uncategorized"]]},
+                            }
+                        },
+                        {"$unwind": "$tags"},
+                        {
+                            "$group": {
+                                "_id": "$tags",
+                                "amount": {"$sum": "$amount"},
+                                "count": {"$sum": 1},
+                            }
+                        },
+                    ],
+                    "paid": [
+                        {
+                            "$group": {
+                                "_id": "$createdBy",
+                                "amount": {"$sum": GROUP_CURRENCY_AMOUNT},
+                            }
+                        }
+                    ],
+                    "owed": [
+                        {"$unwind": "$splits"},
+                        {
+                            "$group": {
+                                "_id": "$splits.userId",
+                                "amount": {"$sum": GROUP_CURRENCY_SPLIT_AMOUNT},
+                            }
+                        },
+                    ],
+                    "days": [
+                        {
+                            "$group": {
+                                "_id": {
+                                    "$dateToString": {
+                                        "format": "%Y-%m-%d",
+                                        "date": "$createdAt",
+                                    }
+                                },
+                                "amount": {"$sum": GROUP_CURRENCY_AMOUNT},
+                                "count": {"$sum": 1},
+                            }
+                        }
+                    ],
+                }
+            },
+        ]
+        facets = (await self.expenses_collection.aggregate(pipeline).to_list(None))[0]
 
-        total_expenses = sum(expense["amount"] for expense in expenses)
-        expense_count = len(expenses)
+        totals = facets["totals"][0] if facets["totals"] else {"amount": 0, "count": 0}
+        total_expenses = round(totals["amount"], 2)
+        expense_count = totals["count"]
         avg_expense = total_expenses / expense_count if expense_count > 0 else 0
 
         # Analyze categories (tags)
-        tag_stats = defaultdict(lambda: {"amount": 0, "count": 0})
-        for expense in expenses:
-            for tag in expense.get("tags", ["uncategorized"]):
-                tag_stats[tag]["amount"] += expense["amount"]
-                tag_stats[tag]["count"] += 1
-
         top_categories = []
-        for tag, stats in sorted(
-            tag_stats.items(), key=lambda x: x[1]["amount"], reverse=True
+        for row in sorted(
+            facets["categories"], key=lambda r: r["amount"], reverse=True
         ):
             top_categories.append(
                 {
-                    "tag": tag,
-                    "amount": stats["amount"],
-                    "count": stats["count"],
+                    "tag": row["_id"],
+                    "amount": round(row["amount"], 2),
+                    "count": row["count"],
                     "percentage": round(
                         (
-                            (stats["amount"] / total_expenses * 100)
+                            (row["amount"] / total_expenses * 100)
                             if total_expenses > 0
                             else 0
                         ),
@@ -1240,49 +2797,41 @@ class ExpenseService:
             )
 
         # Member contributions
+        paid = {row["_id"]: row["amount"] for row in facets["paid"]}
+        owed = {row["_id"]: row["amount"] for row in facets["owed"]}
         member_contributions = []
-        group_members = {member["userId"]: member for member in group["members"]}
 
+        # Every member is listed, so the member list is read once per
+        # computation here rather than for each caller's access check
+        group_members = await membership_cache.roles(mongodb.database, group_id) or {}
         for member_id in group_members:
             # Get user info
             user = await self.users_collection.find_one({"_id": ObjectId(member_id)})
             user_name = user.get("name", "Unknown") if user else "Unknown"
 
-            # Calculate contributions
-            total_paid = sum(
-                expense["amount"]
-                for expense in expenses
-                if expense["createdBy"] == member_id
-            )
-
-            total_owed = 0
-            for expense in expenses:
-                for split in expense["splits"]:
-                    if split["userId"] == member_id:
-                        total_owed += split["amount"]
-
+            total_paid = round(paid.get(member_id, 0), 2)
+            total_owed = round(owed.get(member_id, 0), 2)
             member_contributions.append(
                 {
                     "userId": member_id,
                     "userName": user_name,
                     "totalPaid": total_paid,
                     "totalOwed": total_owed,
-                    "netContribution": total_paid - total_owed,
+                    "netContribution": round(total_paid - total_owed, 2),
                 }
             )
 
         # Expense trends (daily)
+        days = {row["_id"]: row for row in facets["days"]}
         expense_trends = []
         current_date = start_date
         while current_date < end_date:
-            day_expenses = [
-                e for e in expenses if e["createdAt"].date() == current_date.date()
-            ]
+            day = current_date.strftime("%Y-%m-%d")
             expense_trends.append(
                 {
-                    "date": current_date.strftime("%Y-%m-%d"),
-                    "amount": sum(e["amount"] for e in day_expenses),
-                    "count": len(day_expenses),
+                    "date": day,
+                    "amount": round(days[day]["amount"], 2) if day in days else 0,
+                    "count": days[day]["count"] if day in days else 0,
                 }
             )
             current_date += timedelta(days=1)
@@ -0,0 +1,75 @@
+"""
+Background generation of downscaled receipt image derivatives.
+
+Decoding and resampling images is CPU bound, so it runs in a process pool
+instead of on the event loop. ``render_derivatives`` is the function executed
+in worker processes; it only deals with files and bytes so it can be pickled.
+"""
+
+import asyncio
+import io
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from app.config import logger, settings
+
+# name -> (longest edge in pixels, JPEG quality)
+DERIVATIVES = {
+    "thumbnail": (256, 70),
+    "preview": (1024, 80),
+}
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def render_derivatives(source_path: str) -> Dict[str, bytes]:
+    """Decode an image once and return JPEG bytes for every derivative size."""
+    from PIL import Image, ImageOps
+
+    largest = max(edge for edge, _ in DERIVATIVES.values())
+    with Image.open(source_path) as image:
+        # Let the JPEG decoder downscale while decoding; much cheaper than a full decode
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        rendered = {}
+        for name, (edge, quality) in DERIVATIVES.items():
+            derivative = image.copy()
+            derivative.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            derivative.save(
+                buffer, format="JPEG", quality=quality, optimize=True, progressive=True
+            )
+            rendered[name] = buffer.getvalue()
+        return rendered
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.thumbnail_workers)
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def is_thumbnailable(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.startswith("image/")
+
+
+async def render_in_pool(source_path: str) -> Dict[str, bytes]:
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(
+            get_executor(), render_derivatives, source_path
+        )
+    except Exception as e:
+        logger.warning(f"Failed to render derivatives for {source_path}: {e}")
+        return {}
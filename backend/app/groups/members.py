@@ -0,0 +1,107 @@
+"""
+Where a group keeps its members.
+
+Members normally live in the group document's ``members`` array. With
+``GROUP_MEMBERS_COLLECTION`` enabled, large groups (societies, clubs) can keep
+them in the ``group_members`` collection instead, one document per member
+under a unique ``(groupId, userId)`` index. Joins, role changes and membership
+checks then touch a single small document rather than rewriting or shipping
+the whole array. Such groups are marked ``memberStorage: "collection"`` and
+have no ``members`` array; ``migrations/m0004_group_members_to_collection.py``
+moves groups once they reach ``GROUP_MEMBERS_COLLECTION_MIN_MEMBERS``.
+
+The read helpers take the group document the caller already loaded (with at
+least ``GROUP_MEMBER_FIELDS``), so embedded groups cost no extra query.
+"""
+
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from bson import ObjectId
+
+STORAGE_FIELD = "memberStorage"
+COLLECTION_STORAGE = "collection"
+GROUP_MEMBER_FIELDS = {"members": 1, STORAGE_FIELD: 1}
+
+
+def uses_collection(group: Dict[str, Any]) -> bool:
+    return group.get(STORAGE_FIELD) == COLLECTION_STORAGE
+
+
+def _member(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "userId": doc["userId"],
+        "role": doc.get("role", "member"),
+        "joinedAt": doc.get("joinedAt"),
+    }
+
+
+async def find_member(db, group: Dict[str, Any], user_id: str) -> Optional[dict]:
+    """The user's member entry in the group, or None."""
+    if uses_collection(group):
+        doc = await db.group_members.find_one(
+            {"groupId": str(group["_id"]), "userId": user_id}
+        )
+        return _member(doc) if doc else None
+    return next(
+        (m for m in group.get("members", []) if m.get("userId") == user_id), None
+    )
+
+
+async def count_admins(db, group: Dict[str, Any]) -> int:
+    if uses_collection(group):
+        return await db.group_members.count_documents(
+            {"groupId": str(group["_id"]), "role": "admin"}
+        )
+    return sum(1 for m in group.get("members", []) if m.get("role") == "admin")
+
+
+async def list_members(
+    db, group: Dict[str, Any], skip: int = 0, limit: Optional[int] = None
+) -> List[dict]:
+    """Members in join order, optionally one page of them."""
+    if uses_collection(group):
+        cursor = (
+            db.group_members.find({"groupId": str(group["_id"])})
+            .sort([("joinedAt", 1), ("_id", 1)])
+            .skip(skip)
+        )
+        if limit:
+            cursor = cursor.limit(limit)
+        return [_member(doc) for doc in await cursor.to_list(None)]
+    members = group.get("members", [])
+    return members[skip : skip + limit if limit else None]
+
+
+async def member_roles(db, group: Dict[str, Any]) -> Dict[str, str]:
+    """{userId: role} of every member of the group."""
+    if uses_collection(group):
+        members = await db.group_members.find(
+            {"groupId": str(group["_id"])}, {"userId": 1, "role": 1}
+        ).to_list(None)
+    else:
+        members = group.get("members", [])
+    return {m["userId"]: m.get("role", "member") for m in members}
+
+
+async def collection_group_roles(db, user_id: str) -> Dict[str, str]:
+    """{groupId: role} of the user's groups that keep members in the collection."""
+    if not settings.group_members_collection:
+        return {}
+    docs = await db.group_members.find(
+        {"userId": user_id}, {"groupId": 1, "role": 1}
+    ).to_list(None)
+    return {doc["groupId"]: doc.get("role", "member") for doc in docs}
+
+
+async def user_groups_filter(db, user_id: str) -> Dict[str, Any]:
+    """Query matching every group the user is a member of, wherever it keeps members."""
+    group_ids = await collection_group_roles(db, user_id)
+    if not group_ids:
+        return {"members.userId": user_id}
+    return {
+        "$or": [
+            {"members.userId": user_id},
+            {"_id": {"$in": [ObjectId(gid) for gid in group_ids]}},
+        ]
+    }
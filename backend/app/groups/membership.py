@@ -0,0 +1,201 @@
+"""
+Cached group membership for authorization checks.
+
+Nearly every group scoped request first asks "is this user a member of this
+group, and with which role?". The answer is cached per group for a short TTL
+(``MEMBERSHIP_CACHE_TTL_SECONDS``), so those checks cost one projected read per
+group and TTL instead of one full group document read per request. Membership
+writes invalidate the group's entry in this worker; other workers see the
+change once their entry expires.
+
+Access tokens may also carry the user's memberships (see
+``app.auth.group_claims``). While the token's membership epoch is the user's
+current one, checks are answered from the token without touching the cache.
+"""
+
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from app.auth.group_claims import build_group_claim, claim_role, current_group_claim
+from app.config import settings
+from app.groups.members import (
+    STORAGE_FIELD,
+    collection_group_roles,
+    member_roles,
+    uses_collection,
+)
+from bson import ObjectId
+
+MEMBER_PROJECTION = {"members.userId": 1, "members.role": 1, STORAGE_FIELD: 1}
+
+
+class MembershipCache:
+    """
+    group_id -> {userId: role}, each entry valid for ``ttl_seconds``.
+
+    Entries of groups keeping members in the ``group_members`` collection are
+    partial: they only hold the users looked up so far, non-members included.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        max_groups: int = 10000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_groups = max_groups
+        self.clock = clock
+        # group_id -> (expires, roles, complete)
+        self._entries: Dict[str, tuple] = {}
+        # Bumped by every invalidation so a load that raced with a membership
+        # write does not store what it read before the write
+        self._epoch = 0
+
+    def _fresh(self, group_id: str) -> Optional[tuple]:
+        entry = self._entries.get(group_id)
+        return entry if entry and entry[0] > self.clock() else None
+
+    def _store(self, group_id: str, roles: dict, complete: bool, epoch: int) -> None:
+        if epoch != self._epoch or self.ttl_seconds <= 0:
+            return
+        entry = self._fresh(group_id)
+        expires = entry[0] if entry else self.clock() + self.ttl_seconds
+        if not entry and len(self._entries) >= self.max_groups:
+            # Entries are kept in insertion order; drop the oldest
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[group_id] = (expires, roles, complete)
+
+    async def _load_group(self, db, group_id: str) -> Optional[dict]:
+        if not ObjectId.is_valid(group_id):
+            return None
+        return await db.groups.find_one({"_id": ObjectId(group_id)}, MEMBER_PROJECTION)
+
+    async def roles(self, db, group_id: str) -> Optional[Dict[str, str]]:
+        """Member roles of a group, or None if the group does not exist."""
+        entry = self._fresh(group_id)
+        if entry and entry[2]:
+            return entry[1]
+
+        epoch = self._epoch
+        group = await self._load_group(db, group_id)
+        if not group:
+            return None
+        roles = await member_roles(db, group)
+        self._store(group_id, roles, True, epoch)
+        return roles
+
+    async def role_of(self, db, group_id: str, user_id: str) -> Optional[str]:
+        """The user's role in the group, or None if they are not a member."""
+        token = current_group_claim.get()
+        if token and token[0] == user_id:
+            epoch = await membership_epochs.current(db.users, user_id)
+            if token[1].get("e") == epoch:
+                # A current claim lists every group of the user
+                return claim_role(token[1], group_id)
+
+        entry = self._fresh(group_id)
+        if entry and (entry[2] or user_id in entry[1]):
+            return entry[1].get(user_id)
+
+        epoch = self._epoch
+        if not entry:
+            group = await self._load_group(db, group_id)
+            if not group:
+                return None
+            if not uses_collection(group):
+                roles = await member_roles(db, group)
+                self._store(group_id, roles, True, epoch)
+                return roles.get(user_id)
+
+        member = await db.group_members.find_one(
+            {"groupId": group_id, "userId": user_id}, {"role": 1}
+        )
+        role = member.get("role", "member") if member else None
+        known = entry[1] if entry else {}
+        self._store(group_id, {**known, user_id: role}, False, epoch)
+        return role
+
+    def invalidate(self, group_id: str) -> None:
+        self._epoch += 1
+        self._entries.pop(group_id, None)
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._entries.clear()
+
+
+class MembershipEpochs:
+    """
+    user_id -> membership epoch, cached like group memberships.
+
+    The epoch is bumped by every change to the user's memberships, which
+    retires access token claims issued before it.
+    """
+
+    def __init__(self, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries: Dict[str, tuple] = {}
+
+    async def current(self, users, user_id: str) -> int:
+        entry = self._entries.get(user_id)
+        if entry and entry[0] > self.clock():
+            return entry[1]
+        user = None
+        if ObjectId.is_valid(user_id):
+            user = await users.find_one(
+                {"_id": ObjectId(user_id)}, {"membershipEpoch": 1}
+            )
+        epoch = (user or {}).get("membershipEpoch", 0)
+        self._entries[user_id] = (self.clock() + self.ttl_seconds, epoch)
+        return epoch
+
+    def invalidate(self, user_ids: Iterable[str]) -> None:
+        for user_id in user_ids:
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+membership_cache = MembershipCache(settings.membership_cache_ttl_seconds)
+membership_epochs = MembershipEpochs(settings.membership_cache_ttl_seconds)
+
+
+async def bump_membership_epochs(db, user_ids: Iterable[str]) -> None:
+    """Retire the token claims of users whose memberships just changed."""
+    user_ids = list(user_ids)
+    object_ids = [ObjectId(uid) for uid in user_ids if ObjectId.is_valid(uid)]
+    if object_ids:
+        await db.users.update_many(
+            {"_id": {"$in": object_ids}}, {"$inc": {"membershipEpoch": 1}}
+        )
+    membership_epochs.invalidate(user_ids)
+
+
+async def membership_claim(db, user_id: str) -> Optional[Dict[str, Any]]:
+    """Token claim listing the user's groups, or None if there are too many."""
+    # Read the epoch first: a membership change racing with the group query
+    # then leaves the claim on an old epoch instead of a wrong current one
+    user = None
+    if ObjectId.is_valid(user_id):
+        user = await db.users.find_one(
+            {"_id": ObjectId(user_id)}, {"membershipEpoch": 1}
+        )
+    epoch = (user or {}).get("membershipEpoch", 0)
+
+    groups = await db.groups.find(
+        {"members.userId": user_id},
+        {"members": {"$elemMatch": {"userId": user_id}}},
+    ).to_list(settings.token_group_claim_max_groups + 1)
+    if len(groups) > settings.token_group_claim_max_groups:
+        return None
+    roles = {
+        str(group["_id"]): (group.get("members") or [{}])[0].get("role", "member")
+        for group in groups
+    }
+    roles.update(await collection_group_roles(db, user_id))
+    if len(roles) > settings.token_group_claim_max_groups:
+        return None
+    return build_group_claim(roles, epoch)
@@ -1,12 +1,16 @@
-from typing import Any, Dict, List
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
 
 from app.auth.security import get_current_user
+from app.config import settings
+from app.events import event_hub, format_sse, group_channel
 from app.groups.schemas import (
     DeleteGroupResponse,
     GroupCreateRequest,
     GroupListResponse,
     GroupMemberWithDetails,
     GroupResponse,
+    GroupSummaryListResponse,
     GroupUpdateRequest,
     JoinGroupRequest,
     JoinGroupResponse,
@@ -15,7 +19,17 @@ from app.groups.schemas import (
     RemoveMemberResponse,
 )
 from app.groups.service import group_service
-from fastapi import APIRouter, Depends, HTTPException, status
+from app.http_cache import check_group_etag
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
 
 router = APIRouter(prefix="/groups", tags=["Groups"])
 
@@ -34,18 +48,39 @@ async def create_group(
     return group
 
 
-@router.get("", response_model=GroupListResponse)
-async def list_user_groups(current_user: Dict[str, Any] = Depends(get_current_user)):
+@router.get("", response_model=Union[GroupListResponse, GroupSummaryListResponse])
+async def list_user_groups(
+    view: Optional[str] = Query(
+        None,
+        pattern="^summary$",
+        description="summary: paginated list without members, with member count and your balance",
+    ),
+    page: int = Query(1, ge=1),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
     """List all groups the current user belongs to"""
+    if view == "summary":
+        return await group_service.get_user_group_summaries(
+            current_user["_id"], page=page, limit=limit
+        )
     groups = await group_service.get_user_groups(current_user["_id"])
     return {"groups": groups}
 
 
 @router.get("/{group_id}", response_model=GroupResponse)
 async def get_group_details(
-    group_id: str, current_user: Dict[str, Any] = Depends(get_current_user)
+    group_id: str,
+    request: Request,
+    response: Response,
+    current_user: Dict[str, Any] = Depends(get_current_user),
 ):
     """Get group details including members"""
+    not_modified = await check_group_etag(
+        request, response, group_id, current_user["_id"]
+    )
+    if not_modified:
+        return not_modified
     group = await group_service.get_group_by_id(group_id, current_user["_id"])
     if not group:
         raise HTTPException(status_code=404, detail="Group not found or access denied")
@@ -109,10 +144,22 @@ async def leave_group(
 
 @router.get("/{group_id}/members", response_model=List[GroupMemberWithDetails])
 async def get_group_members(
-    group_id: str, current_user: Dict[str, Any] = Depends(get_current_user)
+    group_id: str,
+    request: Request,
+    response: Response,
+    page: int = Query(1, ge=1),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    current_user: Dict[str, Any] = Depends(get_current_user),
 ):
-    """Get list of group members with detailed user information"""
-    members = await group_service.get_group_members(group_id, current_user["_id"])
+    """Get group members with detailed user information; pass limit to page through large groups"""
+    not_modified = await check_group_etag(
+        request, response, group_id, current_user["_id"]
+    )
+    if not_modified:
+        return not_modified
+    members = await group_service.get_group_members(
+        group_id, current_user["_id"], page=page, limit=limit
+    )
     return members
 
 
@@ -145,3 +192,57 @@ async def remove_group_member(
     if not removed:
         raise HTTPException(status_code=400, detail="Failed to remove member")
     return RemoveMemberResponse(success=True, message="Member removed successfully")
+
+
+# Events that end a subscriber's stream: the group is gone or they left it
+_MEMBERSHIP_EXIT_EVENTS = {"member.left", "member.removed"}
+
+
+async def _group_event_stream(
+    group_id: str, user_id: str, request: Request, queue: asyncio.Queue
+) -> AsyncIterator[str]:
+    yield "retry: 3000\n\n"
+    yield format_sse({"type": "ready", "groupId": group_id})
+    event_id = 0
+    while not await request.is_disconnected():
+        try:
+            event = await asyncio.wait_for(
+                queue.get(), timeout=settings.sse_heartbeat_seconds
+            )
+        except asyncio.TimeoutError:
+            # Comment line keeps proxies from closing an idle connection
+            yield ": keep-alive\n\n"
+            continue
+
+        event_id += 1
+        yield format_sse(event, event_id)
+        if event["type"] == "group.deleted" or (
+            event["type"] in _MEMBERSHIP_EXIT_EVENTS and event.get("userId") == user_id
+        ):
+            break
+
+
+@router.get("/{group_id}/events")
+async def stream_group_events(
+    group_id: str,
+    request: Request,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Server-sent events stream of changes to a group's expenses, settlements and members"""
+    if not await group_service.is_member(group_id, current_user["_id"]):
+        raise HTTPException(
+            status_code=404, detail="Group not found or you are not a member"
+        )
+
+    async def stream():
+        async with event_hub.subscribe(group_channel(group_id)) as queue:
+            async for chunk in _group_event_stream(
+                group_id, current_user["_id"], request, queue
+            ):
+                yield chunk
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
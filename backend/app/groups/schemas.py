@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, ConfigDict, Field
 
@@ -45,6 +45,23 @@ class GroupListResponse(BaseModel):
     groups: List[GroupResponse]
 
 
+class GroupSummary(BaseModel):
+    id: str = Field(alias="_id")
+    name: str
+    currency: str
+    imageUrl: Optional[str] = None
+    memberCount: int = 0
+    balance: float = 0.0  # pending balance of the current user, positive when owed
+    lastActivityAt: Optional[datetime] = None
+
+    model_config = ConfigDict(populate_by_name=True)
+
+
+class GroupSummaryListResponse(BaseModel):
+    groups: List[GroupSummary]
+    pagination: Dict[str, Any]
+
+
 class JoinGroupRequest(BaseModel):
     joinCode: str = Field(..., min_length=1)
 
@@ -1,12 +1,31 @@
+import asyncio
 import secrets
 import string
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional
 
-from app.config import logger
+from app.config import logger, settings
 from app.database import get_database
+from app.events import publish_group_event
+from app.groups.members import (
+    GROUP_MEMBER_FIELDS,
+    STORAGE_FIELD,
+    count_admins,
+    find_member,
+    list_members,
+    member_roles,
+    user_groups_filter,
+    uses_collection,
+)
+from app.groups.membership import bump_membership_epochs, membership_cache
+from app.sync import record_tombstones
 from bson import ObjectId, errors
 from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+
+# Bumped by every write that changes what group scoped reads return; see
+# app.http_cache for the ETags derived from it
+CHANGE_VERSION_INC = {"changeVersion": 1}
 
 
 class GroupService:
@@ -147,16 +166,21 @@ class GroupService:
             "createdBy": user_id,
             "createdAt": now,
             "members": [{"userId": user_id, "role": "admin", "joinedAt": now}],
+            "memberCount": 1,
+            "membersUpdatedAt": now,
+            # Net pending balance per member, kept by expense and settlement writes
+            "balances": {},
         }
 
         result = await db.groups.insert_one(group_doc)
+        await bump_membership_epochs(db, [user_id])
         created_group = await db.groups.find_one({"_id": result.inserted_id})
         return self.transform_group_document(created_group)
 
     async def get_user_groups(self, user_id: str) -> List[dict]:
         """Get all groups where user is a member"""
         db = self.get_db()
-        cursor = db.groups.find({"members.userId": user_id})
+        cursor = db.groups.find(await user_groups_filter(db, user_id))
         groups = []
         async for group in cursor:
             transformed = self.transform_group_document(group)
@@ -164,6 +188,102 @@ class GroupService:
                 groups.append(transformed)
         return groups
 
+    async def get_user_group_summaries(
+        self, user_id: str, page: int = 1, limit: int = 20
+    ) -> Dict[str, Any]:
+        """
+        One page of the user's groups without member lists: member count plus
+        the user's pending balance and the group's last activity, both kept
+        up to date on the group document by expense and settlement writes.
+        """
+        db = self.get_db()
+        query = await user_groups_filter(db, user_id)
+        projection = {
+            "name": 1,
+            "currency": 1,
+            "imageUrl": 1,
+            "createdAt": 1,
+            "memberCount": 1,
+            "lastActivityAt": 1,
+            f"balances.{user_id}": 1,
+        }
+        total, docs = await asyncio.gather(
+            db.groups.count_documents(query),
+            db.groups.find(query, projection)
+            .sort("_id", -1)
+            .skip((page - 1) * limit)
+            .limit(limit)
+            .to_list(limit),
+        )
+        # Groups created before balances were stored have none until
+        # migration 0007 backfills them; aggregate those few directly
+        balances = await self._pending_balances_of(
+            db, user_id, [str(doc["_id"]) for doc in docs if "balances" not in doc]
+        )
+        groups = [
+            {
+                "_id": str(doc["_id"]),
+                "name": doc.get("name"),
+                "currency": doc.get("currency", "USD"),
+                "imageUrl": doc.get("imageUrl"),
+                "memberCount": doc.get("memberCount", 0),
+                "balance": (
+                    # A sum of increments, so rounded like the aggregated ones
+                    round(doc["balances"].get(user_id, 0.0), 2)
+                    if "balances" in doc
+                    else balances.get(str(doc["_id"]), 0.0)
+                ),
+                "lastActivityAt": doc.get("lastActivityAt") or doc.get("createdAt"),
+            }
+            for doc in docs
+        ]
+        return {
+            "groups": groups,
+            "pagination": {
+                "page": page,
+                "limit": limit,
+                "total": total,
+                "totalPages": (total + limit - 1) // limit,
+                "hasNext": page * limit < total,
+                "hasPrev": page > 1,
+            },
+        }
+
+    async def _pending_balances_of(
+        self, db, user_id: str, group_ids: List[str]
+    ) -> Dict[str, float]:
+        """{groupId: pending balance of the user} for the given groups"""
+        if not group_ids:
+            return {}
+        pipeline = [
+            {
+                "$match": {
+                    "groupId": {"$in": group_ids},
+                    "status": "pending",
+                    "$or": [{"payerId": user_id}, {"payeeId": user_id}],
+                }
+            },
+            {
+                "$group": {
+                    "_id": "$groupId",
+                    "totalPaid": {
+                        "$sum": {
+                            "$cond": [{"$eq": ["$payerId", user_id]}, "$amount", 0]
+                        }
+                    },
+                    "totalOwed": {
+                        "$sum": {
+                            "$cond": [{"$eq": ["$payeeId", user_id]}, "$amount", 0]
+                        }
+                    },
+                }
+            },
+        ]
+        rows = await db.settlements.aggregate(pipeline).to_list(None)
+        return {
+            row["_id"]: round(row["totalPaid"] - row["totalOwed"], 2) for row in rows
+        }
+
     async def get_group_by_id(self, group_id: str, user_id: str) -> Optional[dict]:
         """Get group details by ID with enriched member information, only if user is a member"""
         db = self.get_db()
@@ -176,9 +296,8 @@ class GroupService:
             logger.error(f"Unexpected error converting group_id to ObjectId: {e}")
             return None
 
-        group = await db.groups.find_one({"_id": obj_id, "members.userId": user_id})
-
-        if not group:
+        group = await db.groups.find_one({"_id": obj_id})
+        if not group or not await find_member(db, group, user_id):
             return None
 
         # Transform the basic group document
@@ -193,6 +312,30 @@ class GroupService:
 
         return transformed_group
 
+    async def is_member(self, group_id: str, user_id: str) -> bool:
+        """Check membership without loading the group document"""
+        role = await membership_cache.role_of(self.get_db(), group_id, user_id)
+        return role is not None
+
+    async def get_change_version(self, group_id: str, user_id: str) -> Optional[int]:
+        """Return the group's change counter, or None if the user cannot see the group"""
+        db = self.get_db()
+        try:
+            obj_id = ObjectId(group_id)
+        except errors.InvalidId:
+            return None
+        group = await db.groups.find_one(
+            {"_id": obj_id},
+            {
+                "changeVersion": 1,
+                STORAGE_FIELD: 1,
+                "members": {"$elemMatch": {"userId": user_id}},
+            },
+        )
+        if not group or not await find_member(db, group, user_id):
+            return None
+        return group.get("changeVersion", 0)
+
     async def update_group(
         self, group_id: str, updates: dict, user_id: str
     ) -> Optional[dict]:
@@ -207,21 +350,24 @@ class GroupService:
             logger.error(f"Unexpected error converting group_id to ObjectId: {e}")
             return None
 
-        # Check if user is admin
+        # Check if user is admin, from the database rather than the membership
+        # cache or token claims, which may lag behind a demotion
         group = await db.groups.find_one(
-            {
-                "_id": obj_id,
-                "members": {"$elemMatch": {"userId": user_id, "role": "admin"}},
-            }
+            {"_id": obj_id},
+            {STORAGE_FIELD: 1, "members": {"$elemMatch": {"userId": user_id}}},
         )
-        if not group:
+        acting_member = await find_member(db, group, user_id) if group else None
+        if not acting_member or acting_member.get("role") != "admin":
             raise HTTPException(
                 status_code=403, detail="Only group admins can update group details"
             )
 
         result = await db.groups.find_one_and_update(
-            {"_id": obj_id}, {"$set": updates}, return_document=True
+            {"_id": obj_id},
+            {"$set": updates, "$inc": CHANGE_VERSION_INC},
+            return_document=True,
         )
+        await publish_group_event(group_id, "group.updated")
         return self.transform_group_document(result)
 
     async def delete_group(self, group_id: str, user_id: str) -> bool:
@@ -236,19 +382,23 @@ class GroupService:
             logger.error(f"Unexpected error converting group_id to ObjectId: {e}")
             return False
 
-        # Check if user is admin
-        group = await db.groups.find_one(
-            {
-                "_id": obj_id,
-                "members": {"$elemMatch": {"userId": user_id, "role": "admin"}},
-            }
-        )
-        if not group:
+        # Check if user is admin, from the database as in update_group
+        group = await db.groups.find_one({"_id": obj_id}, GROUP_MEMBER_FIELDS)
+        acting_member = await find_member(db, group, user_id) if group else None
+        if not acting_member or acting_member.get("role") != "admin":
             raise HTTPException(
                 status_code=403, detail="Only group admins can delete groups"
             )
+        # Every member's token claims lose the group
+        member_ids = list(await member_roles(db, group))
 
         result = await db.groups.delete_one({"_id": obj_id})
+        membership_cache.invalidate(group_id)
+        if result.deleted_count == 1:
+            if settings.group_members_collection:
+                await db.group_members.delete_many({"groupId": group_id})
+            await bump_membership_epochs(db, member_ids)
+            await publish_group_event(group_id, "group.deleted")
         return result.deleted_count == 1
 
     async def join_group_by_code(self, join_code: str, user_id: str) -> Optional[dict]:
@@ -256,31 +406,51 @@ class GroupService:
         db = self.get_db()
 
         # Find group by join code
-        group = await db.groups.find_one({"joinCode": join_code.upper()})
+        group = await db.groups.find_one(
+            {"joinCode": join_code.upper()},
+            {STORAGE_FIELD: 1, "members": {"$elemMatch": {"userId": user_id}}},
+        )
         if not group:
             raise HTTPException(status_code=404, detail="Invalid join code")
 
         # Check if user is already a member
-        existing_member = next(
-            (m for m in group.get("members", []) if m["userId"] == user_id), None
+        already_member = HTTPException(
+            status_code=400, detail="You are already a member of this group"
         )
-        if existing_member:
-            raise HTTPException(
-                status_code=400, detail="You are already a member of this group"
-            )
+        if await find_member(db, group, user_id):
+            raise already_member
 
         # Add user as member
-        new_member = {
-            "userId": user_id,
-            "role": "member",
-            "joinedAt": datetime.now(timezone.utc),
+        now = datetime.now(timezone.utc)
+        new_member = {"userId": user_id, "role": "member", "joinedAt": now}
+        touch = {
+            "$set": {"membersUpdatedAt": now},
+            "$inc": {**CHANGE_VERSION_INC, "memberCount": 1},
         }
 
-        result = await db.groups.find_one_and_update(
-            {"_id": group["_id"]},
-            {"$push": {"members": new_member}},
-            return_document=True,
-        )
+        if uses_collection(group):
+            try:
+                await db.group_members.insert_one(
+                    {"groupId": str(group["_id"]), **new_member}
+                )
+            except DuplicateKeyError:
+                raise already_member
+            result = await db.groups.find_one_and_update(
+                {"_id": group["_id"]}, touch, return_document=True
+            )
+        else:
+            # Guarded on the user being absent, so a racing join neither adds
+            # them twice nor counts them twice
+            result = await db.groups.find_one_and_update(
+                {"_id": group["_id"], "members.userId": {"$ne": user_id}},
+                {"$push": {"members": new_member}, **touch},
+                return_document=True,
+            )
+            if result is None:
+                raise already_member
+        membership_cache.invalidate(str(group["_id"]))
+        await bump_membership_epochs(db, [user_id])
+        await publish_group_event(str(group["_id"]), "member.joined", userId=user_id)
         return self.transform_group_document(result)
 
     async def leave_group(self, group_id: str, user_id: str) -> bool:
@@ -292,21 +462,16 @@ class GroupService:
             return False
 
         # Check if user is a member
-        group = await db.groups.find_one({"_id": obj_id, "members.userId": user_id})
-        if not group:
+        group = await db.groups.find_one({"_id": obj_id}, GROUP_MEMBER_FIELDS)
+        user_member = await find_member(db, group, user_id) if group else None
+        if not user_member:
             raise HTTPException(
                 status_code=404, detail="Group not found or you are not a member"
             )
 
         # Check if user is the last admin
-        user_member = next(
-            (m for m in group.get("members", []) if m["userId"] == user_id), None
-        )
-        if user_member and user_member["role"] == "admin":
-            admin_count = sum(
-                1 for m in group.get("members", []) if m["role"] == "admin"
-            )
-            if admin_count <= 1:
+        if user_member.get("role") == "admin":
+            if await count_admins(db, group) <= 1:
                 raise HTTPException(
                     status_code=400,
                     detail="Cannot leave group when you are the only admin. Delete the group or promote another member to admin first.",
@@ -336,24 +501,30 @@ class GroupService:
                 detail="Cannot leave group with unsettled balances. Please settle up first.",
             )
 
-        result = await db.groups.update_one(
-            {"_id": obj_id}, {"$pull": {"members": {"userId": user_id}}}
-        )
-        return result.modified_count == 1
+        left = await self._pull_member(db, group, user_id)
+        membership_cache.invalidate(group_id)
+        if left:
+            await bump_membership_epochs(db, [user_id])
+            await record_tombstones(db, group_id, "member", [user_id])
+            await publish_group_event(group_id, "member.left", userId=user_id)
+        return left
 
-    async def get_group_members(self, group_id: str, user_id: str) -> List[dict]:
-        """Get list of group members with detailed user information"""
+    async def get_group_members(
+        self, group_id: str, user_id: str, page: int = 1, limit: Optional[int] = None
+    ) -> List[dict]:
+        """Get group members with detailed user information, optionally one page"""
         db = self.get_db()
         try:
             obj_id = ObjectId(group_id)
         except Exception:
             return []
 
-        group = await db.groups.find_one({"_id": obj_id, "members.userId": user_id})
-        if not group:
+        group = await db.groups.find_one({"_id": obj_id}, GROUP_MEMBER_FIELDS)
+        if not group or not await find_member(db, group, user_id):
             return []
 
-        members = group.get("members", [])
+        skip = (page - 1) * limit if limit else 0
+        members = await list_members(db, group, skip, limit)
 
         # Fetch user details for each member
         enriched_members = await self._enrich_members_with_user_details(members)
@@ -371,39 +542,51 @@ class GroupService:
             return False
 
         # Check if user is admin
-        group = await db.groups.find_one(
-            {
-                "_id": obj_id,
-                "members": {"$elemMatch": {"userId": user_id, "role": "admin"}},
-            }
-        )
-        if not group:
+        group = await db.groups.find_one({"_id": obj_id}, GROUP_MEMBER_FIELDS)
+        acting_member = await find_member(db, group, user_id) if group else None
+        if not acting_member or acting_member.get("role") != "admin":
             raise HTTPException(
                 status_code=403, detail="Only group admins can update member roles"
             )
 
         # Check if target member exists
-        target_member = next(
-            (m for m in group.get("members", []) if m["userId"] == member_id), None
-        )
+        target_member = await find_member(db, group, member_id)
         if not target_member:
             raise HTTPException(status_code=404, detail="Member not found in group")
 
         # Prevent admins from demoting themselves if they are the only admin
         if member_id == user_id and new_role != "admin":
-            admin_count = sum(
-                1 for m in group.get("members", []) if m["role"] == "admin"
-            )
-            if admin_count <= 1:
+            if await count_admins(db, group) <= 1:
                 raise HTTPException(
                     status_code=400,
                     detail="Cannot demote yourself when you are the only admin. Promote another member to admin first.",
                 )
 
-        result = await db.groups.update_one(
-            {"_id": obj_id, "members.userId": member_id},
-            {"$set": {"members.$.role": new_role}},
-        )
+        now = datetime.now(timezone.utc)
+        if uses_collection(group):
+            result = await db.group_members.update_one(
+                {"groupId": group_id, "userId": member_id},
+                {"$set": {"role": new_role}},
+            )
+            if result.modified_count == 1:
+                await db.groups.update_one(
+                    {"_id": obj_id},
+                    {"$set": {"membersUpdatedAt": now}, "$inc": CHANGE_VERSION_INC},
+                )
+        else:
+            result = await db.groups.update_one(
+                {"_id": obj_id, "members.userId": member_id},
+                {
+                    "$set": {"members.$.role": new_role, "membersUpdatedAt": now},
+                    "$inc": CHANGE_VERSION_INC,
+                },
+            )
+        membership_cache.invalidate(group_id)
+        if result.modified_count == 1:
+            await bump_membership_epochs(db, [member_id])
+            await publish_group_event(
+                group_id, "member.role_changed", userId=member_id, role=new_role
+            )
         return result.modified_count == 1
 
     async def remove_member(self, group_id: str, member_id: str, user_id: str) -> bool:
@@ -415,26 +598,17 @@ class GroupService:
             return False
 
         # Check if group exists and user is admin
-        group = await db.groups.find_one(
-            {
-                "_id": obj_id,
-                "members": {"$elemMatch": {"userId": user_id, "role": "admin"}},
-            }
-        )
+        group = await db.groups.find_one({"_id": obj_id}, GROUP_MEMBER_FIELDS)
         if not group:
-            # Check if group exists at all
-            group_exists = await db.groups.find_one({"_id": obj_id})
-            if not group_exists:
-                raise HTTPException(status_code=404, detail="Group not found")
-            else:
-                raise HTTPException(
-                    status_code=403, detail="Only group admins can remove members"
-                )
+            raise HTTPException(status_code=404, detail="Group not found")
+        acting_member = await find_member(db, group, user_id)
+        if not acting_member or acting_member.get("role") != "admin":
+            raise HTTPException(
+                status_code=403, detail="Only group admins can remove members"
+            )
 
         # Check if target member exists and is not the requesting user
-        target_member = next(
-            (m for m in group.get("members", []) if m["userId"] == member_id), None
-        )
+        target_member = await find_member(db, group, member_id)
         if not target_member:
             raise HTTPException(status_code=404, detail="Member not found in group")
 
@@ -468,8 +642,34 @@ class GroupService:
                 detail="Cannot remove member with unsettled balances. Please settle up first.",
             )
 
+        removed = await self._pull_member(db, group, member_id)
+        membership_cache.invalidate(group_id)
+        if removed:
+            await bump_membership_epochs(db, [member_id])
+            await record_tombstones(db, group_id, "member", [member_id])
+            await publish_group_event(group_id, "member.removed", userId=member_id)
+        return removed
+
+    async def _pull_member(self, db, group: dict, member_id: str) -> bool:
+        """Drop a member from the group's member storage"""
+        touch = {
+            "$set": {"membersUpdatedAt": datetime.now(timezone.utc)},
+            "$inc": {**CHANGE_VERSION_INC, "memberCount": -1},
+        }
+        if uses_collection(group):
+            result = await db.group_members.delete_one(
+                {"groupId": str(group["_id"]), "userId": member_id}
+            )
+            if result.deleted_count != 1:
+                return False
+            await db.groups.update_one({"_id": group["_id"]}, touch)
+            return True
+
+        # Matching only while the member is there keeps a repeated or racing
+        # removal from touching the group and reporting success
         result = await db.groups.update_one(
-            {"_id": obj_id}, {"$pull": {"members": {"userId": member_id}}}
+            {"_id": group["_id"], "members.userId": member_id},
+            {"$pull": {"members": {"userId": member_id}}, **touch},
         )
         return result.modified_count == 1
 
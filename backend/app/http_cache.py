@@ -0,0 +1,61 @@
+"""
+Conditional GET support.
+
+Every write to a group, its members, expenses or settlements bumps the group's
+``changeVersion`` counter. Group scoped reads derive a strong ETag from that
+counter, the request URL and the caller, so a client refreshing an unchanged
+screen is answered with ``304 Not Modified`` after one projected lookup,
+before any of the expensive queries or response serialization run.
+"""
+
+import hashlib
+from typing import Optional
+
+from app.groups.service import group_service
+from fastapi import Request, Response
+
+# Clients may keep the body but must revalidate it on every use
+REVALIDATE = "private, no-cache"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header (weak comparison, as RFC 9110 requires)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def group_etag(version: int, request: Request, user_id: str) -> str:
+    """ETag of a group scoped representation at a given change version."""
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    variant = f"{user_id}|{request.url.path}?{query}"
+    digest = hashlib.sha1(variant.encode()).hexdigest()[:16]
+    return f'"g{version}-{digest}"'
+
+
+async def check_group_etag(
+    request: Request, response: Response, group_id: str, user_id: str
+) -> Optional[Response]:
+    """
+    Return a 304 response if the client's copy of a group read is current.
+
+    Otherwise the ETag is set on ``response`` and None is returned so the
+    handler builds the body. The version is read before the body, so a write
+    landing in between only makes the next request refetch. Unknown groups
+    and non-members get no ETag and fall through to the handler's own error.
+    """
+    version = await group_service.get_change_version(group_id, user_id)
+    if version is None:
+        return None
+
+    etag = group_etag(version, request, user_id)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(
+            status_code=304, headers={"etag": etag, "cache-control": REVALIDATE}
+        )
+    response.headers["etag"] = etag
+    response.headers["cache-control"] = REVALIDATE
+    return None
@@ -0,0 +1,53 @@
+"""
+Process-local counters exported at ``GET /metrics``.
+
+Counters use the Prometheus text format so any Prometheus compatible scraper
+can collect them without a client library. Each worker counts its own
+requests; scrape every worker (or sum over the ``instance`` label).
+"""
+
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+
+class Counter:
+    """A monotonically increasing count per label set."""
+
+    def __init__(self, name: str, description: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        self._values[tuple(labels[label] for label in self.labels)] += amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(labels[label] for label in self.labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} counter",
+        ]
+        for values, count in sorted(self._values.items()):
+            label_text = ",".join(
+                f'{label}="{value}"' for label, value in zip(self.labels, values)
+            )
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{self.name}{suffix} {count:g}")
+        return lines
+
+
+REGISTRY: List[Counter] = []
+
+
+def counter(name: str, description: str, labels: Tuple[str, ...] = ()) -> Counter:
+    """Create a counter and register it for export."""
+    created = Counter(name, description, labels)
+    REGISTRY.append(created)
+    return created
+
+
+def render_metrics() -> str:
+    return "\n".join(line for c in REGISTRY for line in c.render()) + "\n"
@@ -0,0 +1,271 @@
+"""
+Token-bucket rate limiting for expensive endpoints.
+
+Every (route, caller) pair has a bucket of ``rate_limit_capacity`` tokens that
+refills at ``rate_limit_refill_per_second``. A request takes its route's cost
+from the bucket, so a route with cost 10 allows a tenth of the burst and rate
+of a route with cost 1. A request finding too few tokens gets
+``429 Too Many Requests`` with a ``Retry-After`` header saying when enough
+will have refilled. Callers are keyed by user id, or by client address on
+unauthenticated routes; login routes key on the account and the client
+address. Behind a reverse proxy the client address is read from
+``X-Forwarded-For``, but only when the request comes from one of the
+``FORWARDED_ALLOW_IPS``.
+
+Buckets live in this worker by default. ``RATE_LIMIT_BACKEND=mongo`` keeps
+them in the ``rate_limits`` collection so the limit holds across workers. If
+the backend fails, requests are let through rather than rejected.
+"""
+
+import ipaddress
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.auth.security import get_current_user
+from app.config import logger, settings
+from app.database import mongodb
+from app.metrics import counter
+from fastapi import Depends, HTTPException, Request
+from pymongo import ReturnDocument
+
+# The in-memory backend evicts the least recently used bucket past this
+MAX_MEMORY_BUCKETS = 10_000
+
+throttled_requests = counter(
+    "splitwiser_rate_limited_requests_total",
+    "Requests rejected with 429 by the rate limiter",
+    ("route",),
+)
+throttled_cost = counter(
+    "splitwiser_rate_limited_cost_total",
+    "Cost of the requests rejected by the rate limiter",
+    ("route",),
+)
+
+
+class RateLimitBackend(ABC):
+    """Storage for token buckets."""
+
+    @abstractmethod
+    async def take(
+        self, key: str, cost: float, capacity: float, refill_per_second: float
+    ) -> float:
+        """
+        Take ``cost`` tokens from the bucket ``key`` if it holds enough.
+
+        Returns 0 when the tokens were taken, otherwise the seconds until the
+        bucket will hold ``cost`` tokens.
+        """
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Buckets in a dict of bounded size; limits apply per worker."""
+
+    def __init__(self, max_buckets: int = MAX_MEMORY_BUCKETS):
+        self.max_buckets = max_buckets
+        # Least recently used first
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(
+        self, key: str, cost: float, capacity: float, refill_per_second: float
+    ) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+        if tokens >= cost:
+            tokens -= cost
+            wait = 0.0
+        else:
+            wait = (cost - tokens) / refill_per_second
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.max_buckets:
+            # Idle the longest, so the most likely to have refilled anyway
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class MongoRateLimitBackend(RateLimitBackend):
+    """
+    Buckets in the ``rate_limits`` collection, shared by all workers.
+
+    Each request is one ``find_one_and_update`` with an update pipeline that
+    refills the bucket from the server clock, takes the cost if it can and
+    returns the result, so concurrent requests from several workers cannot
+    overdraw a bucket. Idle buckets expire through a TTL index on
+    ``expiresAt``.
+    """
+
+    def __init__(self, collection_name: str = "rate_limits"):
+        self.collection_name = collection_name
+
+    @property
+    def collection(self):
+        return mongodb.database[self.collection_name]
+
+    async def take(
+        self, key: str, cost: float, capacity: float, refill_per_second: float
+    ) -> float:
+        elapsed_seconds = {
+            "$divide": [
+                {"$subtract": ["$$NOW", {"$ifNull": ["$updatedAt", "$$NOW"]}]},
+                1000,
+            ]
+        }
+        refilled = {
+            "$min": [
+                capacity,
+                {
+                    "$add": [
+                        {"$ifNull": ["$tokens", capacity]},
+                        {"$multiply": [elapsed_seconds, refill_per_second]},
+                    ]
+                },
+            ]
+        }
+        full_after_ms = math.ceil(capacity / refill_per_second * 1000)
+        doc = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updatedAt": "$$NOW"}},
+                {"$set": {"allowed": {"$gte": ["$tokens", cost]}}},
+                {
+                    "$set": {
+                        "tokens": {
+                            "$cond": [
+                                "$allowed",
+                                {"$subtract": ["$tokens", cost]},
+                                "$tokens",
+                            ]
+                        },
+                        "expiresAt": {"$add": ["$$NOW", full_after_ms]},
+                    }
+                },
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc["allowed"]:
+            return 0.0
+        return (cost - doc["tokens"]) / refill_per_second
+
+
+def _create_backend() -> RateLimitBackend:
+    if settings.rate_limit_backend == "mongo":
+        return MongoRateLimitBackend()
+    return InMemoryRateLimitBackend()
+
+
+backend = _create_backend()
+
+
+async def check_rate_limit(route: str, caller: str, cost: float) -> None:
+    """Charge ``cost`` to the caller's bucket for ``route``; 429 if it is empty."""
+    if not settings.rate_limit_enabled:
+        return
+    try:
+        wait = await backend.take(
+            f"{route}:{caller}",
+            cost,
+            settings.rate_limit_capacity,
+            settings.rate_limit_refill_per_second,
+        )
+    except Exception as e:
+        logger.warning(f"Rate limit backend failed, allowing request: {e}")
+        return
+    if wait > 0:
+        throttled_requests.inc(route=route)
+        throttled_cost.inc(cost, route=route)
+        logger.info(f"Rate limited {caller} on {route}, retry in {wait:.1f}s")
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests, please retry later",
+            headers={"Retry-After": str(max(1, math.ceil(wait)))},
+        )
+
+
+def rate_limit(route: str, cost: float = 1):
+    """Dependency limiting authenticated callers of ``route``, keyed by user."""
+
+    async def dependency(
+        current_user: Dict[str, Any] = Depends(get_current_user),
+    ) -> None:
+        await check_rate_limit(route, str(current_user["_id"]), cost)
+
+    return dependency
+
+
+@lru_cache(maxsize=8)
+def _proxy_networks(allowed: str) -> Tuple[Any, ...]:
+    networks = []
+    for item in allowed.split(","):
+        item = item.strip()
+        if not item or item == "*":
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            logger.warning(f"Ignoring invalid FORWARDED_ALLOW_IPS entry: {item}")
+    return tuple(networks)
+
+
+def _is_listed_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    networks = _proxy_networks(settings.forwarded_allow_ips)
+    return any(address in network for network in networks)
+
+
+def client_address(request: Request) -> str:
+    """
+    Address of the client that sent ``request``.
+
+    When the peer is a trusted proxy, ``X-Forwarded-For`` is read from the
+    right, skipping the hops of listed proxies, so a client cannot pick its
+    address by sending the header itself. ``*`` trusts any peer, for apps
+    only reachable through their proxy, but no hop.
+    """
+    host = request.client.host if request.client else "unknown"
+    trust_any = "*" in (
+        item.strip() for item in settings.forwarded_allow_ips.split(",")
+    )
+    if not (trust_any or _is_listed_proxy(host)):
+        return host
+    hops = [
+        hop.strip()
+        for header in request.headers.getlist("x-forwarded-for")
+        for hop in header.split(",")
+        if hop.strip()
+    ]
+    for hop in reversed(hops):
+        host = hop
+        if not _is_listed_proxy(hop):
+            break
+    return host
+
+
+def rate_limit_by_client(
+    route: str,
+    cost: float = 1,
+    account: Optional[Callable[[Request], Awaitable[str]]] = None,
+):
+    """
+    Dependency limiting ``route`` by client address, for routes before login.
+
+    ``account`` reads the account a request is for, such as the email of a
+    login; each account then has its own bucket per client address.
+    """
+
+    async def dependency(request: Request) -> None:
+        caller = client_address(request)
+        if account is not None:
+            caller = f"{await account(request)}|{caller}"
+        await check_rate_limit(route, caller, cost)
+
+    return dependency
@@ -0,0 +1,41 @@
+"""
+Fast JSON responses for read-heavy endpoints.
+
+Returning a pydantic model from a route makes FastAPI dump it to a dict,
+validate that dict again against ``response_model`` and encode the result with
+the standard library. Routes that already hold validated models return
+``ORJSONModelResponse`` instead: each model is serialized exactly once by
+pydantic-core and the envelope is encoded by orjson, with no revalidation.
+The route keeps its ``response_model`` for the OpenAPI schema.
+"""
+
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from pydantic import BaseModel
+from starlette.responses import Response
+
+# Match pydantic's JSON output: UTC datetimes as "Z", non-str dict keys allowed
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        # Splice pydantic-core's own JSON in verbatim instead of building a dict
+        return orjson.Fragment(obj.__pydantic_serializer__.to_json(obj, by_alias=True))
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode dicts/lists/models the way FastAPI's response_model path would."""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class ORJSONModelResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,75 @@
+"""
+Coalescing of identical concurrent reads.
+
+When the members of a group open the app together they send the same
+expensive reads at the same moment. ``SingleFlight.do`` runs the first call
+for a key and lets every identical call arriving while it is in flight await
+the same result instead of computing it again. Keys are grouped by scope (a
+group id); writes ``forget`` the scope, so a call made after a write in this
+worker never joins a computation that started before it.
+
+Callers share the returned object and must not mutate it.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+from app.metrics import counter
+
+T = TypeVar("T")
+
+coalesced_calls = counter(
+    "splitwiser_singleflight_calls_total",
+    "Calls made through single-flight coalescing",
+    ("name",),
+)
+deduplicated_calls = counter(
+    "splitwiser_singleflight_deduplicated_total",
+    "Calls served by a computation already in flight",
+    ("name",),
+)
+
+
+class SingleFlight:
+    """At most one in-flight computation per (scope, name, args)."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Dict[Tuple[str, Hashable], asyncio.Task]] = {}
+
+    async def do(
+        self,
+        scope: Hashable,
+        name: str,
+        args: Hashable,
+        fn: Callable[[], Awaitable[T]],
+    ) -> T:
+        """Return ``await fn()``, shared with identical calls in flight."""
+        calls = self._calls.setdefault(scope, {})
+        key = (name, args)
+        task = calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            calls[key] = task
+            task.add_done_callback(lambda done: self._finished(scope, key, done))
+        else:
+            deduplicated_calls.inc(name=name)
+        coalesced_calls.inc(name=name)
+        # A caller going away must not cancel the computation for the others
+        return await asyncio.shield(task)
+
+    def forget(self, scope: Hashable) -> None:
+        """Make later calls in ``scope`` start new computations."""
+        self._calls.pop(scope, None)
+
+    def in_flight(self, scope: Hashable) -> int:
+        return len(self._calls.get(scope, ()))
+
+    def _finished(self, scope: Hashable, key: Any, task: asyncio.Task) -> None:
+        calls = self._calls.get(scope)
+        if calls is not None and calls.get(key) is task:
+            del calls[key]
+            if not calls:
+                del self._calls[scope]
+        if not task.cancelled():
+            # Mark a failure as retrieved even if every caller went away
+            task.exception()
@@ -3,6 +3,8 @@ from typing import Any, Dict, Optional
 
 from app.config import logger
 from app.database import get_database
+from app.groups.members import user_groups_filter
+from app.groups.service import CHANGE_VERSION_INC
 from bson import ObjectId, errors
 
 
@@ -78,6 +80,11 @@ class UserService:
         result = await db.users.find_one_and_update(
             {"_id": obj_id}, {"$set": updates}, return_document=True
         )
+        if result and ("name" in updates or "imageUrl" in updates):
+            # Member lists embed the profile, so cached group reads are stale
+            await db.groups.update_many(
+                await user_groups_filter(db, user_id), {"$inc": CHANGE_VERSION_INC}
+            )
         return self.transform_user_document(result)
 
     async def delete_user(self, user_id: str) -> bool:
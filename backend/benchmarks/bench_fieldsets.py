@@ -0,0 +1,155 @@
+"""
+Payload benchmark: full responses vs ``?fields=`` sparse fieldsets.
+
+Builds expense and settlement list pages for a few representative groups the
+way the list routes do, once in full and once with the fieldset a list screen
+asks for, and prints the JSON size and encode time of each.
+
+Usage (from backend/):
+    python -m benchmarks.bench_fieldsets [--items 20] [--rounds 200]
+"""
+
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from app.expenses.fields import build, field_projection, parse_fields
+from app.expenses.schemas import ExpenseResponse, Settlement
+from app.responses import dumps
+from bson import ObjectId
+
+EXPENSE_FIELDS = "description,amount,paidBy,createdAt"
+SETTLEMENT_FIELDS = "payerId,payeeId,amount,status"
+
+# name -> (members, attachments per expense); list pages never carry comments
+GROUPS = {
+    "couple": (2, 0),
+    "trip": (6, 1),
+    "club": (30, 0),
+}
+
+
+def make_expenses(count: int, members: int, attachments: int):
+    base = datetime(2024, 1, 1)
+    users = [str(ObjectId()) for _ in range(members)]
+    group_id = str(ObjectId())
+    docs = []
+    for i in range(count):
+        created = base + timedelta(hours=i)
+        amount = 40.0 + i
+        docs.append(
+            {
+                "_id": ObjectId(),
+                "groupId": group_id,
+                "createdBy": users[i % members],
+                "paidBy": users[i % members],
+                "description": f"Expense {i}",
+                "amount": amount,
+                "splits": [
+                    {"userId": u, "amount": amount / members, "type": "equal"}
+                    for u in users
+                ],
+                "splitType": "equal",
+                "tags": ["food", "trip"],
+                "receiptUrls": [],
+                "attachments": [
+                    {
+                        "key": f"{i:064x}",
+                        "filename": "receipt.jpg",
+                        "contentType": "image/jpeg",
+                        "size": 120_000,
+                        "url": f"/groups/{group_id}/expenses/x/attachments/{i}",
+                        "uploadedBy": users[0],
+                        "uploadedAt": created,
+                    }
+                    for _ in range(attachments)
+                ],
+                "createdAt": created,
+                "updatedAt": created,
+            }
+        )
+    return docs
+
+
+def make_settlements(count: int, members: int):
+    users = [str(ObjectId()) for _ in range(members)]
+    group_id = str(ObjectId())
+    created = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "expenseId": str(ObjectId()),
+            "groupId": group_id,
+            "payerId": users[i % members],
+            "payeeId": users[(i + 1) % members],
+            "payerName": "Payer Name",
+            "payeeName": "Payee Name",
+            "amount": 12.5 + i,
+            "status": "pending",
+            "description": f"Share of expense {i}",
+            "createdAt": created,
+        }
+        for i in range(count)
+    ]
+
+
+def page(model, docs, fields):
+    """Project each document like MongoDB would, then build the models."""
+    selected = parse_fields(fields, model)
+    keep = None if selected is None else set(field_projection(selected)) | {"_id"}
+    return [
+        build(
+            model,
+            selected,
+            {
+                k: (str(v) if k == "_id" else v)
+                for k, v in doc.items()
+                if keep is None or k in keep
+            },
+        )
+        for doc in docs
+    ]
+
+
+def encode_ms(items, rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        dumps({"items": items})
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def report(label, model, docs, fields, rounds):
+    full = page(model, docs, None)
+    trimmed = page(model, docs, fields)
+    full_bytes, trimmed_bytes = len(dumps(full)), len(dumps(trimmed))
+    print(
+        f"  {label:11} {full_bytes:7} -> {trimmed_bytes:6} bytes "
+        f"({1 - trimmed_bytes / full_bytes:4.0%} smaller), encode "
+        f"{encode_ms(full, rounds):.3f} -> {encode_ms(trimmed, rounds):.3f} ms"
+    )
+
+
+def main(items: int, rounds: int) -> None:
+    print(f"{items} items per page, {rounds} rounds")
+    print(f"  expenses ?fields={EXPENSE_FIELDS}")
+    print(f"  settlements ?fields={SETTLEMENT_FIELDS}")
+    for name, (members, attachments) in GROUPS.items():
+        print(f"{name}: {members} members")
+        expenses = make_expenses(items, members, attachments)
+        report("expenses", ExpenseResponse, expenses, EXPENSE_FIELDS, rounds)
+    # Settlements have the same shape whatever the group size
+    print("any group:")
+    report(
+        "settlements", Settlement, make_settlements(items, 2), SETTLEMENT_FIELDS, rounds
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    main(args.items, args.rounds)
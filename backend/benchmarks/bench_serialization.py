@@ -0,0 +1,133 @@
+"""
+Microbenchmark: default response_model path vs ORJSONModelResponse.
+
+Serializes 100-item ExpenseListResponse pages the way the expense list route
+does, once through FastAPI's response_model validation + stdlib JSON
+(``current``) and once through the fast path (``fast``), and checks both
+produce the same JSON.
+
+Usage (from backend/):
+    python -m benchmarks.bench_serialization [--items 100] [--rounds 200]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from app.expenses.schemas import ExpenseListResponse, ExpenseResponse
+from app.responses import ORJSONModelResponse
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+
+def make_docs(count: int):
+    base = datetime(2024, 1, 1)
+    members = [str(ObjectId()) for _ in range(4)]
+    group_id = str(ObjectId())
+    docs = []
+    for i in range(count):
+        created = base + timedelta(hours=i)
+        docs.append(
+            {
+                "_id": ObjectId(),
+                "groupId": group_id,
+                "createdBy": members[i % 4],
+                "paidBy": members[i % 4],
+                "description": f"Expense {i}",
+                "amount": 40.0 + i,
+                "splits": [
+                    {"userId": m, "amount": (40.0 + i) / 4, "type": "equal"}
+                    for m in members
+                ],
+                "splitType": "equal",
+                "tags": ["food", "trip"],
+                "receiptUrls": [],
+                "attachments": [],
+                "comments": [],
+                "history": [],
+                "createdAt": created,
+                "updatedAt": created,
+            }
+        )
+    return docs
+
+
+def build_page(docs):
+    """What ExpenseService.list_group_expenses returns: models built once."""
+    expenses = [ExpenseResponse(**{**doc, "_id": str(doc["_id"])}) for doc in docs]
+    return {
+        "expenses": expenses,
+        "pagination": {"page": 1, "limit": len(docs), "total": len(docs)},
+        "summary": {"totalAmount": sum(d["amount"] for d in docs)},
+    }
+
+
+async def build_only(field, docs) -> None:
+    build_page(docs)
+
+
+async def current_path(field, docs) -> bytes:
+    content = await serialize_response(field=field, response_content=build_page(docs))
+    return JSONResponse(content).body
+
+
+async def fast_path(field, docs) -> bytes:
+    return ORJSONModelResponse(build_page(docs)).body
+
+
+async def measure(fn, field, docs, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await fn(field, docs)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def median_ms(timings) -> float:
+    return statistics.median(timings) * 1000
+
+
+async def main(items: int, rounds: int) -> None:
+    field = create_model_field(
+        name="Response_list", type_=ExpenseListResponse, mode="serialization"
+    )
+    docs = make_docs(items)
+
+    current = await current_path(field, docs)
+    fast = await fast_path(field, docs)
+    assert json.loads(current) == json.loads(fast), "outputs differ"
+
+    results = {}
+    for name, fn in (
+        ("build", build_only),
+        ("current", current_path),
+        ("fast", fast_path),
+    ):
+        await measure(fn, field, docs, max(rounds // 10, 1))  # warm up
+        results[name] = await measure(fn, field, docs, rounds)
+
+    build = median_ms(results["build"])
+    print(f"{items} expenses per page, {rounds} rounds, {len(fast)} bytes")
+    print(f"  service model build (shared)  {build:7.3f} ms")
+    for name in ("current", "fast"):
+        total = median_ms(results[name])
+        print(
+            f"  {name:8} total {total:7.3f} ms, serialization {total - build:7.3f} ms"
+        )
+    current_ser = median_ms(results["current"]) - build
+    fast_ser = median_ms(results["fast"]) - build
+    print(f"  serialization speedup {current_ser / fast_ser:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.items, args.rounds))
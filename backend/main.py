@@ -1,15 +1,24 @@
+import asyncio
+import secrets
 from contextlib import asynccontextmanager
 
 from app.auth.routes import router as auth_router
+from app.batch.routes import router as batch_router
 from app.config import RequestResponseLoggingMiddleware, logger, settings
-from app.database import close_mongo_connection, connect_to_mongo
+from app.database import close_mongo_connection, connect_to_mongo, ensure_indexes
+from app.events import event_hub
+from app.expenses.planner import settlement_planner
+from app.expenses.recurring import recurring_scheduler
 from app.expenses.routes import balance_router
 from app.expenses.routes import router as expenses_router
+from app.expenses.service import expense_service
+from app.expenses.thumbnails import shutdown_executor as shutdown_thumbnail_workers
 from app.groups.routes import router as groups_router
+from app.metrics import render_metrics
 from app.user.routes import router as user_router
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import PlainTextResponse, Response
 
 
 @asynccontextmanager
@@ -18,8 +27,18 @@ async def lifespan(app: FastAPI):
     logger.info("Lifespan: Connecting to MongoDB...")
     await connect_to_mongo()
     logger.info("Lifespan: MongoDB connected.")
+    # Builds can take a while on large collections; don't hold up startup
+    index_task = asyncio.create_task(ensure_indexes())
+    await event_hub.start()
+    await settlement_planner.start(expense_service.compute_settlement_plan)
+    await recurring_scheduler.start(expense_service.materialize_due_expenses)
     yield
     # Shutdown
+    index_task.cancel()
+    await recurring_scheduler.stop()
+    await settlement_planner.stop()
+    await event_hub.stop()
+    shutdown_thumbnail_workers()
     logger.info("Lifespan: Closing MongoDB connection...")
     await close_mongo_connection()
     logger.info("Lifespan: MongoDB connection closed.")
@@ -122,12 +141,26 @@ async def health_check():
     return {"status": "healthy", "service": "Splitwiser API"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics(request: Request):
+    """Counters of this worker in the Prometheus text format."""
+    token = settings.metrics_token
+    authorization = request.headers.get("authorization", "")
+    if not token or not secrets.compare_digest(
+        authorization.encode(), f"Bearer {token}".encode()
+    ):
+        # Not found rather than unauthorized, so the endpoint is not advertised
+        raise HTTPException(status_code=404, detail="Not Found")
+    return render_metrics()
+
+
 # Include routers
 app.include_router(auth_router)
 app.include_router(user_router)
 app.include_router(groups_router)
 app.include_router(expenses_router)
 app.include_router(balance_router)
+app.include_router(batch_router)
 
 if __name__ == "__main__":
     import uvicorn
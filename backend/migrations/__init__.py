@@ -0,0 +1,27 @@
+"""
+Numbered data migrations.
+
+New migrations are added as ``m<number>_<name>.py`` modules and registered in
+``MIGRATIONS``; ``scripts/run_migrations.py`` applies the pending ones in order.
+"""
+
+from migrations.framework import Migration, MigrationRunner
+from migrations.m0001_avatar_to_imageurl import AvatarToImageUrl
+from migrations.m0002_expense_history_to_collection import ExpenseHistoryToCollection
+from migrations.m0003_settlement_updated_at import SettlementUpdatedAt
+from migrations.m0004_group_members_to_collection import GroupMembersToCollection
+from migrations.m0005_group_member_count import GroupMemberCount
+from migrations.m0006_expense_search_tokens import ExpenseSearchTokens
+from migrations.m0007_group_balances import GroupBalances
+
+MIGRATIONS = [
+    AvatarToImageUrl(),
+    ExpenseHistoryToCollection(),
+    SettlementUpdatedAt(),
+    GroupMembersToCollection(),
+    GroupMemberCount(),
+    ExpenseSearchTokens(),
+    GroupBalances(),
+]
+
+__all__ = ["MIGRATIONS", "Migration", "MigrationRunner"]
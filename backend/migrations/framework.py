@@ -0,0 +1,272 @@
+"""
+Minimal framework for resumable, batched data migrations.
+
+Each migration declares the collection it walks, a filter selecting the
+documents it cares about and a ``plan`` method turning one document into a
+list of write operations. The runner pages through matching documents in
+``_id`` order, applies the planned operations with ``bulk_write`` and stores
+a checkpoint (the last processed ``_id``) in the ``migrations`` collection
+after every batch, so an interrupted run picks up where it stopped.
+"""
+
+import logging
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STATE_COLLECTION = "migrations"
+DEFAULT_BATCH_SIZE = 500
+
+
+class Migration:
+    """
+    Base class for a numbered data migration.
+
+    Subclasses set ``id`` (``"<number>_<name>"``, e.g. ``"0001_avatar_to_imageurl"``),
+    ``description`` and ``collection`` and implement ``plan``.
+    """
+
+    id: str = ""
+    description: str = ""
+    collection: str = ""
+
+    @property
+    def number(self) -> int:
+        return int(self.id.split("_", 1)[0])
+
+    def filter(self) -> Dict[str, Any]:
+        """Query selecting the documents this migration needs to look at."""
+        return {}
+
+    def projection(self) -> Optional[Dict[str, Any]]:
+        """Fields to fetch for each document; ``None`` fetches whole documents."""
+        return None
+
+    def prefetch(self, db, docs: List[Dict[str, Any]]) -> None:
+        """
+        Read what planning a batch needs from other collections, e.g. with one
+        aggregation over the batch, before ``plan`` is called for its documents.
+        """
+
+    def plan(self, doc: Dict[str, Any], stats: Counter) -> List[Any]:
+        """
+        Return the write operations (``UpdateOne``, ``InsertOne``, ...) for a document.
+
+        Operations target ``self.collection``; return a ``(collection_name,
+        operation)`` pair to write to another collection. Those writes are
+        applied before the batch's own, and must be idempotent (e.g. upserts
+        keyed on a stable ``_id``) since a batch is retried after a crash.
+        Use ``stats`` to record migration specific counters such as
+        conflicts; they are persisted with the checkpoint.
+        """
+        raise NotImplementedError
+
+
+class MigrationRunner:
+    """
+    Runs migrations against a synchronous pymongo database.
+
+    Args:
+        db: pymongo ``Database`` the migrations operate on.
+        batch_size: Number of documents read and written per batch.
+        max_ops_per_sec: Optional write throughput ceiling. The runner sleeps
+            between batches to stay under it.
+        dry_run: When set, documents are scanned and operations planned, but
+            nothing is written and no checkpoint is stored.
+    """
+
+    def __init__(
+        self,
+        db,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_ops_per_sec: Optional[float] = None,
+        dry_run: bool = False,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if max_ops_per_sec is not None and max_ops_per_sec <= 0:
+            raise ValueError("max_ops_per_sec must be positive")
+        self.db = db
+        self.batch_size = batch_size
+        self.max_ops_per_sec = max_ops_per_sec
+        self.dry_run = dry_run
+        self._sleep = sleep
+        self._clock = clock
+
+    @property
+    def state_collection(self):
+        return self.db[STATE_COLLECTION]
+
+    def get_state(self, migration: Migration) -> Optional[Dict[str, Any]]:
+        return self.state_collection.find_one({"_id": migration.id})
+
+    def reset(self, migration: Migration) -> None:
+        """
+        Forget the migration's checkpoint and completion, e.g. after its
+        changes were rolled back, so the next run starts from the beginning.
+        """
+        self.state_collection.delete_one({"_id": migration.id})
+
+    def is_completed(self, migration: Migration) -> bool:
+        state = self.get_state(migration)
+        return bool(state and state.get("status") == "completed")
+
+    def pending(
+        self, migrations: Iterable[Migration], target: Optional[int] = None
+    ) -> List[Migration]:
+        """Migrations not yet completed, in numeric order, up to ``target`` inclusive."""
+        ordered = sorted(migrations, key=lambda m: m.number)
+        return [
+            m
+            for m in ordered
+            if (target is None or m.number <= target) and not self.is_completed(m)
+        ]
+
+    def run_pending(
+        self, migrations: Iterable[Migration], target: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Run every pending migration in order and return their statistics."""
+        return [self.run(m) for m in self.pending(migrations, target)]
+
+    def run(self, migration: Migration) -> Dict[str, Any]:
+        """
+        Run a single migration, resuming from its checkpoint if one exists.
+
+        Returns:
+            A dictionary with the number of documents scanned, operations
+            planned/applied and documents modified, plus migration specific
+            counters.
+        """
+        state = self.get_state(migration) or {}
+        if state.get("status") == "completed":
+            logger.info(f"Migration {migration.id} already completed, skipping")
+            return {"id": migration.id, "skipped": True}
+
+        collection = self.db[migration.collection]
+        last_id = state.get("lastId")
+        stats = Counter()
+        totals = {"scanned": 0, "planned": 0, "applied": 0, "modified": 0}
+
+        if last_id is not None:
+            logger.info(f"Resuming migration {migration.id} after _id {last_id}")
+        totals["matched"] = collection.count_documents(
+            self._batch_query(migration, last_id)
+        )
+        logger.info(
+            f"{'[dry-run] ' if self.dry_run else ''}Migration {migration.id}: "
+            f"{totals['matched']} documents to scan"
+        )
+
+        if not self.dry_run:
+            now = datetime.now(timezone.utc)
+            self.state_collection.update_one(
+                {"_id": migration.id},
+                {
+                    "$set": {"status": "running", "updatedAt": now},
+                    "$setOnInsert": {
+                        "description": migration.description,
+                        "startedAt": now,
+                    },
+                },
+                upsert=True,
+            )
+
+        started = self._clock()
+        while True:
+            docs = list(
+                collection.find(
+                    self._batch_query(migration, last_id), migration.projection()
+                )
+                .sort("_id", 1)
+                .limit(self.batch_size)
+            )
+            if not docs:
+                break
+
+            migration.prefetch(self.db, docs)
+            batch_stats = Counter()
+            operations = []
+            related: Dict[str, List[Any]] = {}
+            for doc in docs:
+                for op in migration.plan(doc, batch_stats) or []:
+                    if isinstance(op, tuple):
+                        related.setdefault(op[0], []).append(op[1])
+                    else:
+                        operations.append(op)
+            last_id = docs[-1]["_id"]
+
+            planned = len(operations) + sum(len(ops) for ops in related.values())
+            totals["scanned"] += len(docs)
+            totals["planned"] += planned
+            stats.update(batch_stats)
+
+            if self.dry_run:
+                continue
+
+            for name, ops in related.items():
+                self.db[name].bulk_write(ops, ordered=False)
+            modified = 0
+            if operations:
+                result = collection.bulk_write(operations, ordered=False)
+                modified = result.modified_count
+                totals["modified"] += modified
+            totals["applied"] += planned
+
+            self._checkpoint(migration, last_id, len(docs), modified, batch_stats)
+            self._throttle(started, totals["applied"])
+
+        if not self.dry_run:
+            self.state_collection.update_one(
+                {"_id": migration.id},
+                {
+                    "$set": {
+                        "status": "completed",
+                        "completedAt": datetime.now(timezone.utc),
+                    }
+                },
+            )
+
+        logger.info(
+            f"{'[dry-run] ' if self.dry_run else ''}Migration {migration.id} finished: "
+            f"scanned={totals['scanned']} planned={totals['planned']} "
+            f"modified={totals['modified']}"
+        )
+        return {"id": migration.id, "dryRun": self.dry_run, **totals, **stats}
+
+    def _batch_query(self, migration: Migration, last_id: Any) -> Dict[str, Any]:
+        query = migration.filter()
+        if last_id is None:
+            return query
+        after_checkpoint = {"_id": {"$gt": last_id}}
+        return {"$and": [query, after_checkpoint]} if query else after_checkpoint
+
+    def _checkpoint(
+        self,
+        migration: Migration,
+        last_id: Any,
+        scanned: int,
+        modified: int,
+        batch_stats: Counter,
+    ) -> None:
+        increments = {"processed": scanned, "modified": modified}
+        increments.update({f"stats.{k}": v for k, v in batch_stats.items()})
+        self.state_collection.update_one(
+            {"_id": migration.id},
+            {
+                "$set": {"lastId": last_id, "updatedAt": datetime.now(timezone.utc)},
+                "$inc": increments,
+            },
+        )
+
+    def _throttle(self, started: float, applied: int) -> None:
+        if not self.max_ops_per_sec or not applied:
+            return
+        expected_elapsed = applied / self.max_ops_per_sec
+        actual_elapsed = self._clock() - started
+        if expected_elapsed > actual_elapsed:
+            self._sleep(expected_elapsed - actual_elapsed)
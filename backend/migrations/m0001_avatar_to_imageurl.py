@@ -0,0 +1,47 @@
+"""
+Standardize user avatar fields to imageUrl.
+
+Copies ``avatar`` into ``imageUrl`` and removes the deprecated ``avatar``
+field. Users whose existing ``imageUrl`` differs from ``avatar`` are left
+untouched and counted as conflicts.
+"""
+
+import logging
+
+from migrations.framework import Migration
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+class AvatarToImageUrl(Migration):
+    id = "0001_avatar_to_imageurl"
+    description = "Copy users.avatar into users.imageUrl and drop avatar"
+    collection = "users"
+
+    def filter(self):
+        return {"avatar": {"$exists": True}}
+
+    def projection(self):
+        return {"avatar": 1, "imageUrl": 1}
+
+    def plan(self, doc, stats):
+        stats["users_with_avatar"] += 1
+
+        image_url = doc.get("imageUrl")
+        if image_url is not None:
+            if image_url != doc["avatar"]:
+                logger.warning(
+                    f"Conflict found for user {doc['_id']}: "
+                    f"avatar='{doc['avatar']}', imageUrl='{image_url}'"
+                )
+                stats["conflicts"] += 1
+                return []
+            stats["users_with_both_fields"] += 1
+
+        return [
+            UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {"imageUrl": doc["avatar"]}, "$unset": {"avatar": ""}},
+            )
+        ]
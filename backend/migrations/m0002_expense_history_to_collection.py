@@ -0,0 +1,69 @@
+"""
+Move embedded expense edit history into the ``expense_history`` collection.
+
+Each embedded entry stores a full ``beforeData`` snapshot. The state after an
+edit is the snapshot of the next edit (or the current expense for the last
+one), so consecutive snapshots are diffed into the field level ``changes`` the
+service records for new edits. Entries keep their ``_id``, which makes
+re-running a batch after an interruption safe.
+"""
+
+from migrations.framework import Migration
+from pymongo import ReplaceOne, UpdateOne
+
+
+def _diff(before, after):
+    return {
+        field: {"from": value, "to": after.get(field)}
+        for field, value in before.items()
+        if after.get(field) != value
+    }
+
+
+class ExpenseHistoryToCollection(Migration):
+    id = "0002_expense_history_to_collection"
+    description = "Move expenses.history into expense_history as field diffs"
+    collection = "expenses"
+
+    def filter(self):
+        return {"history": {"$exists": True}}
+
+    def projection(self):
+        return {
+            "groupId": 1,
+            "history": 1,
+            "description": 1,
+            "amount": 1,
+            "splits": 1,
+        }
+
+    def plan(self, doc, stats):
+        entries = doc.get("history") or []
+        expense_id = str(doc["_id"])
+        operations = []
+
+        for index, entry in enumerate(entries):
+            before = entry.get("beforeData") or {}
+            if index + 1 < len(entries):
+                after = entries[index + 1].get("beforeData") or {}
+            else:
+                after = doc
+            history_doc = {
+                "_id": entry["_id"],
+                "expenseId": expense_id,
+                "groupId": doc.get("groupId"),
+                "userId": entry.get("userId"),
+                "userName": entry.get("userName", "Unknown User"),
+                "changes": _diff(before, after),
+                "editedAt": entry.get("editedAt"),
+            }
+            operations.append(
+                (
+                    "expense_history",
+                    ReplaceOne({"_id": entry["_id"]}, history_doc, upsert=True),
+                )
+            )
+            stats["history_entries"] += 1
+
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$unset": {"history": ""}}))
+        return operations
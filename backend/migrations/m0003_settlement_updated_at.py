@@ -0,0 +1,30 @@
+"""
+Stamp settlements with ``updatedAt``.
+
+Delta sync finds changed settlements by ``updatedAt``. Settlements written
+before the field existed get their ``createdAt`` (or ``paidAt`` if they were
+paid later), so they are picked up by clients syncing from before that time.
+"""
+
+from migrations.framework import Migration
+from pymongo import UpdateOne
+
+
+class SettlementUpdatedAt(Migration):
+    id = "0003_settlement_updated_at"
+    description = "Backfill settlements.updatedAt for delta sync"
+    collection = "settlements"
+
+    def filter(self):
+        return {"updatedAt": {"$exists": False}}
+
+    def projection(self):
+        return {"createdAt": 1, "paidAt": 1}
+
+    def plan(self, doc, stats):
+        stamps = [doc.get("createdAt"), doc.get("paidAt")]
+        stamps = [stamp for stamp in stamps if stamp is not None]
+        if not stamps:
+            stats["without_timestamps"] += 1
+            return []
+        return [UpdateOne({"_id": doc["_id"]}, {"$set": {"updatedAt": max(stamps)}})]
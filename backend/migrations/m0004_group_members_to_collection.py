@@ -0,0 +1,91 @@
+"""
+Move the members of large groups into the ``group_members`` collection.
+
+Groups with at least ``GROUP_MEMBERS_COLLECTION_MIN_MEMBERS`` embedded members
+get one ``group_members`` document per member and are switched to
+``memberStorage: "collection"``, dropping the array. Enable
+``GROUP_MEMBERS_COLLECTION`` on every API worker before running it, so users'
+group lists include moved groups.
+
+Member documents are upserted on ``(groupId, userId)`` and entries of members
+gone from the array are deleted, so re-running a batch is safe. The group is
+only switched if its array still equals the copied one, so a group whose
+members changed in between keeps its array. Deleting this migration's entry
+in the ``migrations`` collection and running it again moves such groups,
+along with groups that have grown past the threshold since.
+"""
+
+import os
+from typing import Optional
+
+from migrations.framework import Migration
+from pymongo import DeleteMany, UpdateOne
+
+# Mirrors app/groups/members.py; migrations do not import the app
+STORAGE_FIELD = "memberStorage"
+COLLECTION_STORAGE = "collection"
+DEFAULT_MIN_MEMBERS = 500
+
+
+class GroupMembersToCollection(Migration):
+    id = "0004_group_members_to_collection"
+    description = "Move members of large groups into group_members"
+    collection = "groups"
+
+    def __init__(self, min_members: Optional[int] = None):
+        self.min_members = min_members
+
+    def filter(self):
+        min_members = self.min_members or int(
+            os.getenv("GROUP_MEMBERS_COLLECTION_MIN_MEMBERS", DEFAULT_MIN_MEMBERS)
+        )
+        # The array has an element at index min_members - 1
+        return {
+            f"members.{min_members - 1}": {"$exists": True},
+            STORAGE_FIELD: {"$ne": COLLECTION_STORAGE},
+        }
+
+    def projection(self):
+        return {"members": 1}
+
+    def plan(self, doc, stats):
+        group_id = str(doc["_id"])
+        members = doc.get("members") or []
+        user_ids = [member["userId"] for member in members]
+        operations = [
+            (
+                "group_members",
+                DeleteMany({"groupId": group_id, "userId": {"$nin": user_ids}}),
+            )
+        ]
+        for member in members:
+            operations.append(
+                (
+                    "group_members",
+                    UpdateOne(
+                        {"groupId": group_id, "userId": member["userId"]},
+                        {
+                            "$set": {
+                                "role": member.get("role", "member"),
+                                "joinedAt": member.get("joinedAt"),
+                            }
+                        },
+                        upsert=True,
+                    ),
+                )
+            )
+        stats["members"] += len(members)
+
+        operations.append(
+            UpdateOne(
+                {"_id": doc["_id"], "members": members},
+                {
+                    "$set": {
+                        STORAGE_FIELD: COLLECTION_STORAGE,
+                        "memberCount": len(members),
+                    },
+                    "$unset": {"members": ""},
+                },
+            )
+        )
+        return operations
@@ -0,0 +1,35 @@
+"""
+Backfill ``memberCount`` on groups that embed their members.
+
+Group lists show the member count without loading member arrays. Joins and
+removals keep the counter up to date, but groups created before it existed
+have none, or one that only counts the changes since. Groups whose array
+changes length while the batch runs are left for a re-run.
+"""
+
+from migrations.framework import Migration
+from pymongo import UpdateOne
+
+
+class GroupMemberCount(Migration):
+    id = "0005_group_member_count"
+    description = "Backfill groups.memberCount from the members array"
+    collection = "groups"
+
+    def filter(self):
+        return {"members": {"$exists": True}}
+
+    def projection(self):
+        return {"members.userId": 1, "memberCount": 1}
+
+    def plan(self, doc, stats):
+        count = len(doc.get("members") or [])
+        if doc.get("memberCount") == count:
+            return []
+        stats["corrected"] += "memberCount" in doc
+        return [
+            UpdateOne(
+                {"_id": doc["_id"], "members": {"$size": count}},
+                {"$set": {"memberCount": count}},
+            )
+        ]
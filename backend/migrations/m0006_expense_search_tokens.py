@@ -0,0 +1,52 @@
+"""
+Backfill ``searchTokens`` on expenses written before expense search existed.
+
+The tokens are built as in ``app/expenses/search.py`` (migrations do not
+import the app, so the tokenizer is repeated here and must stay in step with
+it). Expenses edited while the batch runs get their tokens from the write
+path, which the ``$exists`` guard leaves alone.
+"""
+
+import re
+import unicodedata
+
+from migrations.framework import Migration
+from pymongo import UpdateOne
+
+MIN_PREFIX = 2
+MAX_PREFIX = 15
+WORD = re.compile(r"\w+")
+
+
+def search_tokens(description, tags):
+    text = unicodedata.normalize("NFKD", " ".join([description or "", *tags]).lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    tokens = set()
+    for word in WORD.findall(text):
+        word = word[:MAX_PREFIX]
+        tokens.add("=" + word)
+        tokens.update(
+            word[:n] for n in range(min(MIN_PREFIX, len(word)), len(word) + 1)
+        )
+    return sorted(tokens)
+
+
+class ExpenseSearchTokens(Migration):
+    id = "0006_expense_search_tokens"
+    description = "Backfill expenses.searchTokens for expense search"
+    collection = "expenses"
+
+    def filter(self):
+        return {"searchTokens": {"$exists": False}}
+
+    def projection(self):
+        return {"description": 1, "tags": 1}
+
+    def plan(self, doc, stats):
+        tokens = search_tokens(doc.get("description"), doc.get("tags") or [])
+        return [
+            UpdateOne(
+                {"_id": doc["_id"], "searchTokens": {"$exists": False}},
+                {"$set": {"searchTokens": tokens}},
+            )
+        ]
@@ -0,0 +1,66 @@
+"""
+Backfill ``balances`` on groups created before they were stored.
+
+Expense and settlement writes keep a group's ``balances`` (net pending amount
+per member, positive when owed) with increments, which only start from a
+stored map. This computes it from the group's pending settlements, one
+aggregation per batch. Groups written to while the batch runs have moved
+their change version and are left for a re-run.
+"""
+
+from collections import defaultdict
+
+from migrations.framework import Migration
+from pymongo import UpdateOne
+
+
+class GroupBalances(Migration):
+    id = "0007_group_balances"
+    description = "Backfill groups.balances from pending settlements"
+    collection = "groups"
+
+    def __init__(self):
+        self._balances = {}
+
+    def filter(self):
+        return {"balances": {"$exists": False}}
+
+    def projection(self):
+        return {"changeVersion": 1}
+
+    def prefetch(self, db, docs):
+        group_ids = [str(doc["_id"]) for doc in docs]
+        self._balances = defaultdict(lambda: defaultdict(float))
+        for field, sign in (("$payerId", 1), ("$payeeId", -1)):
+            rows = db.settlements.aggregate(
+                [
+                    {"$match": {"groupId": {"$in": group_ids}, "status": "pending"}},
+                    {
+                        "$group": {
+                            "_id": {"group": "$groupId", "user": field},
+                            "amount": {"$sum": "$amount"},
+                        }
+                    },
+                ]
+            )
+            for row in rows:
+                key = row["_id"]
+                self._balances[key["group"]][key["user"]] += sign * row["amount"]
+
+    def plan(self, doc, stats):
+        balances = {
+            user_id: round(balance, 2)
+            for user_id, balance in self._balances[str(doc["_id"])].items()
+            if abs(balance) > 0.01
+        }
+        stats["withBalances"] += bool(balances)
+        return [
+            UpdateOne(
+                {
+                    "_id": doc["_id"],
+                    "balances": {"$exists": False},
+                    "changeVersion": doc.get("changeVersion"),
+                },
+                {"$set": {"balances": balances}},
+            )
+        ]
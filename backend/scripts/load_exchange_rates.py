@@ -0,0 +1,64 @@
+"""
+Import an exchange-rate file into the ``exchange_rates`` collection.
+
+The file has the shape of ``app/data/exchange_rates.json``: ``{"base": "USD",
+"rates": {"EUR": 0.92, ...}}``. Every currency in it is upserted; currencies
+missing from the file are left as they are unless ``--replace`` is given.
+Workers pick the new rates up within ``EXCHANGE_RATES_REFRESH_SECONDS``.
+
+Usage:
+    python scripts/load_exchange_rates.py                      # the shipped file
+    python scripts/load_exchange_rates.py rates.json --replace
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(SCRIPT_DIR)
+DEFAULT_FILE = os.path.join(BACKEND_DIR, "app", "data", "exchange_rates.json")
+
+load_dotenv(os.path.join(BACKEND_DIR, ".env"))
+
+MONGODB_URL = os.getenv("MONGODB_URL")
+DATABASE_NAME = os.getenv("DATABASE_NAME")
+
+
+def load_rates(path, replace=False):
+    """Upsert the file's rates; returns the number of currencies written."""
+    with open(path) as f:
+        data = json.load(f)
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"_id": code.upper()},
+            {"$set": {"rate": float(rate), "base": data["base"], "updatedAt": now}},
+            upsert=True,
+        )
+        for code, rate in data["rates"].items()
+    ]
+
+    client = MongoClient(MONGODB_URL)
+    collection = client[DATABASE_NAME].exchange_rates
+    if replace:
+        collection.delete_many(
+            {"_id": {"$nin": [code.upper() for code in data["rates"]]}}
+        )
+    collection.bulk_write(operations)
+    return len(operations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("path", nargs="?", default=DEFAULT_FILE)
+    parser.add_argument(
+        "--replace", action="store_true", help="remove currencies not in the file"
+    )
+    args = parser.parse_args()
+    count = load_rates(args.path, args.replace)
+    print(f"Loaded {count} exchange rates from {args.path}")
@@ -1,10 +1,13 @@
 """
 Migration script to standardize user avatar fields to imageUrl.
 This script:
-1. Identifies users with avatar field but no imageUrl field
-2. Copies avatar values to imageUrl field
-3. Removes the deprecated avatar field
-4. Logs migration statistics
+1. Creates a full database backup
+2. Runs migration 0001_avatar_to_imageurl (see backend/migrations), which copies
+   avatar values to imageUrl and removes the deprecated avatar field in batches
+3. Logs migration statistics
+
+Prefer scripts/run_migrations.py for new deployments; this entry point is kept
+for the rollback helper and existing runbooks.
 """
 
 import json
@@ -13,18 +16,22 @@ import os
 import sys
 from datetime import datetime
 
-from backup_db import create_backup
 from bson import ObjectId
 from dotenv import load_dotenv
-from pymongo import MongoClient, UpdateOne
+from pymongo import MongoClient
 
-# Add the script's directory to Python path
+# Add the script's and backend directories to Python path
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(SCRIPT_DIR)
 sys.path.append(SCRIPT_DIR)
+sys.path.append(BACKEND_DIR)
 
+from backup_db import create_backup  # noqa: E402
+from migrations import MigrationRunner  # noqa: E402
+from migrations.framework import DEFAULT_BATCH_SIZE  # noqa: E402
+from migrations.m0001_avatar_to_imageurl import AvatarToImageUrl  # noqa: E402
 
 # Load environment variables from the backend directory
-BACKEND_DIR = os.path.dirname(SCRIPT_DIR)
 load_dotenv(os.path.join(BACKEND_DIR, ".env"))
 
 # Get MongoDB connection details from environment
@@ -56,9 +63,10 @@ if not DATABASE_NAME:
     sys.exit(1)
 
 
-def migrate_avatar_to_imageurl():
+def migrate_avatar_to_imageurl(batch_size=DEFAULT_BATCH_SIZE, max_ops_per_sec=None):
     """
     Migrate avatar field to imageUrl in users collection.
+    Runs migration 0001 through the migration framework after taking a backup.
     Returns statistics about the migration.
     """
     try:
@@ -70,47 +78,22 @@ def migrate_avatar_to_imageurl():
         # Connect to MongoDB
         client = MongoClient(MONGODB_URL)
         db = client[DATABASE_NAME]
-        users = db.users
 
-        # Find users with avatar field
-        users_with_avatar = users.find({"avatar": {"$exists": True}})
-        users_to_update = []
+        runner = MigrationRunner(
+            db, batch_size=batch_size, max_ops_per_sec=max_ops_per_sec
+        )
+        result = runner.run(AvatarToImageUrl())
+        state = runner.get_state(AvatarToImageUrl()) or {}
+        recorded = state.get("stats", {})
+
         stats = {
-            "total_users": users.count_documents({}),
-            "users_with_avatar": 0,
-            "users_with_both_fields": 0,
-            "users_updated": 0,
-            "conflicts": 0,
+            "total_users": db.users.count_documents({}),
+            "users_with_avatar": recorded.get("users_with_avatar", 0),
+            "users_with_both_fields": recorded.get("users_with_both_fields", 0),
+            "users_updated": state.get("modified", result.get("modified", 0)),
+            "conflicts": recorded.get("conflicts", 0),
         }
-
-        for user in users_with_avatar:
-            stats["users_with_avatar"] += 1
-
-            # Check for conflicts (users with both fields)
-            if "imageUrl" in user and user["imageUrl"] is not None:
-                if user["imageUrl"] != user["avatar"]:
-                    logger.warning(
-                        f"Conflict found for user {user['_id']}: "
-                        f"avatar='{user['avatar']}', imageUrl='{user['imageUrl']}'"
-                    )
-                    stats["conflicts"] += 1
-                    continue
-                stats["users_with_both_fields"] += 1
-
-            # Prepare update
-            users_to_update.append(
-                UpdateOne(
-                    {"_id": user["_id"]},
-                    {"$set": {"imageUrl": user["avatar"]}, "$unset": {"avatar": ""}},
-                )
-            )
-
-        # Perform bulk update if there are users to update
-        if users_to_update:
-            result = users.bulk_write(users_to_update)
-            stats["users_updated"] = result.modified_count
-            logger.info(f"Successfully updated {result.modified_count} users")
-
+        logger.info(f"Successfully updated {stats['users_updated']} users")
         return stats
 
     except Exception as e:
@@ -143,6 +126,10 @@ def rollback_migration(backup_path):
         if users_backup:
             db.users.insert_many(users_backup)
 
+        # Without its checkpoint the next migrate run redoes the work instead
+        # of skipping it as completed
+        MigrationRunner(db).reset(AvatarToImageUrl())
+
         logger.info(f"Successfully rolled back to backup: {backup_path}")
         return True
 
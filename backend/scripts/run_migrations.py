@@ -0,0 +1,109 @@
+"""
+Apply pending data migrations from the ``migrations`` package.
+
+Usage:
+    python scripts/run_migrations.py                  # run everything pending
+    python scripts/run_migrations.py --dry-run        # only count what would change
+    python scripts/run_migrations.py --target 1 --batch-size 1000 --max-ops-per-sec 2000
+    python scripts/run_migrations.py --status         # show recorded progress
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+# Make the backend package root importable when run as a script
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(SCRIPT_DIR)
+sys.path.append(SCRIPT_DIR)
+sys.path.append(BACKEND_DIR)
+
+from backup_db import create_backup  # noqa: E402
+from migrations import MIGRATIONS, MigrationRunner  # noqa: E402
+from migrations.framework import DEFAULT_BATCH_SIZE  # noqa: E402
+
+load_dotenv(os.path.join(BACKEND_DIR, ".env"))
+
+MONGODB_URL = os.getenv("MONGODB_URL")
+DATABASE_NAME = os.getenv("DATABASE_NAME")
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run Splitwiser data migrations")
+    parser.add_argument(
+        "--target",
+        type=int,
+        default=None,
+        help="Only run migrations up to and including this number",
+    )
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument(
+        "--max-ops-per-sec",
+        type=float,
+        default=None,
+        help="Throttle writes to stay under this many operations per second",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Scan and count affected documents without writing anything",
+    )
+    parser.add_argument(
+        "--backup",
+        action="store_true",
+        help="Create a full database backup before running",
+    )
+    parser.add_argument(
+        "--status", action="store_true", help="Print migration state and exit"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not MONGODB_URL or not DATABASE_NAME:
+        logger.error("MONGODB_URL and DATABASE_NAME environment variables are required")
+        return 1
+
+    db = MongoClient(MONGODB_URL)[DATABASE_NAME]
+    runner = MigrationRunner(
+        db,
+        batch_size=args.batch_size,
+        max_ops_per_sec=args.max_ops_per_sec,
+        dry_run=args.dry_run,
+    )
+
+    if args.status:
+        for migration in sorted(MIGRATIONS, key=lambda m: m.number):
+            state = runner.get_state(migration) or {}
+            print(
+                f"{migration.id}: {state.get('status', 'pending')} "
+                f"(processed={state.get('processed', 0)}, lastId={state.get('lastId')})"
+            )
+        return 0
+
+    pending = runner.pending(MIGRATIONS, args.target)
+    if not pending:
+        logger.info("No pending migrations")
+        return 0
+
+    if args.backup and not args.dry_run:
+        backup_path, _ = create_backup()
+        logger.info(f"Backup created at: {backup_path}")
+
+    for stats in runner.run_pending(pending):
+        logger.info(f"{stats['id']}: {stats}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from app.auth.group_claims import (
+    CLAIM,
+    build_group_claim,
+    claim_role,
+    current_group_claim,
+)
+from app.auth.service import AuthService
+from app.groups.membership import bump_membership_epochs, membership_cache
+from bson import ObjectId
+
+USER_ID = str(ObjectId())
+
+
+def test_plain_claim_lists_groups_and_roles():
+    claim = build_group_claim({"g1": "admin", "g2": "member"}, epoch=4)
+
+    assert claim == {"e": 4, "g": {"g1": "a", "g2": "m"}}
+    assert claim_role(claim, "g1") == "admin"
+    assert claim_role(claim, "g2") == "member"
+    assert claim_role(claim, "g3") is None
+
+
+def test_many_groups_are_hash_compressed():
+    roles = {str(ObjectId()): "member" for _ in range(30)}
+    admin_of = next(iter(roles))
+    roles[admin_of] = "admin"
+
+    with patch("app.auth.group_claims.settings.token_group_claim_plain_limit", 20):
+        claim = build_group_claim(roles, epoch=1)
+
+        assert "g" not in claim
+        assert len(str(claim)) < len(str(roles)) / 2
+        assert claim_role(claim, admin_of) == "admin"
+        assert all(claim_role(claim, gid) == role for gid, role in roles.items())
+        assert claim_role(claim, str(ObjectId())) is None
+
+
+@pytest.mark.asyncio
+async def test_current_claim_authorizes_without_group_lookup(mock_db):
+    await mock_db.users.insert_one({"_id": ObjectId(USER_ID), "membershipEpoch": 2})
+    db = MagicMock(users=mock_db.users, groups=AsyncMock())
+    current_group_claim.set((USER_ID, build_group_claim({"g1": "admin"}, epoch=2)))
+
+    assert await membership_cache.role_of(db, "g1", USER_ID) == "admin"
+    assert await membership_cache.role_of(db, str(ObjectId()), USER_ID) is None
+    db.groups.find_one.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_bumped_epoch_falls_back_to_the_database(mock_db):
+    group_id = ObjectId()
+    await mock_db.users.insert_one({"_id": ObjectId(USER_ID), "membershipEpoch": 2})
+    await mock_db.groups.insert_one({"_id": group_id, "members": []})
+    current_group_claim.set(
+        (USER_ID, build_group_claim({str(group_id): "admin"}, epoch=2))
+    )
+    assert await membership_cache.role_of(mock_db, str(group_id), USER_ID)
+
+    # The user was removed from the group
+    await bump_membership_epochs(mock_db, [USER_ID])
+
+    assert await membership_cache.role_of(mock_db, str(group_id), USER_ID) is None
+
+
+@pytest.mark.asyncio
+async def test_access_token_data_embeds_claim_when_enabled(mock_db):
+    group_id = ObjectId()
+    now = datetime.now(timezone.utc)
+    await mock_db.users.insert_one({"_id": ObjectId(USER_ID), "membershipEpoch": 7})
+    await mock_db.groups.insert_one(
+        {
+            "_id": group_id,
+            "members": [
+                {"userId": "someone", "role": "admin", "joinedAt": now},
+                {"userId": USER_ID, "role": "member", "joinedAt": now},
+            ],
+        }
+    )
+    service = AuthService()
+
+    assert await service.access_token_data(USER_ID) == {"sub": USER_ID}
+    with patch("app.auth.service.settings.token_group_claims", True):
+        data = await service.access_token_data(USER_ID)
+
+    assert data[CLAIM] == {"e": 7, "g": {str(group_id): "m"}}
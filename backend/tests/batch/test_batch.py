@@ -0,0 +1,121 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from app.auth.security import create_access_token
+from app.groups.service import group_service
+from httpx import ASGITransport, AsyncClient
+from main import app
+
+USER_ID = "60c72b2f9b1e8a3f9c8b4567"
+
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        yield ac
+
+
+@pytest.fixture
+def auth_headers():
+    token = create_access_token(
+        data={"sub": USER_ID}, expires_delta=timedelta(minutes=15)
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.mark.asyncio
+async def test_batch_runs_reads_with_one_token_check(
+    async_client, auth_headers, mock_db
+):
+    group = await group_service.create_group({"name": "Flat"}, USER_ID)
+    requests = [
+        {"path": f"/groups/{group['_id']}"},
+        {"path": "/groups?view=summary&limit=5"},
+        {"path": "/groups/000000000000000000000000"},
+        {"path": f"/groups/{group['_id']}/events"},
+    ]
+
+    with patch("app.auth.security.verify_token") as per_request_check:
+        response = await async_client.post(
+            "/batch", json={"requests": requests}, headers=auth_headers
+        )
+
+    assert response.status_code == 200
+    first, summary, missing, stream = response.json()["responses"]
+    assert first["status"] == 200
+    assert first["body"]["name"] == "Flat"
+    assert "etag" in first["headers"]
+    assert summary["body"]["groups"][0]["memberCount"] == 1
+    assert missing["status"] == 404
+    assert stream["status"] == 400
+    per_request_check.assert_not_called()
+
+    revalidated = await async_client.post(
+        "/batch",
+        json={
+            "requests": [
+                {
+                    "path": requests[0]["path"],
+                    "headers": {"If-None-Match": first["headers"]["etag"]},
+                }
+            ]
+        },
+        headers=auth_headers,
+    )
+    assert revalidated.json()["responses"][0] == {
+        "status": 304,
+        "headers": {
+            "etag": first["headers"]["etag"],
+            "cache-control": "private, no-cache",
+        },
+        "body": None,
+        "bodyEncoding": None,
+    }
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_writes_and_oversized_batches(async_client, auth_headers):
+    write = await async_client.post(
+        "/batch",
+        json={"requests": [{"method": "DELETE", "path": "/groups/x"}]},
+        headers=auth_headers,
+    )
+    assert write.status_code == 422
+
+    with patch("app.batch.routes.settings.batch_max_requests", 2):
+        oversized = await async_client.post(
+            "/batch",
+            json={"requests": [{"path": "/groups"}] * 3},
+            headers=auth_headers,
+        )
+    assert oversized.status_code == 400
+
+    anonymous = await async_client.post(
+        "/batch", json={"requests": [{"path": "/groups"}]}
+    )
+    assert anonymous.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_batch_blocks_encoded_stream_and_batch_paths(
+    async_client, auth_headers, mock_db
+):
+    group = await group_service.create_group({"name": "Flat"}, USER_ID)
+    paths = [
+        "/%62atch",
+        f"/groups/{group['_id']}/%65vents",
+        f"/groups/{group['_id']}/events%2F",
+        f"/groups/{group['_id']}/events/.",
+    ]
+
+    response = await async_client.post(
+        "/batch",
+        json={"requests": [{"path": path} for path in paths]},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    assert [r["status"] for r in response.json()["responses"]] == [400] * 4
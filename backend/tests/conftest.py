@@ -61,6 +61,21 @@ def mock_firebase_admin(request):
     yield
 
 
+@pytest.fixture(autouse=True)
+def clear_membership_cache():
+    # The caches are module level; entries must not leak between tests
+    from app.auth.group_claims import current_group_claim
+    from app.groups.membership import membership_cache, membership_epochs
+
+    membership_cache.clear()
+    membership_epochs.clear()
+    token = current_group_claim.set(None)
+    yield
+    current_group_claim.reset(token)
+    membership_cache.clear()
+    membership_epochs.clear()
+
+
 @pytest_asyncio.fixture(scope="function", autouse=True)
 async def mock_db():
     print("mock_db fixture: Creating AsyncMongoMockClient")
@@ -0,0 +1,104 @@
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from app.events import (
+    SUBSCRIBER_QUEUE_SIZE,
+    EventHub,
+    event_hub,
+    format_sse,
+    group_channel,
+    publish_group_event,
+)
+from app.groups.routes import _group_event_stream
+from app.groups.service import GroupService
+
+
+class FakeRequest:
+    async def is_disconnected(self):
+        return False
+
+
+@pytest.mark.asyncio
+async def test_hub_delivers_only_to_channel_subscribers():
+    hub = EventHub()
+    async with hub.subscribe("group:a") as queue_a, hub.subscribe("group:b") as queue_b:
+        await hub.publish("group:a", {"type": "expense.created"})
+
+        assert queue_a.get_nowait() == {"type": "expense.created"}
+        assert queue_b.empty()
+    assert hub.subscriber_count("group:a") == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_resync_instead_of_overflowing():
+    hub = EventHub()
+    async with hub.subscribe("group:a") as queue:
+        for i in range(SUBSCRIBER_QUEUE_SIZE + 5):
+            await hub.publish("group:a", {"type": "expense.created", "n": i})
+
+        events = [queue.get_nowait() for _ in range(queue.qsize())]
+        assert {"type": "resync"} in events
+        assert len(events) <= SUBSCRIBER_QUEUE_SIZE
+
+
+def test_format_sse_wire_format():
+    payload = format_sse({"type": "expense.deleted", "expenseId": "e1"}, event_id=7)
+    lines = payload.split("\n")
+    assert lines[0] == "id: 7"
+    assert lines[1] == "event: expense.deleted"
+    assert json.loads(lines[2][len("data: ") :])["expenseId"] == "e1"
+    assert payload.endswith("\n\n")
+
+
+@pytest.mark.asyncio
+async def test_event_stream_forwards_events_and_ends_when_user_removed():
+    async with event_hub.subscribe(group_channel("g1")) as queue:
+        stream = _group_event_stream("g1", "user_a", FakeRequest(), queue)
+        assert await stream.__anext__() == "retry: 3000\n\n"
+        assert "event: ready" in await stream.__anext__()
+
+        await publish_group_event("g1", "expense.created", expenseId="e1")
+        await publish_group_event("g1", "member.removed", userId="user_b")
+        await publish_group_event("g1", "member.removed", userId="user_a")
+        await publish_group_event("g1", "expense.updated", expenseId="e1")
+
+        chunks = [chunk async for chunk in stream]
+
+    assert len(chunks) == 3
+    assert "event: expense.created" in chunks[0]
+    assert '"userId":"user_a"' in chunks[2]
+
+
+@pytest.mark.asyncio
+async def test_event_stream_sends_heartbeat_when_idle():
+    with patch("app.groups.routes.settings") as mock_settings:
+        mock_settings.sse_heartbeat_seconds = 0.01
+        stream = _group_event_stream("g1", "user_a", FakeRequest(), asyncio.Queue())
+        await stream.__anext__()
+        await stream.__anext__()
+        assert await stream.__anext__() == ": keep-alive\n\n"
+        await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_group_mutations_publish_events():
+    service = GroupService()
+    mock_db = AsyncMock()
+    mock_db.groups.find_one.return_value = {
+        "_id": "642f1e4a9b3c2d1f6a1b2c3d",
+        "members": [{"userId": "admin", "role": "admin"}],
+    }
+    mock_db.groups.find_one_and_update.return_value = {
+        "_id": "642f1e4a9b3c2d1f6a1b2c3d",
+        "name": "Trip",
+    }
+
+    async with event_hub.subscribe(group_channel("642f1e4a9b3c2d1f6a1b2c3d")) as queue:
+        with patch.object(service, "get_db", return_value=mock_db):
+            await service.join_group_by_code("ABC123", "newbie")
+
+        event = queue.get_nowait()
+        assert event["type"] == "member.joined"
+        assert event["userId"] == "newbie"
@@ -0,0 +1,350 @@
+import base64
+import hashlib
+import io
+import os
+from datetime import timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from app.auth.security import create_access_token
+from app.expenses.attachments import AttachmentTooLargeError, LocalAttachmentStore
+from app.expenses.service import ExpenseService
+from app.http_cache import etag_matches
+from bson import ObjectId
+from fastapi import HTTPException
+from httpx import ASGITransport, AsyncClient
+from main import app
+
+
+class FakeUpload:
+    """Minimal stand-in for UploadFile that records how much is read at once."""
+
+    def __init__(self, data: bytes, filename="receipt.jpg", content_type="image/jpeg"):
+        self._buffer = io.BytesIO(data)
+        self.filename = filename
+        self.content_type = content_type
+        self.max_read = 0
+
+    async def read(self, size=-1):
+        chunk = self._buffer.read(size)
+        self.max_read = max(self.max_read, len(chunk))
+        return chunk
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalAttachmentStore(str(tmp_path))
+
+
+@pytest.mark.asyncio
+async def test_local_store_streams_and_addresses_by_content(store):
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    upload = FakeUpload(data)
+
+    stored = await store.save(upload, max_bytes=10 * 1024 * 1024)
+
+    assert stored.key == hashlib.sha256(data).hexdigest()
+    assert stored.size == len(data)
+    assert stored.deduplicated is False
+    assert upload.max_read <= 1024 * 1024
+    with open(store.path_for(stored.key), "rb") as f:
+        assert f.read() == data
+    assert await store.exists(stored.key)
+
+
+@pytest.mark.asyncio
+async def test_local_store_deduplicates_identical_content(store):
+    first = await store.save(FakeUpload(b"same receipt"), max_bytes=1024)
+    second = await store.save(FakeUpload(b"same receipt"), max_bytes=1024)
+
+    assert first.key == second.key
+    assert second.deduplicated is True
+    assert os.listdir(store.tmp_dir) == []
+
+
+@pytest.mark.asyncio
+async def test_local_store_enforces_size_cap(store):
+    with pytest.raises(AttachmentTooLargeError):
+        await store.save(FakeUpload(b"x" * 2048), max_bytes=1024)
+    assert os.listdir(store.tmp_dir) == []
+
+
+def test_local_store_rejects_path_traversal_keys(store):
+    with pytest.raises(ValueError):
+        store.path_for("../../etc/passwd")
+
+
+@pytest.mark.asyncio
+async def test_upload_attachment_persists_key_on_expense(store):
+    service = ExpenseService()
+    group_id = "65f1a2b3c4d5e6f7a8b9c0d0"
+    expense_id = "65f1a2b3c4d5e6f7a8b9c0d1"
+
+    with patch("app.expenses.service.mongodb") as mock_mongodb, patch(
+        "app.expenses.service.get_attachment_store", return_value=store
+    ):
+        mock_db = MagicMock()
+        mock_mongodb.database = mock_db
+        mock_db.groups.find_one = AsyncMock(
+            return_value={"_id": ObjectId(group_id), "members": [{"userId": "user_a"}]}
+        )
+        mock_db.expenses.find_one = AsyncMock(
+            return_value={"_id": ObjectId(expense_id)}
+        )
+        mock_db.expenses.update_one = AsyncMock()
+
+        result = await service.upload_attachment(
+            group_id, expense_id, FakeUpload(b"receipt bytes"), "user_a"
+        )
+
+        key = hashlib.sha256(b"receipt bytes").hexdigest()
+        assert result["key"] == key
+        assert (
+            result["url"]
+            == f"/groups/{group_id}/expenses/{expense_id}/attachments/{key}"
+        )
+        update_filter, update = mock_db.expenses.update_one.call_args[0]
+        assert update_filter["attachments.key"] == {"$ne": key}
+        assert update["$push"]["attachments"]["size"] == len(b"receipt bytes")
+
+
+@pytest.mark.asyncio
+async def test_upload_attachment_rejects_oversized_file(store):
+    service = ExpenseService()
+
+    with patch("app.expenses.service.mongodb") as mock_mongodb, patch(
+        "app.expenses.service.get_attachment_store", return_value=store
+    ), patch("app.expenses.service.settings") as mock_settings:
+        mock_settings.attachment_max_bytes = 4
+        mock_db = MagicMock()
+        mock_mongodb.database = mock_db
+        mock_db.groups.find_one = AsyncMock(
+            return_value={"_id": ObjectId(), "members": [{"userId": "user_a"}]}
+        )
+        mock_db.expenses.find_one = AsyncMock(return_value={"_id": ObjectId()})
+        mock_db.expenses.update_one = AsyncMock()
+
+        with pytest.raises(HTTPException) as exc_info:
+            await service.upload_attachment(
+                str(ObjectId()), str(ObjectId()), FakeUpload(b"too large"), "user_a"
+            )
+
+        assert exc_info.value.status_code == 413
+        mock_db.expenses.update_one.assert_not_called()
+
+
+def test_etag_matches_handles_lists_weak_tags_and_wildcard():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"other"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        yield ac
+
+
+@pytest.fixture
+def auth_headers():
+    token = create_access_token(
+        data={"sub": "user_a"}, expires_delta=timedelta(minutes=15)
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+async def stored_receipt(store):
+    data = bytes(range(256)) * 64
+    stored = await store.save(FakeUpload(data), max_bytes=1024 * 1024)
+    metadata = {
+        "key": stored.key,
+        "filename": "receipt.jpg",
+        "contentType": "image/jpeg",
+        "size": stored.size,
+    }
+    with patch("app.expenses.routes.get_attachment_store", return_value=store), patch(
+        "app.expenses.service.expense_service.get_attachment",
+        new=AsyncMock(return_value=metadata),
+    ):
+        yield stored.key, data
+
+
+ATTACHMENT_URL = "/groups/g1/expenses/e1/attachments/{key}"
+
+
+@pytest.mark.asyncio
+async def test_download_attachment_with_cache_headers(
+    async_client, auth_headers, stored_receipt
+):
+    key, data = stored_receipt
+    response = await async_client.get(
+        ATTACHMENT_URL.format(key=key), headers=auth_headers
+    )
+
+    assert response.status_code == 200
+    assert response.content == data
+    assert response.headers["etag"] == f'"{key}"'
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["content-type"] == "image/jpeg"
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+@pytest.mark.asyncio
+async def test_download_attachment_range_request(
+    async_client, auth_headers, stored_receipt
+):
+    key, data = stored_receipt
+    response = await async_client.get(
+        ATTACHMENT_URL.format(key=key), headers={**auth_headers, "Range": "bytes=10-19"}
+    )
+
+    assert response.status_code == 206
+    assert response.content == data[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(data)}"
+
+
+@pytest.mark.asyncio
+async def test_download_attachment_if_none_match_returns_304(
+    async_client, auth_headers, stored_receipt
+):
+    key, _ = stored_receipt
+    response = await async_client.get(
+        ATTACHMENT_URL.format(key=key),
+        headers={**auth_headers, "If-None-Match": f'"{key}"'},
+    )
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == f'"{key}"'
+
+
+def _jpeg_bytes(size=(2000, 1500)):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 120, 40)).save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def test_render_derivatives_downscales_images(tmp_path):
+    from app.expenses.thumbnails import render_derivatives
+    from PIL import Image
+
+    source = tmp_path / "receipt.jpg"
+    source.write_bytes(_jpeg_bytes())
+
+    rendered = render_derivatives(str(source))
+
+    assert set(rendered) == {"thumbnail", "preview"}
+    with Image.open(io.BytesIO(rendered["thumbnail"])) as thumb:
+        assert max(thumb.size) == 256
+    with Image.open(io.BytesIO(rendered["preview"])) as preview:
+        assert max(preview.size) == 1024
+    assert len(rendered["thumbnail"]) < len(rendered["preview"])
+
+
+@pytest.mark.asyncio
+async def test_generate_attachment_derivatives_stores_next_to_original(store):
+    from app.expenses.thumbnails import render_derivatives
+
+    service = ExpenseService()
+    stored = await store.save(FakeUpload(_jpeg_bytes()), max_bytes=10 * 1024 * 1024)
+
+    async def render_inline(path):
+        return render_derivatives(path)
+
+    with patch("app.expenses.service.mongodb") as mock_mongodb, patch(
+        "app.expenses.service.get_attachment_store", return_value=store
+    ), patch("app.expenses.service.render_in_pool", new=render_inline):
+        mock_db = MagicMock()
+        mock_mongodb.database = mock_db
+        mock_db.expenses.update_one = AsyncMock()
+
+        derivatives = await service.generate_attachment_derivatives(
+            "65f1a2b3c4d5e6f7a8b9c0d0",
+            "65f1a2b3c4d5e6f7a8b9c0d1",
+            stored.key,
+            "image/jpeg",
+        )
+
+    assert derivatives == {
+        "thumbnail": f"{stored.key}_thumbnail",
+        "preview": f"{stored.key}_preview",
+    }
+    thumb_path = store.path_for(derivatives["thumbnail"])
+    assert os.path.dirname(thumb_path) == os.path.dirname(store.path_for(stored.key))
+    assert os.path.exists(thumb_path)
+    update = mock_db.expenses.update_one.call_args[0][1]
+    assert update["$set"]["attachments.$.derivatives"] == derivatives
+
+
+@pytest.mark.asyncio
+async def test_generate_attachment_derivatives_skips_non_images(store):
+    service = ExpenseService()
+    with patch("app.expenses.service.get_attachment_store", return_value=store):
+        assert (
+            await service.generate_attachment_derivatives(
+                "g", "e", "k", "application/pdf"
+            )
+            == {}
+        )
+
+
+def test_expense_response_exposes_derivative_urls():
+    service = ExpenseService()
+    attachment = service._attachment_to_response(
+        "g1",
+        "e1",
+        {"key": "abc", "size": 1, "derivatives": {"thumbnail": "abc_thumbnail"}},
+    )
+    assert (
+        attachment["thumbnailUrl"]
+        == "/groups/g1/expenses/e1/attachments/abc?variant=thumbnail"
+    )
+    assert attachment["previewUrl"] is None
+
+
+@pytest.mark.asyncio
+async def test_batched_attachment_download_is_base64_encoded(
+    async_client, auth_headers, stored_receipt
+):
+    key, data = stored_receipt
+    response = await async_client.post(
+        "/batch",
+        json={"requests": [{"path": ATTACHMENT_URL.format(key=key)}]},
+        headers=auth_headers,
+    )
+
+    assert response.status_code == 200
+    download = response.json()["responses"][0]
+    assert download["status"] == 200
+    assert download["bodyEncoding"] == "base64"
+    assert download["headers"]["content-type"] == "image/jpeg"
+    assert base64.b64decode(download["body"]) == data
+
+
+@pytest.mark.asyncio
+async def test_local_store_touches_the_disk_off_the_event_loop(store):
+    from app.expenses import attachments
+
+    offloaded = []
+    real = attachments.run_in_threadpool
+
+    async def spy(func, *args, **kwargs):
+        offloaded.append(getattr(func, "__name__", func))
+        return await real(func, *args, **kwargs)
+
+    with patch.object(attachments, "run_in_threadpool", spy):
+        stored = await store.save(FakeUpload(b"receipt"), max_bytes=1024)
+        await store.put_bytes("b" * 64, b"thumbnail")
+
+    assert "_move_into_place" in offloaded
+    assert "_write" in offloaded
+    assert await store.exists(stored.key)
+    with open(store.path_for("b" * 64), "rb") as f:
+        assert f.read() == b"thumbnail"
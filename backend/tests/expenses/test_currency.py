@@ -0,0 +1,170 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from app.auth.security import create_access_token
+from app.currency import ExchangeRates, UnknownCurrencyError
+from app.expenses.schemas import ExpenseCreateRequest, ExpenseSplit
+from app.expenses.service import ExpenseService
+from bson import ObjectId
+from fastapi import HTTPException
+from httpx import ASGITransport, AsyncClient
+from main import app
+
+GROUP_ID = ObjectId()
+TRIP_ID = ObjectId()
+ALICE = str(ObjectId())
+BOB = str(ObjectId())
+
+
+@pytest.fixture
+async def service(mock_db):
+    now = datetime.utcnow()
+    members = [
+        {"userId": ALICE, "role": "admin", "joinedAt": now},
+        {"userId": BOB, "role": "member", "joinedAt": now},
+    ]
+    await mock_db.users.insert_many(
+        [
+            {"_id": ObjectId(ALICE), "name": "Alice", "currency": "EUR"},
+            {"_id": ObjectId(BOB), "name": "Bob", "currency": "USD"},
+        ]
+    )
+    await mock_db.groups.insert_many(
+        [
+            {"_id": GROUP_ID, "name": "Flat", "currency": "USD", "members": members},
+            {"_id": TRIP_ID, "name": "Trip", "currency": "GBP", "members": members},
+        ]
+    )
+    await mock_db.exchange_rates.insert_many(
+        [
+            {"_id": "USD", "rate": 1.0},
+            {"_id": "EUR", "rate": 0.8},
+            {"_id": "GBP", "rate": 0.5},
+        ]
+    )
+    with patch("app.database.mongodb.database", mock_db), patch(
+        "app.expenses.service.exchange_rates", ExchangeRates()
+    ):
+        yield ExpenseService()
+
+
+def _expense(amount, payer, currency=None):
+    return ExpenseCreateRequest(
+        description="Dinner",
+        amount=amount,
+        paidBy=payer,
+        currency=currency,
+        splits=[
+            ExpenseSplit(userId=ALICE, amount=amount / 2),
+            ExpenseSplit(userId=BOB, amount=amount / 2),
+        ],
+    )
+
+
+@pytest.mark.asyncio
+async def test_snapshot_is_cached_and_falls_back_to_the_rates_file(mock_db):
+    rates = ExchangeRates()
+    with patch("app.database.mongodb.database", mock_db):
+        # Nothing stored yet: the shipped file is used
+        snapshot = await rates.snapshot()
+        assert snapshot.source.endswith("exchange_rates.json")
+        assert snapshot.factor("USD", "USD") == 1.0
+
+        await mock_db.exchange_rates.insert_many(
+            [{"_id": "USD", "rate": 1.0}, {"_id": "EUR", "rate": 0.5}]
+        )
+        # Served from the snapshot until it is refreshed
+        assert await rates.snapshot() is snapshot
+        rates.invalidate()
+        assert await rates.factors(["EUR", "USD"], "EUR") == {"EUR": 1.0, "USD": 0.5}
+        with pytest.raises(UnknownCurrencyError) as exc:
+            await rates.factors(["XYZ", "ABC"], "USD")
+        assert exc.value.currencies == ["ABC", "XYZ"]
+
+    # The table cannot be read at all: the last rates read are kept
+    with patch("app.database.mongodb.database", None):
+        rates._snapshot.loadedAt = 0
+        assert (await rates.snapshot()).rates == {"USD": 1.0, "EUR": 0.5}
+
+
+@pytest.mark.asyncio
+async def test_expenses_in_other_currencies_settle_in_the_groups(service, mock_db):
+    group_id = str(GROUP_ID)
+    result = await service.create_expense(
+        group_id, _expense(80.0, ALICE, currency="eur"), ALICE
+    )
+
+    expense = result["expense"]
+    assert (expense.currency, expense.exchangeRate) == ("EUR", 1.25)
+    # Splits keep the entered amounts; settlements are in dollars
+    assert [s.amount for s in expense.splits] == [40.0, 40.0]
+    assert [s.amount for s in result["settlements"]] == [50.0, 50.0]
+    assert result["groupSummary"]["totalExpenses"] == 100.0
+
+    with pytest.raises(HTTPException) as exc:
+        await service.create_expense(group_id, _expense(10.0, BOB, "XYZ"), BOB)
+    assert exc.value.status_code == 400
+    assert await mock_db.expenses.count_documents({}) == 1
+
+
+@pytest.mark.asyncio
+async def test_cross_group_totals_are_in_the_users_currency(service, mock_db):
+    await service.create_expense(str(GROUP_ID), _expense(100.0, ALICE), ALICE)
+    await service.create_expense(str(TRIP_ID), _expense(20.0, BOB), BOB)
+
+    summary = await service.get_overall_balance_summary(ALICE)
+
+    # Bob owes Alice $50 and Alice owes Bob £10, both shown in euros
+    assert summary["currency"] == "EUR"
+    assert summary["totalOwedToYou"] == 40.0
+    assert summary["totalYouOwe"] == 16.0
+    by_group = {g["group_id"]: g for g in summary["groupsSummary"]}
+    assert by_group[str(TRIP_ID)]["yourBalanceInGroup"] == -10.0
+    assert by_group[str(TRIP_ID)]["currency"] == "GBP"
+
+    friends = await service.get_friends_balance_summary(ALICE)
+    assert friends["summary"]["currency"] == "EUR"
+    assert friends["friendsBalance"][0]["netBalance"] == 24.0
+
+
+@pytest.mark.asyncio
+async def test_analytics_convert_in_the_aggregation(service, mock_db):
+    group_id = str(GROUP_ID)
+    await service.create_expense(group_id, _expense(80.0, ALICE, "EUR"), ALICE)
+    await service.create_expense(group_id, _expense(20.0, BOB), BOB)
+
+    now = datetime.utcnow()
+    analytics = await service.get_group_analytics(
+        group_id, ALICE, period="month", year=now.year, month=now.month
+    )
+
+    # 80 EUR is 100 USD
+    assert analytics["totalExpenses"] == 120.0
+    assert analytics["avgExpenseAmount"] == 60.0
+    contributions = {m["userId"]: m for m in analytics["memberContributions"]}
+    assert contributions[ALICE]["totalPaid"] == 100.0
+    assert contributions[ALICE]["totalOwed"] == 60.0
+    assert contributions[BOB]["netContribution"] == -40.0
+    today = next(d for d in analytics["expenseTrends"] if d["count"])
+    assert (today["date"], today["amount"]) == (now.strftime("%Y-%m-%d"), 120.0)
+
+
+@pytest.mark.asyncio
+async def test_create_route_rejects_an_unknown_currency(service, mock_db):
+    token = create_access_token(data={"sub": ALICE})
+    body = _expense(10.0, ALICE).model_dump(mode="json")
+    body["currency"] = "XYZ"
+
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.post(
+            f"/groups/{GROUP_ID}/expenses",
+            json=body,
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    assert response.status_code == 400
+    assert "XYZ" in response.json()["detail"]
+    assert await mock_db.expenses.count_documents({}) == 0
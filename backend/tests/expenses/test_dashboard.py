@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from app.auth.security import create_access_token
+from bson import ObjectId
+from httpx import ASGITransport, AsyncClient
+from main import app
+
+ALICE = ObjectId()
+BOB = ObjectId()
+GROUP_ID = ObjectId()
+
+
+@pytest.fixture
+async def group(mock_db):
+    now = datetime.utcnow()
+    await mock_db.users.insert_many(
+        [
+            {"_id": ALICE, "name": "Alice", "email": "alice@example.com"},
+            {"_id": BOB, "name": "Bob", "email": "bob@example.com"},
+        ]
+    )
+    await mock_db.groups.insert_one(
+        {
+            "_id": GROUP_ID,
+            "name": "Trip",
+            "currency": "USD",
+            "joinCode": "TRIP01",
+            "createdBy": str(ALICE),
+            "createdAt": now,
+            "members": [
+                {"userId": str(ALICE), "role": "admin", "joinedAt": now},
+                {"userId": str(BOB), "role": "member", "joinedAt": now},
+            ],
+        }
+    )
+    await mock_db.expenses.insert_one(
+        {
+            "groupId": str(GROUP_ID),
+            "createdBy": str(ALICE),
+            "paidBy": str(ALICE),
+            "description": "Hotel",
+            "amount": 100.0,
+            "splits": [
+                {"userId": str(ALICE), "amount": 50.0},
+                {"userId": str(BOB), "amount": 50.0},
+            ],
+            "splitType": "equal",
+            "tags": [],
+            "createdAt": now,
+            "updatedAt": now,
+        }
+    )
+    await mock_db.settlements.insert_one(
+        {
+            "groupId": str(GROUP_ID),
+            "payerId": str(ALICE),
+            "payeeId": str(BOB),
+            "payerName": "Alice",
+            "payeeName": "Bob",
+            "amount": 50.0,
+            "status": "pending",
+            "createdAt": now,
+        }
+    )
+    # mongomock adds "_id" to the projections it is given; restore the shared one
+    with patch("app.expenses.service.mongodb") as mock_mongodb, patch.dict(
+        "app.expenses.service.LIST_PROJECTION"
+    ):
+        mock_mongodb.database = mock_db
+        yield str(GROUP_ID)
+
+
+async def _get(path, user_id, headers=None):
+    token = create_access_token(
+        data={"sub": str(user_id)}, expires_delta=timedelta(minutes=15)
+    )
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        return await client.get(
+            path, headers={"Authorization": f"Bearer {token}", **(headers or {})}
+        )
+
+
+@pytest.mark.asyncio
+async def test_dashboard_returns_the_group_screen_in_one_response(group):
+    response = await _get(f"/groups/{group}/dashboard", BOB)
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["group"]["name"] == "Trip"
+    assert [m["user"]["name"] for m in body["group"]["members"]] == ["Alice", "Bob"]
+    assert [e["description"] for e in body["expenses"]["expenses"]] == ["Hotel"]
+    assert body["expenses"]["pagination"]["total"] == 1
+    assert body["balance"]["userId"] == str(BOB)
+    assert len(body["optimizedSettlements"]) == 1
+    assert body["optimizedSettlements"][0]["amount"] == 50.0
+
+    cached = await _get(
+        f"/groups/{group}/dashboard", BOB, {"If-None-Match": response.headers["etag"]}
+    )
+    assert cached.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_dashboard_is_hidden_from_non_members(group):
+    response = await _get(f"/groups/{group}/dashboard", ObjectId())
+    assert response.status_code == 403
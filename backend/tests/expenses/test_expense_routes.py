@@ -183,3 +183,28 @@ async def test_expense_validation(async_client: AsyncClient):
 
 if __name__ == "__main__":
     pytest.main([__file__])
+
+
+@pytest.mark.asyncio
+@patch("app.expenses.service.expense_service.bulk_update_settlement_status")
+async def test_bulk_settlement_update_endpoint(
+    mock_bulk_update, async_client: AsyncClient
+):
+    """The ':bulk' path is routed to the bulk update, not the single settlement"""
+    from app.auth.security import create_access_token
+
+    token = create_access_token(data={"sub": "test_user_123"})
+    mock_bulk_update.return_value = {"matched": 2, "modified": 2, "status": "completed"}
+
+    response = await async_client.patch(
+        "/groups/group_123/settlements:bulk",
+        json={"settlementIds": ["s1", "s2"], "status": "completed"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {"matched": 2, "modified": 2, "status": "completed"}
+    args = mock_bulk_update.call_args[0]
+    assert args[0] == "group_123"
+    assert args[1] == ["s1", "s2"]
+    assert args[4] == "test_user_123"
@@ -5,6 +5,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 import pytest
 from app.expenses.schemas import ExpenseCreateRequest, ExpenseSplit, SplitType
 from app.expenses.service import ExpenseService
+from app.groups.membership import MEMBER_PROJECTION
 from bson import ObjectId, errors
 from fastapi import HTTPException
 
@@ -328,35 +329,45 @@ async def test_calculate_optimized_settlements_normal(expense_service):
         assert settlement.toUserId == str(user_a_id)
 
 
+def _cursor(docs):
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=docs)
+    return cursor
+
+
 @pytest.mark.asyncio
 async def test_update_expense_success(expense_service, mock_expense_data):
     """Test successful expense update"""
     from app.expenses.schemas import ExpenseUpdateRequest
+    from pymongo import ReturnDocument, UpdateOne
 
     update_request = ExpenseUpdateRequest(description="Updated Dinner", amount=120.0)
-
-    updated_expense_data = mock_expense_data.copy()
-    updated_expense_data["description"] = "Updated Dinner"
-    updated_expense_data["amount"] = 120.0
+    expense_id = str(mock_expense_data["_id"])
+    existing_settlements = [
+        {
+            "_id": ObjectId(),
+            "expenseId": expense_id,
+            "payerId": "user_a",
+            "payeeId": split["userId"],
+            "amount": split["amount"],
+            "description": "Share for Test Dinner",
+        }
+        for split in mock_expense_data["splits"]
+    ]
 
     with patch("app.expenses.service.mongodb") as mock_mongodb:
         mock_db = MagicMock()
         mock_mongodb.database = mock_db
 
-        # Mock finding the expense
-        mock_db.expenses.find_one = AsyncMock(
-            side_effect=[mock_expense_data, updated_expense_data]
-        )
-
-        # Mock user lookup
-        mock_db.users.find_one = AsyncMock(
-            return_value={"_id": ObjectId("65f1a2b3c4d5e6f7a8b9c0d2"), "name": "Alice"}
-        )
-
-        # Mock update operation
-        mock_update_result = MagicMock()
-        mock_update_result.matched_count = 1
-        mock_db.expenses.update_one = AsyncMock(return_value=mock_update_result)
+        # The update returns the previous version of the expense
+        mock_db.expenses.find_one_and_update = AsyncMock(return_value=mock_expense_data)
+        mock_db.users.find.return_value = _cursor([])
+        mock_db.settlements.find.return_value = _cursor(existing_settlements)
+        mock_db.settlements.bulk_write = AsyncMock()
+        mock_db.expense_history.insert_one = AsyncMock()
+        mock_db.groups.update_one = AsyncMock()
+        # The new description is indexed for search
+        mock_db.expenses.update_one = AsyncMock()
 
         with patch.object(expense_service, "_expense_doc_to_response") as mock_response:
             mock_response.return_value = {
@@ -366,13 +377,38 @@ async def test_update_expense_success(expense_service, mock_expense_data):
 
             result = await expense_service.update_expense(
                 "65f1a2b3c4d5e6f7a8b9c0d0",
-                "65f1a2b3c4d5e6f7a8b9c0d1",
+                expense_id,
                 update_request,
                 "user_a",
             )
 
             assert result is not None
-            mock_db.expenses.update_one.assert_called_once()
+            # One round trip for the expense: no re-read after the update
+            mock_db.expenses.find_one.assert_not_called()
+            args, kwargs = mock_db.expenses.find_one_and_update.call_args
+            assert args[0]["createdBy"] == "user_a"
+            assert kwargs["return_document"] == ReturnDocument.BEFORE
+            updated = mock_response.call_args[0][0]
+            assert updated["description"] == "Updated Dinner"
+            assert updated["amount"] == 120.0
+
+            # Only the changed fields are recorded, outside the expense document
+            history_doc = mock_db.expense_history.insert_one.call_args[0][0]
+            assert history_doc["expenseId"] == expense_id
+            assert history_doc["changes"] == {
+                "description": {"from": "Test Dinner", "to": "Updated Dinner"},
+                "amount": {"from": 100.0, "to": 120.0},
+            }
+
+            # Splits are unchanged: settlements only get the new description
+            operations = mock_db.settlements.bulk_write.call_args[0][0]
+            assert len(operations) == 2
+            assert all(isinstance(op, UpdateOne) for op in operations)
+            assert all(
+                set(op._doc["$set"]) == {"description", "updatedAt"}
+                and op._doc["$set"]["description"] == "Share for Updated Dinner"
+                for op in operations
+            )
 
 
 @pytest.mark.asyncio
@@ -389,16 +425,9 @@ async def test_update_expense_unauthorized(expense_service):
         mock_mongodb.database = mock_db
 
         # Mock finding no expense (user not creator)
-        mock_db.expenses.find_one = AsyncMock(return_value=None)
+        mock_db.expenses.find_one_and_update = AsyncMock(return_value=None)
+        mock_db.settlements.find.return_value = _cursor([])
 
-        """with pytest.raises(ValueError, match="Expense not found or not authorized to edit"):
-            await expense_service.update_expense(
-                "group_id", 
-                "65f1a2b3c4d5e6f7a8b9c0d1",
-                update_request, 
-                "unauthorized_user"
-            )"""
-        # Updated test
         with pytest.raises(HTTPException) as exc_info:
             await expense_service.update_expense(
                 "group_id",
@@ -410,6 +439,102 @@ async def test_update_expense_unauthorized(expense_service):
         assert "Not authorized" in str(exc_info.value.detail)
 
 
+@pytest.mark.asyncio
+async def test_update_expense_splits_must_match_stored_amount(
+    expense_service, mock_expense_data
+):
+    """Splits-only edits are checked against the stored amount in the update filter"""
+    from app.expenses.schemas import ExpenseUpdateRequest
+
+    update_request = ExpenseUpdateRequest(
+        splits=[ExpenseSplit(userId="user_a", amount=10.0)]
+    )
+
+    with patch("app.expenses.service.mongodb") as mock_mongodb:
+        mock_db = MagicMock()
+        mock_mongodb.database = mock_db
+        mock_db.expenses.find_one_and_update = AsyncMock(return_value=None)
+        mock_db.expenses.find_one = AsyncMock(return_value={"_id": "exists"})
+        mock_db.users.find.return_value = _cursor([])
+        mock_db.settlements.find.return_value = _cursor([])
+
+        with pytest.raises(HTTPException) as exc_info:
+            await expense_service.update_expense(
+                mock_expense_data["groupId"],
+                str(mock_expense_data["_id"]),
+                update_request,
+                "user_a",
+            )
+
+    assert exc_info.value.status_code == 400
+    query = mock_db.expenses.find_one_and_update.call_args[0][0]
+    assert query["amount"] == {"$gte": 9.99, "$lte": 10.01}
+
+
+def test_plan_settlement_writes_only_touches_changed_splits(expense_service):
+    """Settlement rewrite keeps unchanged settlements and their status"""
+    from pymongo import DeleteOne, InsertOne, UpdateOne
+
+    expense = {
+        "_id": ObjectId(),
+        "groupId": "g1",
+        "createdBy": "user_a",
+        "paidBy": "user_b",
+        "description": "Taxi",
+        "splits": [
+            {"userId": "user_a", "amount": 10.0},
+            {"userId": "user_b", "amount": 20.0},
+            {"userId": "user_d", "amount": 5.0},
+        ],
+        "updatedAt": datetime(2024, 1, 2),
+    }
+    unchanged, resized, removed = ObjectId(), ObjectId(), ObjectId()
+    existing = [
+        {
+            "_id": unchanged,
+            "payerId": "user_b",
+            "payeeId": "user_a",
+            "amount": 10.0,
+            "status": "completed",
+            "description": "Share for Taxi",
+        },
+        {
+            "_id": resized,
+            "payerId": "user_b",
+            "payeeId": "user_b",
+            "amount": 15.0,
+            "status": "completed",
+            "description": "Share for Taxi",
+        },
+        {
+            "_id": removed,
+            "payerId": "user_b",
+            "payeeId": "user_c",
+            "amount": 5.0,
+            "status": "pending",
+            "description": "Share for Taxi",
+        },
+    ]
+
+    operations, balances = expense_service._plan_settlement_writes(
+        expense, existing, {"user_b": "Bob", "user_d": "Dan"}
+    )
+
+    updates = [op for op in operations if isinstance(op, UpdateOne)]
+    inserts = [op for op in operations if isinstance(op, InsertOne)]
+    deletes = [op for op in operations if isinstance(op, DeleteOne)]
+    assert len(operations) == 3
+    assert updates[0]._filter == {"_id": resized}
+    assert updates[0]._doc["$set"]["amount"] == 20.0
+    assert inserts[0]._doc["payeeId"] == "user_d"
+    assert inserts[0]._doc["payerId"] == "user_b"
+    assert inserts[0]._doc["payerName"] == "Bob"
+    assert inserts[0]._doc["status"] == "pending"
+    assert deletes[0]._filter == {"_id": removed}
+    # Carol's pending share is gone and Dan's is added; Bob is owed the same
+    assert balances == {"balances.user_c": 5.0, "balances.user_d": -5.0}
+
+
 def test_expense_split_validation():
     """Test expense split validation with proper assertions"""
     # Valid split - should not raise exception
@@ -499,7 +624,10 @@ async def test_get_expense_by_id_success(expense_service, mock_expense_data):
 
         # Mock group membership check
         mock_db.groups.find_one = AsyncMock(
-            return_value={"_id": ObjectId("65f1a2b3c4d5e6f7a8b9c0d0")}
+            return_value={
+                "_id": ObjectId("65f1a2b3c4d5e6f7a8b9c0d0"),
+                "members": [{"userId": "user_a"}],
+            }
         )
 
         # Mock expense lookup
@@ -534,7 +662,10 @@ async def test_get_expense_by_id_not_found(expense_service):
 
         # Mock group membership check
         mock_db.groups.find_one = AsyncMock(
-            return_value={"_id": ObjectId("65f1a2b3c4d5e6f7a8b9c0d0")}
+            return_value={
+                "_id": ObjectId("65f1a2b3c4d5e6f7a8b9c0d0"),
+                "members": [{"userId": "user_a"}],
+            }
         )
 
         # Mock expense not found
@@ -599,10 +730,58 @@ async def test_list_group_expenses_success(
             assert result["summary"]["totalAmount"] == 100.0
             mock_db.groups.find_one.assert_called_once()
             mock_db.expenses.find.assert_called_once()
+            # History, comments and search tokens are never shipped with listings
+            assert mock_db.expenses.find.call_args[0][1] == {
+                "history": 0,
+                "comments": 0,
+                "searchTokens": 0,
+            }
             mock_db.expenses.count_documents.assert_called_once()
             mock_db.expenses.aggregate.assert_called_once()
 
 
+@pytest.mark.asyncio
+async def test_get_expense_history_paginates_newest_first(
+    expense_service, mock_group_data, mock_expense_data
+):
+    """Test reading an expense's edit history from expense_history"""
+    expense_id = str(mock_expense_data["_id"])
+    entry = {
+        "_id": ObjectId(),
+        "expenseId": expense_id,
+        "groupId": mock_expense_data["groupId"],
+        "userId": "user_a",
+        "userName": "Alice",
+        "changes": {"amount": {"from": 90.0, "to": 100.0}},
+        "editedAt": datetime(2024, 1, 2),
+    }
+
+    with patch("app.expenses.service.mongodb") as mock_mongodb:
+        mock_db = MagicMock()
+        mock_mongodb.database = mock_db
+        mock_db.groups.find_one = AsyncMock(return_value=mock_group_data)
+        mock_db.expenses.find_one = AsyncMock(return_value={"_id": expense_id})
+        mock_db.expense_history.count_documents = AsyncMock(return_value=3)
+        cursor = MagicMock()
+        cursor.sort.return_value = cursor
+        cursor.skip.return_value = cursor
+        cursor.limit.return_value = cursor
+        cursor.to_list = AsyncMock(return_value=[entry])
+        mock_db.expense_history.find.return_value = cursor
+
+        result = await expense_service.get_expense_history(
+            mock_expense_data["groupId"], expense_id, "user_a", page=2, limit=2
+        )
+
+    mock_db.expense_history.find.assert_called_once_with({"expenseId": expense_id})
+    cursor.sort.assert_called_once_with("editedAt", -1)
+    cursor.skip.assert_called_once_with(2)
+    assert result["history"][0].changes == {"amount": {"from": 90.0, "to": 100.0}}
+    assert result["pagination"]["total"] == 3
+    assert result["pagination"]["hasPrev"] is True
+    assert result["pagination"]["hasNext"] is False
+
+
 @pytest.mark.asyncio
 async def test_list_group_expenses_empty(expense_service, mock_group_data):
     """Test listing group expenses when there are none"""
@@ -795,10 +974,42 @@ async def test_delete_expense_success(expense_service, mock_expense_data):
         mock_db.settlements.delete_many = AsyncMock(
             return_value=mock_delete_settlements_result
         )
+        settlement_ids = [ObjectId(), ObjectId()]
+        mock_db.settlements.find.return_value = _cursor(
+            [
+                {
+                    "_id": settlement_ids[0],
+                    "payerId": "user_a",
+                    "payeeId": "user_b",
+                    "amount": 50.0,
+                    "status": "pending",
+                },
+                {
+                    "_id": settlement_ids[1],
+                    "payerId": "user_a",
+                    "payeeId": "user_a",
+                    "amount": 50.0,
+                    "status": "completed",
+                },
+            ]
+        )
+        mock_db.expense_history.delete_many = AsyncMock()
+        mock_db.tombstones.insert_many = AsyncMock()
+        mock_db.groups.update_one = AsyncMock()
 
         result = await expense_service.delete_expense(group_id, expense_id, user_id)
 
         assert result is True
+        tombstones = [
+            (doc["kind"], doc["entityId"])
+            for call in mock_db.tombstones.insert_many.call_args_list
+            for doc in call[0][0]
+        ]
+        assert tombstones == [
+            ("settlement", str(settlement_ids[0])),
+            ("settlement", str(settlement_ids[1])),
+            ("expense", expense_id),
+        ]
         mock_db.expenses.find_one.assert_called_once_with(
             {"_id": ObjectId(expense_id), "groupId": group_id, "createdBy": user_id}
         )
@@ -808,6 +1019,14 @@ async def test_delete_expense_success(expense_service, mock_expense_data):
         mock_db.expenses.delete_one.assert_called_once_with(
             {"_id": ObjectId(expense_id)}
         )
+        mock_db.expense_history.delete_many.assert_called_once_with(
+            {"expenseId": expense_id}
+        )
+        # The pending share leaves the group's balances
+        mock_db.groups.update_one.assert_any_await(
+            {"_id": ObjectId(group_id), "balances": {"$exists": True}},
+            {"$inc": {"balances.user_a": -50.0, "balances.user_b": 50.0}},
+        )
 
 
 @pytest.mark.asyncio
@@ -866,6 +1085,8 @@ async def test_delete_expense_failed_deletion(expense_service, mock_expense_data
         mock_db.expenses.delete_one = AsyncMock(return_value=mock_delete_expense_result)
 
         mock_db.settlements.delete_many = AsyncMock()
+        mock_db.settlements.find.return_value = _cursor([])
+        mock_db.tombstones.insert_many = AsyncMock()
 
         result = await expense_service.delete_expense(group_id, expense_id, user_id)
 
@@ -943,7 +1164,7 @@ async def test_create_manual_settlement_success(expense_service, mock_group_data
         assert result.payeeName == "User C"
 
         mock_db.groups.find_one.assert_called_once_with(
-            {"_id": ObjectId(group_id), "members.userId": user_id}
+            {"_id": ObjectId(group_id)}, MEMBER_PROJECTION
         )
         mock_db.users.find.assert_called_once()
         mock_db.settlements.insert_one.assert_called_once()
@@ -1173,7 +1394,7 @@ async def test_get_settlement_by_id_success(expense_service, mock_group_data):
         assert result.description == "Specific settlement"
 
         mock_db.groups.find_one.assert_called_once_with(
-            {"_id": ObjectId(group_id), "members.userId": user_id}
+            {"_id": ObjectId(group_id)}, MEMBER_PROJECTION
         )
         mock_db.settlements.find_one.assert_called_once_with(
             {"_id": ObjectId(settlement_id_str), "groupId": group_id}
@@ -1272,12 +1493,11 @@ async def test_update_settlement_status_success(expense_service):
         mock_db = MagicMock()
         mock_mongodb.database = mock_db
 
-        mock_update_result = MagicMock()
-        mock_update_result.matched_count = 1
-        mock_db.settlements.update_one = AsyncMock(return_value=mock_update_result)
-
-        # find_one is called to retrieve the updated document
-        mock_db.settlements.find_one = AsyncMock(return_value=updated_settlement_doc)
+        # The update returns the settlement as it was before
+        mock_db.settlements.find_one_and_update = AsyncMock(
+            return_value=original_settlement_doc
+        )
+        mock_db.groups.update_one = AsyncMock()
 
         result = await expense_service.update_settlement_status(
             group_id, settlement_id_str, new_status, paid_at=paid_at_time
@@ -1288,8 +1508,8 @@ async def test_update_settlement_status_success(expense_service):
         assert result.status == new_status.value
         assert result.paidAt == paid_at_time
 
-        mock_db.settlements.update_one.assert_called_once()
-        update_call_args = mock_db.settlements.update_one.call_args[0]
+        mock_db.settlements.find_one_and_update.assert_called_once()
+        update_call_args = mock_db.settlements.find_one_and_update.call_args[0]
         assert update_call_args[0] == {
             "_id": settlement_id_obj,
             "groupId": group_id,
@@ -1300,7 +1520,11 @@ async def test_update_settlement_status_success(expense_service):
         assert set_doc["paidAt"] == paid_at_time
         assert "updatedAt" in set_doc
 
-        mock_db.settlements.find_one.assert_called_once_with({"_id": settlement_id_obj})
+        # Paying a pending settlement clears it from the balances
+        mock_db.groups.update_one.assert_any_await(
+            {"_id": ObjectId(group_id), "balances": {"$exists": True}},
+            {"$inc": {"balances.p1": -10, "balances.p2": 10}},
+        )
 
 
 @pytest.mark.asyncio
@@ -1316,11 +1540,9 @@ async def test_update_settlement_status_not_found(expense_service):
         mock_db = MagicMock()
         mock_mongodb.database = mock_db
 
-        mock_update_result = MagicMock()
-        mock_update_result.matched_count = 0  # Simulate settlement not found
-        mock_db.settlements.update_one = AsyncMock(return_value=mock_update_result)
-
-        mock_db.settlements.find_one = AsyncMock(return_value=None)
+        # Simulate settlement not found
+        mock_db.settlements.find_one_and_update = AsyncMock(return_value=None)
+        mock_db.groups.update_one = AsyncMock()
 
         """with pytest.raises(ValueError, match="Settlement not found"):
             await expense_service.update_settlement_status(
@@ -1335,8 +1557,151 @@ async def test_update_settlement_status_not_found(expense_service):
         assert exc_info.value.status_code == 404
         assert exc_info.value.detail == "Settlement not found"
 
-        # Should not be called if update fails
-        mock_db.settlements.find_one.assert_not_called()
+        # Balances are untouched if the update matched nothing
+        mock_db.groups.update_one.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_settlement_status_single_write(expense_service):
+    """Many ids are updated with one update_many scoped to the group"""
+    from app.expenses.schemas import SettlementStatus
+
+    group_id = str(ObjectId())
+    ids = [ObjectId(), ObjectId(), ObjectId()]
+
+    with patch("app.expenses.service.mongodb") as mock_mongodb:
+        mock_db = MagicMock()
+        mock_mongodb.database = mock_db
+        mock_db.groups.find_one = AsyncMock(
+            return_value={"_id": ObjectId(group_id), "members": [{"userId": "user_a"}]}
+        )
+        mock_db.groups.update_one = AsyncMock()
+        mock_db.settlements.find.return_value = _cursor([])
+        mock_db.settlements.update_many = AsyncMock(
+            return_value=MagicMock(matched_count=3, modified_count=2)
+        )
+
+        result = await expense_service.bulk_update_settlement_status(
+            group_id,
+            [str(i) for i in ids] + [str(ids[0])],
+            SettlementStatus.COMPLETED,
+            user_id="user_a",
+        )
+
+        assert result == {"matched": 3, "modified": 2, "status": "completed"}
+        mock_db.settlements.update_many.assert_awaited_once()
+        query, update = mock_db.settlements.update_many.call_args[0]
+        assert query["groupId"] == group_id
+        assert sorted(query["_id"]["$in"]) == sorted(ids)
+        assert update["$set"]["status"] == "completed"
+        assert "paidAt" in update["$set"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_settlement_status_requires_membership(expense_service):
+    from app.expenses.schemas import SettlementStatus
+
+    with patch("app.expenses.service.mongodb") as mock_mongodb:
+        mock_db = MagicMock()
+        mock_mongodb.database = mock_db
+        mock_db.groups.find_one = AsyncMock(return_value=None)
+        mock_db.settlements.update_many = AsyncMock()
+
+        with pytest.raises(HTTPException) as exc_info:
+            await expense_service.bulk_update_settlement_status(
+                str(ObjectId()),
+                [str(ObjectId())],
+                SettlementStatus.CANCELLED,
+                user_id="outsider",
+            )
+
+        assert exc_info.value.status_code == 403
+        mock_db.settlements.update_many.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_settle_all_records_plan_in_one_bulk_write(expense_service):
+    """Pending debts are closed and the optimized plan is recorded as payments"""
+    from pymongo import InsertOne, UpdateMany
+
+    group_id = str(ObjectId())
+    # B owes A 30, C owes A 20 and A owes B 10: B pays A 20, C pays A 20
+    pending = [
+        {
+            "_id": ObjectId(),
+            "payerId": "a",
+            "payeeId": "b",
+            "payerName": "A",
+            "payeeName": "B",
+            "amount": 30.0,
+        },
+        {
+            "_id": ObjectId(),
+            "payerId": "a",
+            "payeeId": "c",
+            "payerName": "A",
+            "payeeName": "C",
+            "amount": 20.0,
+        },
+        {
+            "_id": ObjectId(),
+            "payerId": "b",
+            "payeeId": "a",
+            "payerName": "B",
+            "payeeName": "A",
+            "amount": 10.0,
+        },
+    ]
+
+    with patch("app.expenses.service.mongodb") as mock_mongodb:
+        mock_db = MagicMock()
+        mock_mongodb.database = mock_db
+        mock_db.groups.find_one = AsyncMock(
+            return_value={"_id": ObjectId(group_id), "members": [{"userId": "user_a"}]}
+        )
+        mock_db.groups.update_one = AsyncMock()
+        mock_db.settlements.find.return_value = _cursor(pending)
+        mock_db.settlements.bulk_write = AsyncMock(
+            return_value=MagicMock(modified_count=3)
+        )
+
+        result = await expense_service.settle_all(group_id, "user_a")
+
+        assert result["settledCount"] == 3
+        assert result["totalAmount"] == 40.0
+        assert {(p.payerId, p.payeeId, p.amount) for p in result["payments"]} == {
+            ("b", "a", 20.0),
+            ("c", "a", 20.0),
+        }
+        assert all(p.status == "completed" for p in result["payments"])
+
+        mock_db.settlements.bulk_write.assert_awaited_once()
+        operations = mock_db.settlements.bulk_write.call_args[0][0]
+        assert isinstance(operations[0], UpdateMany)
+        assert operations[0]._filter == {
+            "_id": {"$in": [doc["_id"] for doc in pending]},
+            "status": "pending",
+        }
+        assert [type(op) for op in operations[1:]] == [InsertOne, InsertOne]
+
+
+@pytest.mark.asyncio
+async def test_settle_all_nothing_pending(expense_service):
+    group_id = str(ObjectId())
+
+    with patch("app.expenses.service.mongodb") as mock_mongodb:
+        mock_db = MagicMock()
+        mock_mongodb.database = mock_db
+        mock_db.groups.find_one = AsyncMock(
+            return_value={"_id": ObjectId(group_id), "members": [{"userId": "user_a"}]}
+        )
+        mock_db.settlements.find.return_value = _cursor([])
+        mock_db.settlements.bulk_write = AsyncMock()
+
+        result = await expense_service.settle_all(group_id, "user_a")
+
+        assert result == {"settledCount": 0, "payments": [], "totalAmount": 0}
+        mock_db.settlements.bulk_write.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -1354,22 +1719,35 @@ async def test_delete_settlement_success(expense_service, mock_group_data):
         # Mock group membership check
         mock_db.groups.find_one = AsyncMock(return_value=mock_group_data)
 
-        # Mock successful deletion
-        mock_delete_result = MagicMock()
-        mock_delete_result.deleted_count = 1
-        mock_db.settlements.delete_one = AsyncMock(return_value=mock_delete_result)
+        # Mock successful deletion, returning the deleted settlement
+        mock_db.settlements.find_one_and_delete = AsyncMock(
+            return_value={
+                "_id": ObjectId(settlement_id_str),
+                "payerId": "user_a",
+                "payeeId": "user_b",
+                "amount": 25.0,
+                "status": "completed",
+            }
+        )
+        mock_db.tombstones.insert_many = AsyncMock()
+        mock_db.groups.update_one = AsyncMock()
 
         result = await expense_service.delete_settlement(
             group_id, settlement_id_str, user_id
         )
 
         assert result is True
+        tombstone = mock_db.tombstones.insert_many.call_args[0][0][0]
+        assert tombstone["kind"] == "settlement"
+        assert tombstone["entityId"] == settlement_id_str
         mock_db.groups.find_one.assert_called_once_with(
-            {"_id": ObjectId(group_id), "members.userId": user_id}
-        )
-        mock_db.settlements.delete_one.assert_called_once_with(
-            {"_id": ObjectId(settlement_id_str), "groupId": group_id}
+            {"_id": ObjectId(group_id)}, MEMBER_PROJECTION
         )
+        args, kwargs = mock_db.settlements.find_one_and_delete.call_args
+        assert args[0] == {"_id": ObjectId(settlement_id_str), "groupId": group_id}
+        # A completed settlement was not in the balances
+        for call in mock_db.groups.update_one.call_args_list:
+            assert "balances" not in call[0][0]
 
 
 @pytest.mark.asyncio
@@ -1385,9 +1763,8 @@ async def test_delete_settlement_not_found(expense_service, mock_group_data):
 
         mock_db.groups.find_one = AsyncMock(return_value=mock_group_data)
 
-        mock_delete_result = MagicMock()
-        mock_delete_result.deleted_count = 0  # Simulate not found
-        mock_db.settlements.delete_one = AsyncMock(return_value=mock_delete_result)
+        # Simulate not found
+        mock_db.settlements.find_one_and_delete = AsyncMock(return_value=None)
 
         result = await expense_service.delete_settlement(
             group_id, settlement_id_str, user_id
@@ -1420,7 +1797,7 @@ async def test_delete_settlement_group_access_denied(expense_service):
         assert exc_info.value.status_code == 403
         assert exc_info.value.detail == "Group not found or user not a member"
 
-        mock_db.settlements.delete_one.assert_not_called()
+        mock_db.settlements.find_one_and_delete.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -1520,7 +1897,7 @@ async def test_get_user_balance_in_group_success(expense_service, mock_group_dat
         assert result["recentExpenses"][0]["userShare"] == 75.0
 
         mock_db.groups.find_one.assert_called_once_with(
-            {"_id": ObjectId(group_id), "members.userId": current_user_id}
+            {"_id": ObjectId(group_id)}, MEMBER_PROJECTION
         )
         mock_db.users.find_one.assert_called_once_with({"_id": target_user_id_obj})
         mock_db.settlements.aggregate.assert_called_once()
@@ -1930,37 +2307,29 @@ async def test_get_group_analytics_success(expense_service, mock_group_data):
     # Let's assume mock_group_data uses string IDs that are fine for direct comparison but might need ObjectId conversion if used in DB queries
     # For this test, the service method `get_group_analytics` takes group_id_str and user_a_str
 
-    # Mock expenses for the specified period
-    expense1_date = datetime(year, month, 5, tzinfo=timezone.utc)
-    expense2_date = datetime(year, month, 15, tzinfo=timezone.utc)
-    mock_expenses_in_period = [
-        {
-            "_id": ObjectId(),
-            "groupId": group_id_str,
-            "createdBy": user_a_str,
-            "description": "Groceries",
-            "amount": 70.0,
-            "tags": ["food", "household"],
-            "splits": [
-                {"userId": user_a_str, "amount": 35.0},
-                {"userId": user_b_str, "amount": 35.0},
-            ],
-            "createdAt": expense1_date,
-        },
-        {
-            "_id": ObjectId(),
-            "groupId": group_id_str,
-            "createdBy": user_b_str,
-            "description": "Movies",
-            "amount": 30.0,
-            "tags": ["entertainment", "food"],
-            "splits": [
-                {"userId": user_a_str, "amount": 15.0},
-                {"userId": user_b_str, "amount": 15.0},
-            ],
-            "createdAt": expense2_date,
-        },
-    ]
+    # Aggregated over the period's expenses: Groceries (70, food and
+    # household, paid by A) on the 5th and Movies (30, entertainment and
+    # food, paid by B) on the 15th, both split evenly between A and B
+    mock_facets = {
+        "totals": [{"_id": None, "amount": 100.0, "count": 2}],
+        "categories": [
+            {"_id": "household", "amount": 70.0, "count": 1},
+            {"_id": "food", "amount": 100.0, "count": 2},
+            {"_id": "entertainment", "amount": 30.0, "count": 1},
+        ],
+        "paid": [
+            {"_id": user_a_str, "amount": 70.0},
+            {"_id": user_b_str, "amount": 30.0},
+        ],
+        "owed": [
+            {"_id": user_a_str, "amount": 50.0},
+            {"_id": user_b_str, "amount": 50.0},
+        ],
+        "days": [
+            {"_id": f"{year}-{month:02d}-05", "amount": 70.0, "count": 1},
+            {"_id": f"{year}-{month:02d}-15", "amount": 30.0, "count": 1},
+        ],
+    }
 
     # Mock user data for member contributions
     mock_user_a_doc_db = {"_id": user_a_obj, "name": "User A"}
@@ -2002,10 +2371,8 @@ async def test_get_group_analytics_success(expense_service, mock_group_data):
         mock_db.groups.find_one = AsyncMock(
             return_value=current_test_mock_group_data
         )  # Use the adjusted mock
-        # Mock expenses find for the period
-        mock_expenses_cursor = AsyncMock()
-        mock_expenses_cursor.to_list.return_value = mock_expenses_in_period
-        mock_db.expenses.find.return_value = mock_expenses_cursor
+        # Mock the analytics aggregation for the period
+        mock_db.expenses.aggregate.return_value = _cursor([mock_facets])
         # Mock user lookups for member names
         mock_db.users.find_one = AsyncMock(side_effect=mock_users_find_one_side_effect)
 
@@ -2083,7 +2450,19 @@ async def test_get_group_analytics_success(expense_service, mock_group_data):
 
         # Verify mocks
         mock_db.groups.find_one.assert_called_once()
-        mock_db.expenses.find.assert_called_once()
+        mock_db.expenses.aggregate.assert_called_once()
+        match = mock_db.expenses.aggregate.call_args[0][0][0]["$match"]
+        assert match["groupId"] == group_id_str
+        assert match["createdAt"] == {
+            "$gte": datetime(year, month, 1),
+            "$lt": datetime(year, month + 1, 1),
+        }
+        # Categories are ordered by amount
+        assert [c["tag"] for c in top_categories] == [
+            "food",
+            "household",
+            "entertainment",
+        ]
         # users.find_one called for each member in current_test_mock_group_data["members"]
         assert mock_db.users.find_one.call_count == len(
             current_test_mock_group_data["members"]
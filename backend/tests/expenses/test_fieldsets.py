@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from app.auth.security import create_access_token
+from bson import ObjectId
+from httpx import ASGITransport, AsyncClient
+from main import app
+
+ALICE = ObjectId()
+BOB = ObjectId()
+GROUP_ID = ObjectId()
+EXPENSE_ID = ObjectId()
+SETTLEMENT_ID = ObjectId()
+
+
+@pytest.fixture
+async def group(mock_db):
+    now = datetime.utcnow()
+    await mock_db.groups.insert_one(
+        {
+            "_id": GROUP_ID,
+            "name": "Trip",
+            "currency": "USD",
+            "createdBy": str(ALICE),
+            "createdAt": now,
+            "members": [
+                {"userId": str(ALICE), "role": "admin", "joinedAt": now},
+                {"userId": str(BOB), "role": "member", "joinedAt": now},
+            ],
+        }
+    )
+    await mock_db.expenses.insert_one(
+        {
+            "_id": EXPENSE_ID,
+            "groupId": str(GROUP_ID),
+            "createdBy": str(ALICE),
+            "paidBy": str(ALICE),
+            "description": "Hotel",
+            "amount": 100.0,
+            "splits": [
+                {"userId": str(ALICE), "amount": 50.0},
+                {"userId": str(BOB), "amount": 50.0},
+            ],
+            "splitType": "equal",
+            "tags": ["travel"],
+            "attachments": [
+                {
+                    "key": "abc",
+                    "filename": "receipt.jpg",
+                    "contentType": "image/jpeg",
+                    "size": 10,
+                    "uploadedBy": str(ALICE),
+                    "uploadedAt": now,
+                }
+            ],
+            "createdAt": now,
+            "updatedAt": now,
+        }
+    )
+    await mock_db.settlements.insert_one(
+        {
+            "_id": SETTLEMENT_ID,
+            "expenseId": str(EXPENSE_ID),
+            "groupId": str(GROUP_ID),
+            "payerId": str(BOB),
+            "payeeId": str(ALICE),
+            "payerName": "Bob",
+            "payeeName": "Alice",
+            "amount": 50.0,
+            "status": "pending",
+            "createdAt": now,
+        }
+    )
+    # mongomock adds "_id" to the projections it is given; restore the shared one
+    with patch("app.database.mongodb.database", mock_db), patch.dict(
+        "app.expenses.service.LIST_PROJECTION"
+    ):
+        yield f"/groups/{GROUP_ID}"
+
+
+async def _get(path, **params):
+    token = create_access_token(
+        data={"sub": str(BOB)}, expires_delta=timedelta(minutes=15)
+    )
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        return await client.get(
+            path, params=params, headers={"Authorization": f"Bearer {token}"}
+        )
+
+
+@pytest.mark.asyncio
+async def test_expense_fields_trim_list_and_detail(group):
+    listed = await _get(f"{group}/expenses", fields="description,amount")
+    assert listed.status_code == 200
+    body = listed.json()
+    assert body["expenses"] == [
+        {"_id": str(EXPENSE_ID), "description": "Hotel", "amount": 100.0}
+    ]
+    assert body["pagination"]["total"] == 1
+
+    detail = await _get(f"{group}/expenses/{EXPENSE_ID}", fields="attachments")
+    assert detail.status_code == 200
+    expense = detail.json()["expense"]
+    assert set(expense) == {"_id", "attachments"}
+    assert expense["attachments"][0]["url"] == (
+        f"{group}/expenses/{EXPENSE_ID}/attachments/abc"
+    )
+
+    full = await _get(f"{group}/expenses/{EXPENSE_ID}")
+    assert full.json()["expense"]["splitType"] == "equal"
+
+    unknown = await _get(f"{group}/expenses", fields="amount,history")
+    assert unknown.status_code == 400
+    assert unknown.json()["detail"] == "Unknown fields: history"
+
+
+@pytest.mark.asyncio
+async def test_settlement_fields_trim_list_and_detail(group):
+    listed = await _get(f"{group}/settlements", fields="_id,amount,status")
+    assert listed.status_code == 200
+    body = listed.json()
+    assert body["settlements"] == [
+        {"_id": str(SETTLEMENT_ID), "amount": 50.0, "status": "pending"}
+    ]
+    assert body["summary"]["totalPending"] == 50.0
+    assert len(body["optimizedSettlements"]) == 1
+
+    detail = await _get(f"{group}/settlements/{SETTLEMENT_ID}", fields="payerName")
+    assert detail.status_code == 200
+    assert detail.json() == {"_id": str(SETTLEMENT_ID), "payerName": "Bob"}
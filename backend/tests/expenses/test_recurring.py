@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import mongomock
+import pytest
+from app.expenses.recurring import RecurringScheduler, occurrence_at
+from app.expenses.schemas import ExpenseSplit, RecurringExpenseCreateRequest
+from app.expenses.service import ExpenseService
+from bson import ObjectId
+
+GROUP_ID = ObjectId()
+ALICE = str(ObjectId())
+BOB = str(ObjectId())
+NOW = datetime(2024, 5, 20, 12, 0)
+
+
+def _bulk_write(collection, operations, ordered=True):
+    """mongomock's bulk_write lags behind pymongo's UpdateOne, so apply them
+    one by one"""
+    for op in operations:
+        collection.update_one(op._filter, op._doc, upsert=op._upsert)
+
+
+@pytest.fixture
+async def service(mock_db):
+    await mock_db.users.insert_many(
+        [
+            {"_id": ObjectId(ALICE), "name": "Alice"},
+            {"_id": ObjectId(BOB), "name": "Bob"},
+        ]
+    )
+    await mock_db.groups.insert_one(
+        {
+            "_id": GROUP_ID,
+            "name": "Flat",
+            "currency": "USD",
+            "changeVersion": 1,
+            "balances": {},
+            "members": [
+                {"userId": ALICE, "role": "admin", "joinedAt": NOW},
+                {"userId": BOB, "role": "member", "joinedAt": NOW},
+            ],
+        }
+    )
+    with patch("app.database.mongodb.database", mock_db), patch.object(
+        mongomock.collection.Collection, "bulk_write", _bulk_write
+    ):
+        yield ExpenseService()
+
+
+def _rent(start, **kwargs):
+    return RecurringExpenseCreateRequest(
+        description="Rent",
+        amount=1000.0,
+        paidBy=ALICE,
+        splits=[
+            ExpenseSplit(userId=ALICE, amount=500.0),
+            ExpenseSplit(userId=BOB, amount=500.0),
+        ],
+        startAt=start,
+        **kwargs,
+    )
+
+
+def test_monthly_occurrences_keep_the_day_of_month():
+    definition = {"startAt": datetime(2024, 1, 31), "frequency": "monthly"}
+    dates = [occurrence_at({**definition, "interval": 1}, n) for n in range(4)]
+    assert [d.day for d in dates] == [31, 29, 31, 30]
+    assert occurrence_at({**definition, "interval": 2}, 1) == datetime(2024, 3, 31)
+
+
+@pytest.mark.asyncio
+async def test_due_occurrences_are_caught_up_once(service, mock_db):
+    group_id = str(GROUP_ID)
+    created = await service.create_recurring_expense(
+        group_id, _rent(datetime(2024, 2, 1)), ALICE
+    )
+    # Not due yet
+    await service.create_recurring_expense(
+        group_id, _rent(NOW + timedelta(days=1), frequency="weekly"), ALICE
+    )
+
+    # February to May were missed
+    assert await RecurringScheduler.catch_up(service.materialize_due_expenses, NOW) == 1
+    expenses = await mock_db.expenses.find({"recurringId": created["_id"]}).to_list(
+        None
+    )
+    assert sorted(e["createdAt"].month for e in expenses) == [2, 3, 4, 5]
+    assert await mock_db.settlements.count_documents({"status": "pending"}) == 4
+    group = await mock_db.groups.find_one({"_id": GROUP_ID})
+    assert group["balances"] == {ALICE: 2000.0, BOB: -2000.0}
+    assert group["changeVersion"] == 2
+    definition = await mock_db.recurring_expenses.find_one(
+        {"_id": ObjectId(created["_id"])}
+    )
+    assert definition["occurrences"] == 4
+    assert definition["nextRunAt"] == datetime(2024, 6, 1)
+
+    # A crash before the definition was advanced: the retry posts nothing twice
+    rewind = {"occurrences": 2, "nextRunAt": datetime(2024, 4, 1)}
+    await mock_db.recurring_expenses.update_one(
+        {"_id": definition["_id"]}, {"$set": rewind}
+    )
+    assert await RecurringScheduler.catch_up(service.materialize_due_expenses, NOW) == 1
+    assert await mock_db.expenses.count_documents({}) == 4
+    assert await mock_db.settlements.count_documents({}) == 8
+    group = await mock_db.groups.find_one({"_id": GROUP_ID})
+    assert group["balances"] == {ALICE: 2000.0, BOB: -2000.0}
+
+    # ... and also before the balances were moved: only those are completed
+    await mock_db.recurring_expenses.update_one(
+        {"_id": definition["_id"]}, {"$set": rewind}
+    )
+    await mock_db.groups.update_one(
+        {"_id": GROUP_ID},
+        {
+            "$set": {
+                "balances": {ALICE: 1000.0, BOB: -1000.0},
+                f"balancedOccurrences.{created['_id']}": 2,
+            }
+        },
+    )
+    assert await RecurringScheduler.catch_up(service.materialize_due_expenses, NOW) == 1
+    group = await mock_db.groups.find_one({"_id": GROUP_ID})
+    assert group["balances"] == {ALICE: 2000.0, BOB: -2000.0}
+    assert group["balancedOccurrences"] == {created["_id"]: 4}
+
+
+@pytest.mark.asyncio
+async def test_catch_up_takes_batches_until_nothing_is_due(service, mock_db):
+    group_id = str(GROUP_ID)
+    for day in range(1, 6):
+        await service.create_recurring_expense(
+            group_id, _rent(datetime(2024, 5, day), frequency="weekly"), ALICE
+        )
+
+    with patch("app.expenses.service.settings.recurring_expenses_batch_size", 2):
+        processed = await RecurringScheduler.catch_up(
+            service.materialize_due_expenses, NOW
+        )
+
+    assert processed == 5
+    # Weekly from May 1st-5th to the 20th: three occurrences each
+    assert await mock_db.expenses.count_documents({}) == 15
+    assert (
+        await mock_db.recurring_expenses.count_documents({"nextRunAt": {"$lte": NOW}})
+        == 0
+    )
+
+
+@pytest.mark.asyncio
+async def test_definitions_stop_once_a_split_user_left(service, mock_db):
+    group_id = str(GROUP_ID)
+    created = await service.create_recurring_expense(
+        group_id, _rent(datetime(2024, 5, 1)), ALICE
+    )
+    await mock_db.groups.update_one(
+        {"_id": GROUP_ID}, {"$pull": {"members": {"userId": BOB}}}
+    )
+
+    assert await RecurringScheduler.catch_up(service.materialize_due_expenses, NOW) == 1
+    assert await mock_db.expenses.count_documents({}) == 0
+    assert await mock_db.settlements.count_documents({}) == 0
+    definition = await mock_db.recurring_expenses.find_one(
+        {"_id": ObjectId(created["_id"])}
+    )
+    assert definition["active"] is False
+    assert BOB in definition["lastError"]
+    listed = await service.list_recurring_expenses(group_id, ALICE)
+    assert listed[0]["lastError"] == definition["lastError"]
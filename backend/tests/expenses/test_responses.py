@@ -0,0 +1,71 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from app.expenses.schemas import ExpenseListResponse, ExpenseResponse, Settlement
+from app.responses import ORJSONModelResponse, dumps
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+
+def _expense(created_at):
+    return ExpenseResponse(
+        _id="65f1a2b3c4d5e6f7a8b9c0d1",
+        groupId="g1",
+        createdBy="u1",
+        paidBy="u1",
+        description="Dinner",
+        amount=30.0,
+        splits=[
+            {"userId": "u1", "amount": 15.0, "type": "equal"},
+            {"userId": "u2", "amount": 15.0, "type": "equal"},
+        ],
+        splitType="equal",
+        createdAt=created_at,
+        updatedAt=created_at,
+    )
+
+
+@pytest.mark.asyncio
+async def test_fast_path_matches_response_model_output():
+    page = {
+        "expenses": [
+            _expense(datetime(2024, 5, 1, 12, 0)),
+            _expense(datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)),
+        ],
+        "pagination": {"page": 1, "limit": 20, "total": 2},
+        "summary": {"totalAmount": 60.0, "expenseCount": 2},
+    }
+    field = create_model_field(
+        name="Response", type_=ExpenseListResponse, mode="serialization"
+    )
+    expected = await serialize_response(field=field, response_content=page)
+
+    body = ORJSONModelResponse(page).body
+
+    assert json.loads(body) == jsonable_encoder(expected)
+    assert b'"_id":"65f1a2b3c4d5e6f7a8b9c0d1"' in body
+    assert b'"createdAt":"2024-05-01T12:00:00Z"' in body
+
+
+def test_dumps_handles_nested_models_and_object_ids():
+    settlement = Settlement(
+        _id="s1",
+        groupId="g1",
+        payerId="u1",
+        payeeId="u2",
+        payerName="A",
+        payeeName="B",
+        amount=10.0,
+        status="pending",
+        createdAt=datetime(2024, 1, 1),
+    )
+    oid = ObjectId()
+
+    decoded = json.loads(dumps({"id": oid, "settlements": [settlement]}))
+
+    assert decoded["id"] == str(oid)
+    assert decoded["settlements"][0]["_id"] == "s1"
+    assert decoded["settlements"][0]["status"] == "pending"
@@ -0,0 +1,144 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from app.expenses.schemas import (
+    ExpenseCreateRequest,
+    ExpenseSplit,
+    ExpenseUpdateRequest,
+)
+from app.expenses.search import query_words, search_tokens
+from app.expenses.service import ExpenseService
+from bson import ObjectId
+from fastapi import HTTPException
+
+GROUP_ID = ObjectId()
+ALICE = str(ObjectId())
+BOB = str(ObjectId())
+
+
+@pytest.fixture
+async def service(mock_db):
+    now = datetime.utcnow()
+    await mock_db.groups.insert_one(
+        {
+            "_id": GROUP_ID,
+            "name": "Flat",
+            "currency": "USD",
+            "members": [
+                {"userId": ALICE, "role": "admin", "joinedAt": now},
+                {"userId": BOB, "role": "member", "joinedAt": now},
+            ],
+        }
+    )
+    with patch("app.database.mongodb.database", mock_db):
+        yield ExpenseService()
+
+
+async def _add(service, description, amount=10.0, payer=ALICE, tags=()):
+    expense = ExpenseCreateRequest(
+        description=description,
+        amount=amount,
+        paidBy=payer,
+        tags=list(tags),
+        splits=[
+            ExpenseSplit(userId=ALICE, amount=amount / 2),
+            ExpenseSplit(userId=BOB, amount=amount / 2),
+        ],
+    )
+    result = await service.create_expense(str(GROUP_ID), expense, payer)
+    return result["expense"].id
+
+
+def test_tokens_are_accent_and_case_free_word_prefixes():
+    assert search_tokens("Café", ["BBQ"]) == sorted(
+        ["=cafe", "ca", "caf", "cafe", "=bbq", "bb", "bbq"]
+    )
+    assert query_words("a Din  din, rés") == ["din", "res"]
+
+
+@pytest.mark.asyncio
+async def test_search_matches_prefixes_ranks_and_filters(service, mock_db):
+    group_id = str(GROUP_ID)
+    dinner = await _add(service, "Dinner at the restaurant", 60.0)
+    diner = await _add(service, "Diner breakfast", 12.0, payer=BOB)
+    dinosaur = await _add(service, "Dinosaur museum", 30.0, tags=["din"])
+    await _add(service, "Groceries", 25.0)
+
+    result = await service.search_group_expenses(group_id, ALICE, "din")
+    # Whole-word matches first, then newest first
+    assert [e.id for e in result["expenses"]] == [dinosaur, diner, dinner]
+    assert result["nextCursor"] is None
+
+    result = await service.search_group_expenses(group_id, ALICE, "DIN rest")
+    assert [e.id for e in result["expenses"]] == [dinner]
+
+    result = await service.search_group_expenses(
+        group_id, ALICE, "din", min_amount=20, paid_by=ALICE
+    )
+    assert [e.id for e in result["expenses"]] == [dinosaur, dinner]
+
+    # Edits re-index the expense
+    await service.update_expense(
+        group_id, dinner, ExpenseUpdateRequest(description="Lunch"), ALICE
+    )
+    result = await service.search_group_expenses(group_id, ALICE, "lun")
+    assert [e.id for e in result["expenses"]] == [dinner]
+
+    with pytest.raises(HTTPException) as exc:
+        await service.search_group_expenses(group_id, ALICE, "a ?")
+    assert exc.value.status_code == 400
+    with pytest.raises(ValueError):
+        await service.search_group_expenses(group_id, str(ObjectId()), "din")
+
+
+@pytest.mark.asyncio
+async def test_search_pages_with_a_cursor(service, mock_db):
+    group_id = str(GROUP_ID)
+    ids = [await _add(service, f"Taxi ride {i}") for i in range(5)]
+    ids.append(await _add(service, "Taxi"))
+    base = datetime(2024, 1, 1)
+    for i, expense_id in enumerate(ids):
+        await mock_db.expenses.update_one(
+            {"_id": ObjectId(expense_id)},
+            {"$set": {"createdAt": base + timedelta(days=i // 2)}},
+        )
+
+    pages, cursor = [], None
+    while True:
+        result = await service.search_group_expenses(
+            group_id, ALICE, "tax", limit=2, cursor=cursor, fields=frozenset({"id"})
+        )
+        pages.append([e.id for e in result["expenses"]])
+        cursor = result["nextCursor"]
+        if cursor is None:
+            break
+
+    # Ties on the date are broken by id, so pages neither skip nor repeat
+    assert sum(pages, []) == sorted(ids, reverse=True)
+    assert len(pages) == 3
+    with pytest.raises(HTTPException):
+        await service.search_group_expenses(group_id, ALICE, "tax", cursor="junk")
+
+
+@pytest.mark.asyncio
+async def test_search_flags_matches_beyond_the_candidate_cap(service, mock_db):
+    group_id = str(GROUP_ID)
+    ids = [await _add(service, f"Taxi ride {i}") for i in range(4)]
+    base = datetime(2024, 1, 1)
+    for i, expense_id in enumerate(ids):
+        await mock_db.expenses.update_one(
+            {"_id": ObjectId(expense_id)},
+            {"$set": {"createdAt": base + timedelta(days=i)}},
+        )
+
+    with patch("app.expenses.service.settings.search_max_candidates", 4):
+        result = await service.search_group_expenses(group_id, ALICE, "tax")
+    assert result["truncated"] is False
+    assert len(result["expenses"]) == 4
+
+    with patch("app.expenses.service.settings.search_max_candidates", 3):
+        result = await service.search_group_expenses(group_id, ALICE, "tax")
+    # Only the newest candidates are ranked
+    assert result["truncated"] is True
+    assert [e.id for e in result["expenses"]] == ids[:0:-1]
@@ -0,0 +1,170 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import patch
+
+import mongomock
+import pytest
+from app.events import event_hub, group_channel
+from app.expenses.planner import SettlementPlanner
+from app.expenses.schemas import ExpenseCreateRequest, ExpenseSplit
+from app.expenses.service import ExpenseService
+from bson import ObjectId
+from fastapi import HTTPException
+
+GROUP_ID = ObjectId()
+ALICE = str(ObjectId())
+BOB = str(ObjectId())
+
+
+@pytest.fixture
+async def service(mock_db):
+    now = datetime.utcnow()
+    await mock_db.users.insert_many(
+        [
+            {"_id": ObjectId(ALICE), "name": "Alice"},
+            {"_id": ObjectId(BOB), "name": "Bob"},
+        ]
+    )
+    await mock_db.groups.insert_one(
+        {
+            "_id": GROUP_ID,
+            "name": "Trip",
+            "currency": "USD",
+            "createdBy": ALICE,
+            "createdAt": now,
+            "changeVersion": 3,
+            "members": [
+                {"userId": ALICE, "role": "admin", "joinedAt": now},
+                {"userId": BOB, "role": "member", "joinedAt": now},
+            ],
+        }
+    )
+    with patch("app.database.mongodb.database", mock_db), patch(
+        "app.expenses.service.settings.settlement_plan_async", True
+    ):
+        yield ExpenseService()
+
+
+def _expense(amount, payer):
+    return ExpenseCreateRequest(
+        description="Dinner",
+        amount=amount,
+        paidBy=payer,
+        splits=[
+            ExpenseSplit(userId=ALICE, amount=amount / 2),
+            ExpenseSplit(userId=BOB, amount=amount / 2),
+        ],
+    )
+
+
+async def _until(condition):
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_writes_queue_plan_recomputation(service, mock_db):
+    planner = SettlementPlanner(debounce_seconds=0)
+    group_id = str(GROUP_ID)
+    with patch("app.expenses.service.settlement_planner", planner):
+        first = await service.create_expense(group_id, _expense(100.0, ALICE), ALICE)
+        second = await service.create_expense(group_id, _expense(40.0, BOB), BOB)
+
+    assert first["groupSummary"] is None
+    assert first["planVersion"] == 4
+    assert second["planVersion"] == 5
+    # Both writes queued the group once
+    assert planner.pending() == 1
+    assert await mock_db.settlement_plans.count_documents({}) == 0
+
+    async with event_hub.subscribe(group_channel(group_id)) as events:
+        await planner.start(service.compute_settlement_plan)
+        await planner.join()
+        await planner.stop()
+        event = events.get_nowait()
+    assert (event["type"], event["version"]) == ("plan.updated", 5)
+
+    plan = await service.get_settlement_plan(group_id, BOB)
+    assert (plan["version"], plan["stale"]) == (5, False)
+    assert plan["totalExpenses"] == 140.0
+    assert [
+        (s["fromUserId"], s["toUserId"], s["amount"])
+        for s in plan["optimizedSettlements"]
+    ] == [(BOB, ALICE, 30.0)]
+
+
+@pytest.mark.asyncio
+async def test_plan_is_computed_on_first_read_and_never_regresses(service, mock_db):
+    group_id = str(GROUP_ID)
+    plan = await service.get_settlement_plan(group_id, ALICE)
+    assert (plan["version"], plan["optimizedSettlements"]) == (3, [])
+
+    await mock_db.settlement_plans.update_one(
+        {"_id": group_id}, {"$set": {"version": 9}}
+    )
+    await service.compute_settlement_plan(group_id)
+    assert (await service.get_settlement_plan(group_id, ALICE))["version"] == 9
+
+    with pytest.raises(HTTPException) as exc_info:
+        await service.get_settlement_plan(group_id, "mallory")
+    assert exc_info.value.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_bursts_are_coalesced_into_one_computation_per_group():
+    runs = []
+    release = asyncio.Event()
+
+    async def compute(group_id):
+        runs.append(group_id)
+        if len(runs) == 3:
+            await release.wait()
+
+    planner = SettlementPlanner(debounce_seconds=0.01)
+    await planner.start(compute)
+    for _ in range(20):
+        planner.request("a")
+    planner.request("b")
+    await asyncio.wait_for(planner.join(), 2)
+    assert sorted(runs) == ["a", "b"]
+
+    # Requests while a computation runs schedule exactly one more
+    planner.request("a")
+    await asyncio.wait_for(_until(lambda: len(runs) == 3), 2)
+    for _ in range(5):
+        planner.request("a")
+    release.set()
+    await asyncio.wait_for(planner.join(), 2)
+    assert runs[2:] == ["a", "a"]
+    await planner.stop()
+
+
+@pytest.mark.asyncio
+async def test_plan_reports_writes_it_does_not_include(service):
+    group_id = str(GROUP_ID)
+    planner = SettlementPlanner()
+    with patch("app.expenses.service.settlement_planner", planner):
+        await service.get_settlement_plan(group_id, ALICE)
+        await service.create_expense(group_id, _expense(10.0, ALICE), ALICE)
+
+    plan = await service.get_settlement_plan(group_id, ALICE)
+    assert (plan["stale"], plan["pendingChanges"]) == (True, 1)
+
+    await service.compute_settlement_plan(group_id)
+    plan = await service.get_settlement_plan(group_id, ALICE)
+    assert (plan["stale"], plan["pendingChanges"]) == (False, 0)
+
+
+@pytest.mark.asyncio
+async def test_writes_return_without_scanning_the_group(service, mock_db):
+    await mock_db.groups.update_one({"_id": GROUP_ID}, {"$set": {"balances": {}}})
+    collection = mongomock.collection.Collection
+    scanned = AssertionError("the write aggregated over the group")
+    with patch("app.expenses.service.settlement_planner"), patch.object(
+        collection, "aggregate", side_effect=scanned
+    ), patch.object(collection, "count_documents", side_effect=scanned):
+        await service.create_expense(str(GROUP_ID), _expense(100.0, ALICE), ALICE)
+
+    # Balances moved by the new settlements alone
+    group = await mock_db.groups.find_one({"_id": GROUP_ID})
+    assert group["balances"] == {ALICE: 50.0, BOB: -50.0}
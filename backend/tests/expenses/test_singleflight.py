@@ -0,0 +1,66 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from app.expenses.service import ExpenseService, coalesced_reads
+from app.singleflight import SingleFlight, deduplicated_calls
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_plans_share_one_computation():
+    service = ExpenseService()
+    runs = []
+    release = asyncio.Event()
+
+    async def plan(group_id):
+        runs.append(group_id)
+        await release.wait()
+        return [f"plan of {group_id}"]
+
+    before = deduplicated_calls.value(name="calculate_optimized_settlements")
+    with patch.object(service, "_calculate_advanced_settlements", plan):
+        calls = [
+            asyncio.ensure_future(service.calculate_optimized_settlements("g1"))
+            for _ in range(5)
+        ]
+        other = asyncio.ensure_future(service.calculate_optimized_settlements("g2"))
+        await asyncio.sleep(0)
+        # A write forgets the flight: the next read computes again
+        coalesced_reads.forget("g1")
+        after_write = asyncio.ensure_future(
+            service.calculate_optimized_settlements("g1")
+        )
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*calls, other, after_write)
+
+    assert runs == ["g1", "g2", "g1"]
+    assert results[0] is results[4]
+    assert results[5] == ["plan of g2"]
+    assert (
+        deduplicated_calls.value(name="calculate_optimized_settlements") - before == 4
+    )
+    assert coalesced_reads.in_flight("g1") == 0
+
+
+@pytest.mark.asyncio
+async def test_failures_reach_every_waiting_caller():
+    flight = SingleFlight()
+    runs = 0
+
+    async def fail():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0)
+        raise RuntimeError("database down")
+
+    results = await asyncio.gather(
+        *(flight.do("g", "read", (1,), fail) for _ in range(3)),
+        return_exceptions=True,
+    )
+    assert runs == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+    # Nothing is cached once the call is over
+    await asyncio.gather(flight.do("g", "read", (1,), fail), return_exceptions=True)
+    assert runs == 2
@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from app.expenses.service import ExpenseService
+from app.sync import decode_sync_token, encode_sync_token
+from bson import ObjectId
+from fastapi import HTTPException
+
+USER_ID = "user_a"
+HOUR_AGO = datetime.utcnow() - timedelta(hours=1)
+
+
+@pytest.fixture
+def service(mock_db):
+    with patch("app.expenses.service.mongodb") as mock_mongodb:
+        mock_mongodb.database = mock_db
+        yield ExpenseService()
+
+
+@pytest.fixture
+async def group(mock_db):
+    group_id = ObjectId()
+    await mock_db.groups.insert_one(
+        {
+            "_id": group_id,
+            "members": [
+                {"userId": USER_ID, "role": "admin", "joinedAt": HOUR_AGO},
+                {"userId": "user_b", "role": "member", "joinedAt": HOUR_AGO},
+            ],
+            "membersUpdatedAt": HOUR_AGO,
+        }
+    )
+    return str(group_id)
+
+
+def _expense(group_id, updated_at):
+    return {
+        "_id": ObjectId(),
+        "groupId": group_id,
+        "createdBy": USER_ID,
+        "paidBy": USER_ID,
+        "description": "Lunch",
+        "amount": 20.0,
+        "splits": [{"userId": USER_ID, "amount": 20.0}],
+        "splitType": "equal",
+        "createdAt": updated_at,
+        "updatedAt": updated_at,
+    }
+
+
+def _settlement(group_id, updated_at):
+    return {
+        "_id": ObjectId(),
+        "groupId": group_id,
+        "payerId": USER_ID,
+        "payeeId": "user_b",
+        "payerName": "A",
+        "payeeName": "B",
+        "amount": 10.0,
+        "status": "pending",
+        "createdAt": updated_at,
+        "updatedAt": updated_at,
+    }
+
+
+def test_sync_token_round_trip():
+    at = datetime(2024, 5, 1, 12, 30, 15, 123000)
+    assert decode_sync_token(encode_sync_token(at)) == at
+
+    with pytest.raises(HTTPException) as exc_info:
+        decode_sync_token("not a token!")
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_changes_since_token_only_returns_delta(service, group, mock_db):
+    old_expense = _expense(group, HOUR_AGO)
+    old_settlement = _settlement(group, HOUR_AGO)
+    await mock_db.expenses.insert_one(old_expense)
+    await mock_db.settlements.insert_one(old_settlement)
+
+    first = await service.get_group_changes(group, USER_ID)
+    assert first["fullResync"] is True
+    assert [e.id for e in first["expenses"]] == [str(old_expense["_id"])]
+    assert [s.id for s in first["settlements"]] == [str(old_settlement["_id"])]
+    assert len(first["members"]) == 2
+
+    new_expense = _expense(group, datetime.utcnow())
+    await mock_db.expenses.insert_one(new_expense)
+    await service.delete_settlement(group, str(old_settlement["_id"]), USER_ID)
+
+    second = await service.get_group_changes(group, USER_ID, first["nextToken"])
+    assert second["fullResync"] is False
+    assert [e.id for e in second["expenses"]] == [str(new_expense["_id"])]
+    assert second["settlements"] == []
+    assert second["members"] is None
+    assert second["deleted"]["settlements"] == [str(old_settlement["_id"])]
+
+
+@pytest.mark.asyncio
+async def test_token_older_than_tombstone_retention_forces_full_resync(
+    service, group, mock_db
+):
+    await mock_db.expenses.insert_one(_expense(group, HOUR_AGO))
+    stale = encode_sync_token(datetime.utcnow() - timedelta(days=365))
+
+    result = await service.get_group_changes(group, USER_ID, stale)
+
+    assert result["fullResync"] is True
+    assert len(result["expenses"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_changes_require_membership(service, group):
+    with pytest.raises(HTTPException) as exc_info:
+        await service.get_group_changes(group, "stranger")
+    assert exc_info.value.status_code == 403
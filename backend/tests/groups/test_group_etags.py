@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import ANY, AsyncMock, patch
+
+import pytest
+from app.auth.security import create_access_token
+from app.expenses.service import ExpenseService
+from app.groups.service import group_service
+from app.http_cache import group_etag
+from bson import ObjectId
+from httpx import ASGITransport, AsyncClient
+from main import app
+from starlette.requests import Request
+
+TEST_USER_ID = "testuser@example.com"
+OTHER_USER_ID = "other@example.com"
+GROUP_ID = ObjectId()
+
+
+def _headers(user_id=TEST_USER_ID, **extra):
+    token = create_access_token(
+        data={"sub": user_id}, expires_delta=timedelta(minutes=15)
+    )
+    return {"Authorization": f"Bearer {token}", **extra}
+
+
+@pytest.fixture
+async def async_client():
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as ac:
+        yield ac
+
+
+@pytest.fixture
+async def group(mock_db):
+    now = datetime.now(timezone.utc)
+    await mock_db.groups.insert_one(
+        {
+            "_id": GROUP_ID,
+            "name": "Trip",
+            "currency": "USD",
+            "joinCode": "ABC123",
+            "createdBy": TEST_USER_ID,
+            "createdAt": now,
+            "members": [
+                {"userId": TEST_USER_ID, "role": "admin", "joinedAt": now},
+                {"userId": OTHER_USER_ID, "role": "member", "joinedAt": now},
+            ],
+        }
+    )
+    return str(GROUP_ID)
+
+
+@pytest.mark.asyncio
+async def test_unchanged_group_returns_304_without_loading_it(async_client, group):
+    first = await async_client.get(f"/groups/{group}", headers=_headers())
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    with patch.object(
+        group_service, "get_group_by_id", wraps=group_service.get_group_by_id
+    ) as spy:
+        second = await async_client.get(
+            f"/groups/{group}", headers=_headers(**{"If-None-Match": etag})
+        )
+
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+    spy.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_group_mutation_invalidates_etag(async_client, group):
+    first = await async_client.get(f"/groups/{group}/members", headers=_headers())
+    etag = first.headers["etag"]
+
+    await group_service.update_member_role(group, OTHER_USER_ID, "admin", TEST_USER_ID)
+
+    second = await async_client.get(
+        f"/groups/{group}/members", headers=_headers(**{"If-None-Match": etag})
+    )
+    assert second.status_code == 200
+    assert second.headers["etag"] != etag
+
+
+@pytest.mark.asyncio
+async def test_non_member_gets_no_etag(async_client, group):
+    response = await async_client.get(
+        f"/groups/{group}", headers=_headers("stranger@example.com")
+    )
+    assert response.status_code == 404
+    assert "etag" not in response.headers
+
+
+def test_etag_varies_with_query_and_user():
+    def request(query):
+        return Request(
+            {
+                "type": "http",
+                "path": "/groups/g1/expenses",
+                "query_string": query,
+                "headers": [],
+            }
+        )
+
+    page_1 = group_etag(3, request(b"page=1&limit=20"), "u1")
+    assert page_1 == group_etag(3, request(b"limit=20&page=1"), "u1")
+    assert page_1 != group_etag(3, request(b"page=2&limit=20"), "u1")
+    assert page_1 != group_etag(3, request(b"page=1&limit=20"), "u2")
+    assert page_1 != group_etag(4, request(b"page=1&limit=20"), "u1")
+
+
+@pytest.mark.asyncio
+async def test_expense_mutations_bump_group_version():
+    service = ExpenseService()
+    with patch("app.expenses.service.mongodb") as mock_mongodb:
+        mock_mongodb.database.groups.update_one = AsyncMock()
+        await service._notify(str(GROUP_ID), "expense.deleted", expenseId="e1")
+
+    mock_mongodb.database.groups.update_one.assert_awaited_once_with(
+        {"_id": GROUP_ID},
+        {"$inc": {"changeVersion": 1}, "$set": {"lastActivityAt": ANY}},
+    )
@@ -0,0 +1,176 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from app.groups.membership import membership_cache
+from app.groups.service import group_service
+from bson import ObjectId
+from fastapi import HTTPException
+
+GROUP_ID = ObjectId()
+
+
+@pytest.fixture
+async def club(mock_db):
+    """A group keeping its members in the group_members collection."""
+    joined = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    await mock_db.groups.insert_one(
+        {
+            "_id": GROUP_ID,
+            "name": "Chess Club",
+            "currency": "USD",
+            "joinCode": "CHESS1",
+            "createdBy": "admin",
+            "createdAt": joined,
+            "memberStorage": "collection",
+        }
+    )
+    await mock_db.group_members.insert_many(
+        [
+            {
+                "groupId": str(GROUP_ID),
+                "userId": f"user{i}",
+                "role": "admin" if i == 0 else "member",
+                "joinedAt": joined + timedelta(days=i),
+            }
+            for i in range(5)
+        ]
+    )
+    with patch("app.groups.members.settings.group_members_collection", True):
+        yield str(GROUP_ID)
+
+
+@pytest.mark.asyncio
+async def test_members_are_paged_from_the_collection(club):
+    page = await group_service.get_group_members(club, "user3", page=2, limit=2)
+    assert [m["userId"] for m in page] == ["user2", "user3"]
+    assert await group_service.get_group_members(club, "stranger") == []
+
+    group = await group_service.get_group_by_id(club, "user1")
+    assert group["name"] == "Chess Club"
+    assert group["members"] == []
+
+    groups = await group_service.get_user_groups("user4")
+    assert [g["_id"] for g in groups] == [club]
+
+
+@pytest.mark.asyncio
+async def test_membership_changes_write_member_documents(club, mock_db):
+    await group_service.join_group_by_code("chess1", "newcomer")
+    with pytest.raises(HTTPException) as exc_info:
+        await group_service.join_group_by_code("CHESS1", "newcomer")
+    assert exc_info.value.status_code == 400
+    assert await group_service.is_member(club, "newcomer")
+
+    await group_service.update_member_role(club, "user1", "admin", "user0")
+    assert await membership_cache.role_of(mock_db, club, "user1") == "admin"
+
+    assert await group_service.leave_group(club, "user0")
+    await group_service.remove_member(club, "newcomer", "user1")
+    assert not await group_service.is_member(club, "newcomer")
+
+    remaining = await mock_db.group_members.distinct("userId", {"groupId": club})
+    assert sorted(remaining) == ["user1", "user2", "user3", "user4"]
+    group = await mock_db.groups.find_one({"_id": GROUP_ID})
+    assert "members" not in group
+    assert group["changeVersion"] == 4
+
+
+@pytest.mark.asyncio
+async def test_expense_writes_look_up_only_the_author_and_payer(mock_db):
+    from app.expenses.schemas import ExpenseCreateRequest, ExpenseSplit
+    from app.expenses.service import ExpenseService
+
+    users = [str(ObjectId()) for _ in range(3)]
+    await mock_db.users.insert_many(
+        [{"_id": ObjectId(u), "name": f"User {i}"} for i, u in enumerate(users)]
+    )
+    await mock_db.groups.insert_one(
+        {"_id": GROUP_ID, "name": "Chess Club", "memberStorage": "collection"}
+    )
+    await mock_db.group_members.insert_many(
+        [{"groupId": str(GROUP_ID), "userId": u, "role": "member"} for u in users]
+    )
+    expense = ExpenseCreateRequest(
+        description="Board games",
+        amount=30.0,
+        paidBy=users[1],
+        splits=[
+            ExpenseSplit(userId=users[1], amount=15.0),
+            ExpenseSplit(userId=users[2], amount=15.0),
+        ],
+    )
+    stranger = str(ObjectId())
+    with patch("app.database.mongodb.database", mock_db), patch.object(
+        membership_cache, "roles", side_effect=AssertionError("loads every member")
+    ):
+        service = ExpenseService()
+        result = await service.create_expense(str(GROUP_ID), expense, users[2])
+        assert result["expense"].paidBy == users[1]
+
+        with pytest.raises(HTTPException) as exc_info:
+            await service.create_expense(str(GROUP_ID), expense, stranger)
+        assert exc_info.value.status_code == 403
+        expense.paidBy = stranger
+        with pytest.raises(HTTPException) as exc_info:
+            await service.create_expense(str(GROUP_ID), expense, users[2])
+        assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_removing_a_member_twice_only_succeeds_once(mock_db):
+    now = datetime.now(timezone.utc)
+    await mock_db.groups.insert_one(
+        {
+            "_id": GROUP_ID,
+            "name": "Flat",
+            "members": [
+                {"userId": "admin", "role": "admin", "joinedAt": now},
+                {"userId": "member", "role": "member", "joinedAt": now},
+            ],
+        }
+    )
+    group_id = str(GROUP_ID)
+    # Read by a racing request before the first removal lands
+    stale = await mock_db.groups.find_one({"_id": GROUP_ID})
+
+    assert await group_service.remove_member(group_id, "member", "admin")
+    version = (await mock_db.groups.find_one({"_id": GROUP_ID}))["changeVersion"]
+
+    assert not await group_service._pull_member(mock_db, stale, "member")
+    with pytest.raises(HTTPException) as exc_info:
+        await group_service.remove_member(group_id, "member", "admin")
+    assert exc_info.value.status_code == 404
+    group = await mock_db.groups.find_one({"_id": GROUP_ID})
+    assert group["changeVersion"] == version
+
+
+@pytest.mark.asyncio
+async def test_member_count_follows_racing_joins_and_removals(mock_db):
+    now = datetime.now(timezone.utc)
+    await mock_db.groups.insert_one(
+        {
+            "_id": GROUP_ID,
+            "name": "Flat",
+            "joinCode": "FLAT01",
+            "memberCount": 1,
+            "members": [{"userId": "admin", "role": "admin", "joinedAt": now}],
+        }
+    )
+    group_id = str(GROUP_ID)
+
+    await group_service.join_group_by_code("FLAT01", "newcomer")
+    # A second join that checked membership before the first one landed
+    with patch("app.groups.service.find_member", AsyncMock(return_value=None)):
+        with pytest.raises(HTTPException) as exc_info:
+            await group_service.join_group_by_code("FLAT01", "newcomer")
+    assert exc_info.value.status_code == 400
+    group = await mock_db.groups.find_one({"_id": GROUP_ID})
+    assert group["memberCount"] == 2
+    assert [m["userId"] for m in group["members"]] == ["admin", "newcomer"]
+
+    stale = await mock_db.groups.find_one({"_id": GROUP_ID})
+    assert await group_service.remove_member(group_id, "newcomer", "admin")
+    assert not await group_service._pull_member(mock_db, stale, "newcomer")
+    group = await mock_db.groups.find_one({"_id": GROUP_ID})
+    assert group["memberCount"] == 1
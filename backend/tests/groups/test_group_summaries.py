@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from app.auth.security import create_access_token
+from app.expenses.schemas import SettlementStatus
+from app.expenses.service import ExpenseService
+from app.groups.service import group_service
+from httpx import ASGITransport, AsyncClient
+from main import app
+
+USER_ID = "60c72b2f9b1e8a3f9c8b4567"
+FRIEND_ID = "60c72b2f9b1e8a3f9c8b4568"
+
+
+@pytest.fixture
+async def groups(mock_db):
+    """Three groups of USER_ID, the first shared with FRIEND_ID who owes 15."""
+    created = [
+        await group_service.create_group({"name": f"Group {i}"}, USER_ID)
+        for i in range(3)
+    ]
+    await group_service.join_group_by_code(created[0]["joinCode"], FRIEND_ID)
+    # Created before balances were stored on groups
+    await mock_db.groups.update_many({}, {"$unset": {"balances": ""}})
+    await mock_db.settlements.insert_many(
+        [
+            {
+                "groupId": created[0]["_id"],
+                "payerId": USER_ID,
+                "payeeId": FRIEND_ID,
+                "payerName": "User",
+                "payeeName": "Friend",
+                "amount": amount,
+                "status": status,
+                "createdAt": datetime.utcnow(),
+            }
+            for amount, status in (
+                (10.0, "pending"),
+                (5.0, "pending"),
+                (7.0, "completed"),
+            )
+        ]
+    )
+    return [group["_id"] for group in created]
+
+
+async def _summaries(**params):
+    token = create_access_token(
+        data={"sub": USER_ID},
+        expires_delta=timedelta(minutes=15),
+    )
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        response = await client.get(
+            "/groups",
+            params={"view": "summary", **params},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.asyncio
+async def test_summary_pages_groups_without_members(groups):
+    body = await _summaries(limit=2)
+
+    assert [g["_id"] for g in body["groups"]] == [groups[2], groups[1]]
+    assert body["pagination"]["total"] == 3
+    assert body["pagination"]["hasNext"] is True
+    assert "members" not in body["groups"][0]
+
+    last_page = await _summaries(limit=2, page=2)
+    shared = last_page["groups"][0]
+    assert shared["_id"] == groups[0]
+    assert shared["memberCount"] == 2
+    # No balances stored yet, so they are aggregated on read
+    assert shared["balance"] == 15.0
+
+
+@pytest.mark.asyncio
+async def test_settlement_writes_move_stored_balances(groups, mock_db):
+    # As backfilled by migration 0007
+    await mock_db.groups.update_one(
+        {"name": "Group 0"}, {"$set": {"balances": {USER_ID: 15.0, FRIEND_ID: -15.0}}}
+    )
+    paid = await mock_db.settlements.find_one({"amount": 10.0})
+    service = ExpenseService()
+    with patch("app.expenses.service.mongodb") as mock_mongodb:
+        mock_mongodb.database = mock_db
+        await service.update_settlement_status(
+            groups[0], str(paid["_id"]), SettlementStatus.COMPLETED
+        )
+        # Already completed: nothing moves
+        await service.update_settlement_status(
+            groups[0], str(paid["_id"]), SettlementStatus.COMPLETED
+        )
+
+    stored = await mock_db.groups.find_one({"name": "Group 0"})
+    assert stored["balances"] == {USER_ID: 5.0, FRIEND_ID: -5.0}
+
+    summaries = await group_service.get_user_group_summaries(FRIEND_ID)
+    assert summaries["groups"][0]["balance"] == -5.0
+    assert summaries["groups"][0]["lastActivityAt"] == stored["lastActivityAt"]
@@ -249,6 +249,8 @@ class TestGroupService:
             ok = await self.service.remove_member(group_id, member_id, admin_id)
 
         assert ok is True
+        tombstone = mock_db.tombstones.insert_many.call_args[0][0][0]
+        assert (tombstone["kind"], tombstone["entityId"]) == ("member", member_id)
 
     @pytest.mark.asyncio
     async def test_leave_group_blocked_when_unsettled(self):
@@ -477,8 +479,8 @@ class TestGroupService:
             ],
         }
 
-        # First call returns None (user not admin), second call returns the group (group exists)
-        mock_collection.find_one.side_effect = [None, existing_group]
+        # The group exists, but user789 is not one of its admins
+        mock_collection.find_one.return_value = existing_group
 
         with patch.object(self.service, "get_db", return_value=mock_db):
             with pytest.raises(HTTPException) as exc_info:
@@ -0,0 +1,121 @@
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from app.groups.membership import MembershipCache, membership_cache
+from app.groups.service import group_service
+from bson import ObjectId
+from fastapi import HTTPException
+
+GROUP_ID = ObjectId()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _db(members):
+    db = MagicMock()
+    db.groups.find_one = AsyncMock(return_value={"_id": GROUP_ID, "members": members})
+    return db
+
+
+@pytest.mark.asyncio
+async def test_roles_are_cached_until_ttl_expires():
+    clock = FakeClock()
+    cache = MembershipCache(ttl_seconds=30, clock=clock)
+    db = _db([{"userId": "u1", "role": "admin"}, {"userId": "u2"}])
+
+    assert await cache.role_of(db, str(GROUP_ID), "u1") == "admin"
+    assert await cache.role_of(db, str(GROUP_ID), "u2") == "member"
+    assert await cache.role_of(db, str(GROUP_ID), "u3") is None
+    assert db.groups.find_one.await_count == 1
+
+    clock.now = 31
+    await cache.role_of(db, str(GROUP_ID), "u1")
+    assert db.groups.find_one.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_load_racing_an_invalidation_is_not_stored():
+    cache = MembershipCache(ttl_seconds=30)
+    db = _db([{"userId": "u1", "role": "member"}])
+
+    async def find_one(*args, **kwargs):
+        # A membership write lands while the read is in flight
+        cache.invalidate(str(GROUP_ID))
+        return {"_id": GROUP_ID, "members": [{"userId": "u1", "role": "member"}]}
+
+    db.groups.find_one.side_effect = find_one
+    await cache.roles(db, str(GROUP_ID))
+    await cache.roles(db, str(GROUP_ID))
+    assert db.groups.find_one.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_unknown_or_invalid_group_has_no_members():
+    cache = MembershipCache(ttl_seconds=30)
+    db = _db([])
+    db.groups.find_one.return_value = None
+
+    assert await cache.roles(db, str(ObjectId())) is None
+    assert await cache.role_of(db, "not-an-id", "u1") is None
+
+
+@pytest.mark.asyncio
+async def test_membership_writes_invalidate_the_cache(mock_db):
+    now = datetime.now(timezone.utc)
+    await mock_db.groups.insert_one(
+        {
+            "_id": GROUP_ID,
+            "members": [
+                {"userId": "admin", "role": "admin", "joinedAt": now},
+                {"userId": "member", "role": "member", "joinedAt": now},
+            ],
+        }
+    )
+    group_id = str(GROUP_ID)
+    assert await group_service.is_member(group_id, "member")
+
+    await group_service.update_member_role(group_id, "member", "admin", "admin")
+    assert await membership_cache.role_of(mock_db, group_id, "member") == "admin"
+
+    await group_service.remove_member(group_id, "member", "admin")
+    assert not await group_service.is_member(group_id, "member")
+
+
+@pytest.mark.asyncio
+async def test_admin_writes_do_not_trust_a_stale_cache(mock_db):
+    now = datetime.now(timezone.utc)
+    await mock_db.groups.insert_one(
+        {
+            "_id": GROUP_ID,
+            "name": "Flat",
+            "members": [
+                {"userId": "admin", "role": "admin", "joinedAt": now},
+                {"userId": "other", "role": "admin", "joinedAt": now},
+            ],
+        }
+    )
+    group_id = str(GROUP_ID)
+    assert await membership_cache.role_of(mock_db, group_id, "admin") == "admin"
+
+    # Demoted by another worker: this worker's entry still says admin
+    await mock_db.groups.update_one(
+        {"_id": GROUP_ID, "members.userId": "admin"},
+        {"$set": {"members.$.role": "member"}},
+    )
+    assert await membership_cache.role_of(mock_db, group_id, "admin") == "admin"
+
+    with pytest.raises(HTTPException) as exc:
+        await group_service.update_group(group_id, {"name": "Mine"}, "admin")
+    assert exc.value.status_code == 403
+    with pytest.raises(HTTPException) as exc:
+        await group_service.delete_group(group_id, "admin")
+    assert exc.value.status_code == 403
+
+    assert await group_service.delete_group(group_id, "other")
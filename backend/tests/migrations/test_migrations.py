@@ -0,0 +1,313 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import mongomock
+import pytest
+from app.expenses.search import search_tokens
+from bson import ObjectId
+from migrations import MIGRATIONS, MigrationRunner
+from migrations.m0001_avatar_to_imageurl import AvatarToImageUrl
+from migrations.m0002_expense_history_to_collection import ExpenseHistoryToCollection
+from migrations.m0003_settlement_updated_at import SettlementUpdatedAt
+from migrations.m0004_group_members_to_collection import GroupMembersToCollection
+from migrations.m0005_group_member_count import GroupMemberCount
+from migrations.m0006_expense_search_tokens import ExpenseSearchTokens
+from migrations.m0007_group_balances import GroupBalances
+from pymongo import DeleteMany, ReplaceOne
+
+
+def _apply_bulk(collection):
+    """mongomock's bulk_write lags behind pymongo's operation classes, so apply
+    UpdateOne/ReplaceOne/DeleteMany operations one by one and report the
+    modified count."""
+
+    def bulk_write(operations, ordered=True):
+        modified = 0
+        for op in operations:
+            if isinstance(op, DeleteMany):
+                collection.delete_many(op._filter)
+                continue
+            if isinstance(op, ReplaceOne):
+                result = collection.replace_one(op._filter, op._doc, upsert=op._upsert)
+            else:
+                result = collection.update_one(op._filter, op._doc, upsert=op._upsert)
+            modified += result.modified_count
+        return SimpleNamespace(modified_count=modified)
+
+    return bulk_write
+
+
+@pytest.fixture
+def db():
+    database = mongomock.MongoClient()["migration_test_db"]
+    for name in (
+        "users",
+        "expenses",
+        "expense_history",
+        "settlements",
+        "groups",
+        "group_members",
+    ):
+        database[name].bulk_write = _apply_bulk(database[name])
+    return database
+
+
+@pytest.fixture
+def users_with_avatars(db):
+    docs = [{"name": f"user{i}", "avatar": f"https://img/{i}.png"} for i in range(7)]
+    docs.append({"name": "no avatar"})
+    docs.append(
+        {
+            "name": "both",
+            "avatar": "https://img/same.png",
+            "imageUrl": "https://img/same.png",
+        }
+    )
+    docs.append(
+        {
+            "name": "conflict",
+            "avatar": "https://img/a.png",
+            "imageUrl": "https://img/b.png",
+        }
+    )
+    db.users.insert_many(docs)
+    return docs
+
+
+def test_migrations_are_numbered_and_unique():
+    numbers = [m.number for m in MIGRATIONS]
+    assert len(numbers) == len(set(numbers))
+    assert numbers == sorted(numbers)
+
+
+def test_runner_migrates_in_batches_and_records_state(db, users_with_avatars):
+    runner = MigrationRunner(db, batch_size=3)
+    stats = runner.run(AvatarToImageUrl())
+
+    assert stats["scanned"] == 9
+    assert stats["modified"] == 8
+    assert stats["conflicts"] == 1
+    assert stats["users_with_both_fields"] == 1
+    assert db.users.count_documents({"avatar": {"$exists": True}}) == 1
+    assert db.users.find_one({"name": "user3"})["imageUrl"] == "https://img/3.png"
+
+    state = db.migrations.find_one({"_id": "0001_avatar_to_imageurl"})
+    assert state["status"] == "completed"
+    assert state["processed"] == 9
+    assert state["stats"]["conflicts"] == 1
+    assert runner.pending(MIGRATIONS, target=1) == []
+
+
+def test_runner_resumes_from_checkpoint(db, users_with_avatars):
+    first_ids = [doc["_id"] for doc in db.users.find().sort("_id", 1).limit(4)]
+    db.migrations.insert_one(
+        {"_id": "0001_avatar_to_imageurl", "status": "running", "lastId": first_ids[-1]}
+    )
+
+    stats = MigrationRunner(db, batch_size=2).run(AvatarToImageUrl())
+
+    assert stats["scanned"] == 5
+    for doc_id in first_ids:
+        assert "imageUrl" not in db.users.find_one({"_id": doc_id})
+
+
+def test_dry_run_counts_without_writing(db, users_with_avatars):
+    stats = MigrationRunner(db, dry_run=True).run(AvatarToImageUrl())
+
+    assert stats["matched"] == 9
+    assert stats["planned"] == 8
+    assert stats["modified"] == 0
+    assert db.users.count_documents({"avatar": {"$exists": True}}) == 9
+    assert db.migrations.find_one({"_id": "0001_avatar_to_imageurl"}) is None
+
+
+def test_runner_throttles_to_target_ops_per_second(db, users_with_avatars):
+    sleeps = []
+    runner = MigrationRunner(
+        db,
+        batch_size=4,
+        max_ops_per_sec=2,
+        sleep=sleeps.append,
+        clock=lambda: 0.0,
+    )
+    runner.run(AvatarToImageUrl())
+
+    # 8 operations at 2 ops/sec need ~4 seconds in total
+    assert sleeps
+    assert max(sleeps) == pytest.approx(4.0)
+
+
+def test_completed_migration_is_skipped(db, users_with_avatars):
+    db.migrations.insert_one({"_id": "0001_avatar_to_imageurl", "status": "completed"})
+    stats = MigrationRunner(db).run(AvatarToImageUrl())
+    assert stats["skipped"] is True
+    assert db.users.count_documents({"avatar": {"$exists": True}}) == 9
+
+
+def test_reset_migration_runs_again_from_the_start(db, users_with_avatars):
+    runner = MigrationRunner(db)
+    runner.run(AvatarToImageUrl())
+    # Rolled back: the avatars are back, imageUrl is gone
+    db.users.update_many({}, {"$unset": {"imageUrl": ""}})
+    db.users.update_one({"name": "user3"}, {"$set": {"avatar": "https://img/3.png"}})
+
+    runner.reset(AvatarToImageUrl())
+    assert runner.get_state(AvatarToImageUrl()) is None
+    stats = runner.run(AvatarToImageUrl())
+    assert not stats.get("skipped")
+    assert db.users.find_one({"name": "user3"})["imageUrl"] == "https://img/3.png"
+
+
+def test_expense_history_moves_to_collection_as_diffs(db):
+    first, second = ObjectId(), ObjectId()
+    splits_v1 = [{"userId": "a", "amount": 10.0}, {"userId": "b", "amount": 10.0}]
+    splits_v2 = [{"userId": "a", "amount": 15.0}, {"userId": "b", "amount": 15.0}]
+    expense_id = db.expenses.insert_one(
+        {
+            "groupId": "g1",
+            "description": "Dinner out",
+            "amount": 30.0,
+            "splits": splits_v2,
+            "history": [
+                {
+                    "_id": first,
+                    "userId": "a",
+                    "userName": "Alice",
+                    "beforeData": {
+                        "description": "Dinner",
+                        "amount": 20.0,
+                        "splits": splits_v1,
+                    },
+                    "editedAt": datetime(2024, 1, 1),
+                },
+                {
+                    "_id": second,
+                    "userId": "b",
+                    "userName": "Bob",
+                    "beforeData": {
+                        "description": "Dinner",
+                        "amount": 30.0,
+                        "splits": splits_v2,
+                    },
+                    "editedAt": datetime(2024, 1, 2),
+                },
+            ],
+        }
+    ).inserted_id
+    db.expenses.insert_one({"groupId": "g1", "description": "never edited"})
+    # Left behind by an interrupted run that never reached the checkpoint
+    db.expense_history.insert_one({"_id": first, "expenseId": str(expense_id)})
+
+    stats = MigrationRunner(db).run(ExpenseHistoryToCollection())
+
+    assert stats["scanned"] == 1
+    assert stats["history_entries"] == 2
+    assert "history" not in db.expenses.find_one({"_id": expense_id})
+    assert db.expense_history.find_one({"_id": first})["changes"] == {
+        "amount": {"from": 20.0, "to": 30.0},
+        "splits": {"from": splits_v1, "to": splits_v2},
+    }
+    latest = db.expense_history.find_one({"_id": second})
+    assert latest["expenseId"] == str(expense_id)
+    assert latest["changes"] == {"description": {"from": "Dinner", "to": "Dinner out"}}
+    assert db.expense_history.count_documents({}) == 2
+
+
+def test_settlements_get_updated_at_from_latest_stamp(db):
+    created, paid = datetime(2024, 1, 1), datetime(2024, 1, 5)
+    db.settlements.insert_many(
+        [
+            {"_id": 1, "createdAt": created},
+            {"_id": 2, "createdAt": created, "paidAt": paid},
+            {"_id": 3, "createdAt": created, "updatedAt": paid},
+        ]
+    )
+
+    stats = MigrationRunner(db).run(SettlementUpdatedAt())
+
+    assert stats["scanned"] == 2
+    assert db.settlements.find_one({"_id": 1})["updatedAt"] == created
+    assert db.settlements.find_one({"_id": 2})["updatedAt"] == paid
+
+
+def test_large_groups_move_members_to_collection(db):
+    joined = datetime(2024, 1, 1)
+    members = [
+        {"userId": "a", "role": "admin", "joinedAt": joined},
+        {"userId": "b", "role": "member", "joinedAt": joined},
+        {"userId": "c", "role": "member", "joinedAt": joined},
+    ]
+    large = db.groups.insert_one({"name": "Club", "members": members}).inserted_id
+    small = db.groups.insert_one({"name": "Flat", "members": members[:2]}).inserted_id
+    # Left behind by an interrupted run, for a member who left since
+    db.group_members.insert_one({"groupId": str(large), "userId": "gone"})
+
+    stats = MigrationRunner(db).run(GroupMembersToCollection(min_members=3))
+
+    assert stats["scanned"] == 1
+    assert stats["members"] == 3
+    group = db.groups.find_one({"_id": large})
+    assert group["memberStorage"] == "collection"
+    assert "members" not in group
+    assert db.groups.find_one({"_id": small})["members"] == members[:2]
+    moved = db.group_members.find({"groupId": str(large)}, {"_id": 0, "groupId": 0})
+    assert sorted(moved, key=lambda m: m["userId"]) == members
+
+
+def test_member_count_is_backfilled_from_members(db):
+    members = [{"userId": "a"}, {"userId": "b"}]
+    legacy = db.groups.insert_one({"members": members}).inserted_id
+    # Incremented by a join before the backfill ran
+    drifted = db.groups.insert_one({"members": members, "memberCount": 1}).inserted_id
+    db.groups.insert_one({"members": members, "memberCount": 2})
+    db.groups.insert_one({"memberStorage": "collection", "memberCount": 900})
+
+    stats = MigrationRunner(db).run(GroupMemberCount())
+
+    assert stats["scanned"] == 3
+    assert stats["planned"] == 2
+    assert stats["corrected"] == 1
+    assert db.groups.find_one({"_id": legacy})["memberCount"] == 2
+    assert db.groups.find_one({"_id": drifted})["memberCount"] == 2
+
+
+def test_expense_search_tokens_match_the_write_path(db):
+    legacy = db.expenses.insert_one(
+        {"description": "Café déjeuner", "tags": ["Paris-trip"]}
+    ).inserted_id
+    db.expenses.insert_one({"description": "Taxi", "searchTokens": ["=taxi"]})
+
+    stats = MigrationRunner(db).run(ExpenseSearchTokens())
+
+    assert stats["scanned"] == 1
+    tokens = db.expenses.find_one({"_id": legacy})["searchTokens"]
+    assert tokens == search_tokens("Café déjeuner", ["Paris-trip"])
+    assert {"=cafe", "dej", "=paris", "tr"} <= set(tokens)
+
+
+def test_group_balances_are_backfilled_from_pending_settlements(db):
+    legacy = db.groups.insert_one({"name": "Flat", "changeVersion": 3}).inserted_id
+    empty = db.groups.insert_one({"name": "Quiet"}).inserted_id
+    db.groups.insert_one({"name": "New", "balances": {}})
+    db.settlements.insert_many(
+        [
+            {"groupId": str(legacy), "payerId": "a", "payeeId": "b", "amount": 10.0},
+            {"groupId": str(legacy), "payerId": "b", "payeeId": "a", "amount": 4.0},
+            {"groupId": str(legacy), "payerId": "a", "payeeId": "c", "amount": 6.0},
+        ],
+    )
+    db.settlements.update_many({}, {"$set": {"status": "pending"}})
+    db.settlements.insert_one(
+        {"groupId": str(legacy), "payerId": "c", "payeeId": "a", "amount": 99.0}
+    )
+
+    stats = MigrationRunner(db, batch_size=1).run(GroupBalances())
+
+    assert stats["scanned"] == 2
+    assert stats["withBalances"] == 1
+    assert db.groups.find_one({"_id": legacy})["balances"] == {
+        "a": 12.0,
+        "b": -6.0,
+        "c": -6.0,
+    }
+    assert db.groups.find_one({"_id": empty})["balances"] == {}
@@ -0,0 +1,148 @@
+from datetime import timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from app.auth.security import create_access_token
+from app.ratelimit import InMemoryRateLimitBackend, client_address
+from bson import ObjectId
+from httpx import ASGITransport, AsyncClient
+from main import app
+from starlette.requests import Request
+
+
+@pytest.mark.asyncio
+async def test_bucket_charges_cost_and_refills():
+    backend = InMemoryRateLimitBackend()
+    with patch("app.ratelimit.time.monotonic", return_value=100.0) as clock:
+        assert await backend.take("k", 4, capacity=10, refill_per_second=2) == 0
+        assert await backend.take("k", 4, capacity=10, refill_per_second=2) == 0
+        # 2 tokens left, 2 more needed at 2 per second
+        assert await backend.take("k", 4, capacity=10, refill_per_second=2) == 1.0
+        # Other keys have their own bucket
+        assert await backend.take("other", 4, capacity=10, refill_per_second=2) == 0
+
+        clock.return_value = 101.0
+        assert await backend.take("k", 4, capacity=10, refill_per_second=2) == 0
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_evicts_the_least_recently_used_bucket():
+    backend = InMemoryRateLimitBackend(max_buckets=2)
+    await backend.take("a", 10, capacity=10, refill_per_second=1)
+    await backend.take("b", 10, capacity=10, refill_per_second=1)
+    # "a" is used again, so "b" goes when "c" arrives
+    assert await backend.take("a", 1, capacity=10, refill_per_second=1) > 0
+    await backend.take("c", 1, capacity=10, refill_per_second=1)
+
+    assert list(backend._buckets) == ["a", "c"]
+    assert await backend.take("b", 10, capacity=10, refill_per_second=1) == 0
+    assert len(backend._buckets) == 2
+
+
+def _request(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request(
+        {"type": "http", "client": (peer, 1234), "headers": headers, "method": "GET"}
+    )
+
+
+def test_client_address_trusts_forwarded_for_only_from_proxies():
+    with patch("app.ratelimit.settings.forwarded_allow_ips", "10.0.0.0/8"):
+        # Sent by the client itself
+        assert client_address(_request("203.0.113.9", "1.2.3.4")) == "203.0.113.9"
+        # Through the proxy; the hop the client sent is ignored
+        request = _request("10.0.0.2", "1.2.3.4, 203.0.113.9, 10.0.0.5")
+        assert client_address(request) == "203.0.113.9"
+        assert client_address(_request("10.0.0.2")) == "10.0.0.2"
+    with patch("app.ratelimit.settings.forwarded_allow_ips", "*"):
+        assert client_address(_request("100.64.0.1", "1.2.3.4, 203.0.113.9")) == (
+            "203.0.113.9"
+        )
+
+
+@pytest.mark.asyncio
+async def test_expensive_route_is_throttled_per_user(mock_db):
+    user_id = ObjectId()
+    await mock_db.users.insert_one({"_id": user_id, "email": "a@example.com"})
+    token = create_access_token(
+        data={"sub": str(user_id)}, expires_delta=timedelta(minutes=15)
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+    summary = {"friendsBalance": [], "summary": {}}
+
+    with patch("app.ratelimit.backend", InMemoryRateLimitBackend()), patch(
+        "app.ratelimit.settings.rate_limit_capacity", 20
+    ), patch(
+        "app.expenses.routes.expense_service.get_friends_balance_summary",
+        AsyncMock(return_value=summary),
+    ):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            responses = [
+                (await client.get("/users/me/friends-balance", headers=headers))
+                for _ in range(3)
+            ]
+            with patch("main.settings.metrics_token", "secret"):
+                metrics = await client.get(
+                    "/metrics", headers={"Authorization": "Bearer secret"}
+                )
+
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    # Cost 10 at one token per second
+    assert responses[2].headers["retry-after"] == "10"
+    assert (
+        'splitwiser_rate_limited_requests_total{route="friends_balance"}'
+        in metrics.text
+    )
+
+
+@pytest.mark.asyncio
+async def test_logins_are_limited_per_account_and_forwarded_client(mock_db):
+    async def login(client, email, forwarded):
+        return await client.post(
+            "/auth/login/email",
+            json={"email": email, "password": "wrong-password"},
+            headers={"X-Forwarded-For": forwarded},
+        )
+
+    with patch("app.ratelimit.backend", InMemoryRateLimitBackend()), patch(
+        "app.ratelimit.settings.rate_limit_capacity", 5
+    ), patch("app.ratelimit.settings.forwarded_allow_ips", "*"):
+        async with AsyncClient(
+            transport=ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            first = await login(client, "a@example.com", "203.0.113.1")
+            # Same account, however the email is written
+            again = await login(client, " A@Example.com", "203.0.113.1")
+            other_account = await login(client, "b@example.com", "203.0.113.1")
+            other_client = await login(client, "a@example.com", "203.0.113.2")
+
+    assert first.status_code == 401
+    assert again.status_code == 429
+    assert other_account.status_code == 401
+    assert other_client.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_metrics_need_the_configured_token():
+    async with AsyncClient(
+        transport=ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        with patch("main.settings.metrics_token", None):
+            disabled = await client.get("/metrics")
+        with patch("main.settings.metrics_token", "secret"):
+            anonymous = await client.get("/metrics")
+            wrong = await client.get(
+                "/metrics", headers={"Authorization": "Bearer other"}
+            )
+            allowed = await client.get(
+                "/metrics", headers={"Authorization": "Bearer secret"}
+            )
+
+    assert [disabled.status_code, anonymous.status_code, wrong.status_code] == [
+        404,
+        404,
+        404,
+    ]
+    assert allowed.status_code == 200
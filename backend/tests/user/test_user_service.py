@@ -17,6 +17,7 @@ def mock_db_client():
     """Fixture to create a mock database client with an async users collection."""
     db_client = MagicMock()
     db_client.users = AsyncMock()  # Mock the 'users' collection
+    db_client.groups = AsyncMock()
     return db_client
 
 